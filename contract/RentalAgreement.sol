@@ -89,6 +89,22 @@ contract RentalAgreement {
         }
     }
 
+    // Pays n months of rent in a single transaction
+    function payMonths(uint256 n) public payable onlyRole(tenant) {
+        require(state == ContractState.Active, "Not active.");
+        require(n > 0, "Invalid months.");
+        require(msg.value == rentAmount * n, "Incorrect rent.");
+        require(totalPaid + msg.value <= rentAmount * leaseDuration, "Exceeds lease total.");
+
+        totalPaid += msg.value;
+        payable(landlord).transfer(msg.value);
+        emit PaymentMade(msg.sender, msg.value, totalPaid);
+
+        if ((block.timestamp - startDate) / 30 days >= leaseDuration) {
+            state = ContractState.Completed;
+        }
+    }
+
     function checkCompletion() public {
         require(state == ContractState.Active, "Not active.");
         if ((block.timestamp - startDate) / 30 days >= leaseDuration) {
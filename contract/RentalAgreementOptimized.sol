@@ -0,0 +1,179 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.4;
+
+// Gas-optimized RentalAgreement. Functions, getters and events match
+// RentalAgreement.sol so backend.py can use either with the same ABI.
+contract RentalAgreementOptimized {
+    // Parties and terms never change, so they live in the bytecode instead of storage
+    address public immutable tenant;
+    address public immutable landlord;
+    uint256 public immutable rentAmount;
+    uint256 public immutable leaseDuration;
+
+    enum ContractState {
+        Pending,
+        Active,
+        Completed,
+        Terminated
+    }
+
+    // All mutable state is packed into a single slot: 16 + 8 + 1 + 1 bytes
+    uint128 private _totalPaid;
+    uint64 private _startDate;
+    bool public isSigned;
+    ContractState public state;
+
+    // Events
+    event AgreementCreated(
+        address indexed tenant,
+        address indexed landlord,
+        uint256 rentAmount,
+        uint256 leaseDuration
+    );
+    event AgreementSigned(
+        address indexed signer,
+        bool isSigned,
+        ContractState state
+    );
+    event PaymentMade(
+        address indexed tenant,
+        uint256 amount,
+        uint256 totalPaid
+    );
+    event AgreementTerminated(
+        address indexed terminatedBy,
+        uint256 terminationDate
+    );
+
+    // Errors
+    error Unauthorized();
+    error TenantRequired();
+    error NotPending();
+    error LandlordMustSignFirst();
+    error UnauthorizedSigner();
+    error NotActive();
+    error IncorrectRent();
+    error AlreadyCompleted();
+    error IncorrectRefundAmount();
+    error TenantShouldNotSendFunds();
+    error TransferFailed();
+    error InvalidMonths();
+    error ExceedsLeaseTotal();
+
+    constructor(
+        address _landlord,
+        address _tenant,
+        uint256 _rentAmount,
+        uint256 _leaseDuration
+    ) {
+        if (_tenant == address(0)) revert TenantRequired();
+        landlord = _landlord;
+        tenant = _tenant;
+        rentAmount = _rentAmount;
+        leaseDuration = _leaseDuration;
+        // state defaults to Pending, no storage write needed
+        emit AgreementCreated(_tenant, _landlord, _rentAmount, _leaseDuration);
+    }
+
+    function startDate() external view returns (uint256) {
+        return _startDate;
+    }
+
+    function totalPaid() external view returns (uint256) {
+        return _totalPaid;
+    }
+
+    function signAgreement() external {
+        if (state != ContractState.Pending) revert NotPending();
+        if (msg.sender == landlord && !isSigned) {
+            isSigned = true;
+            emit AgreementSigned(msg.sender, true, ContractState.Pending);
+        } else if (msg.sender == tenant) {
+            if (!isSigned) revert LandlordMustSignFirst();
+            state = ContractState.Active;
+            _startDate = uint64(block.timestamp);
+            emit AgreementSigned(msg.sender, true, ContractState.Active);
+        } else {
+            revert UnauthorizedSigner();
+        }
+    }
+
+    function makePayment() external payable {
+        if (msg.sender != tenant) revert Unauthorized();
+        if (state != ContractState.Active) revert NotActive();
+        if (msg.value != rentAmount) revert IncorrectRent();
+
+        uint128 paid = _totalPaid + uint128(msg.value);
+        _totalPaid = paid;
+        if (_leaseElapsed()) {
+            state = ContractState.Completed;
+        }
+        emit PaymentMade(msg.sender, msg.value, paid);
+
+        _send(landlord, msg.value);
+    }
+
+    // Pays n months of rent in a single transaction
+    function payMonths(uint256 n) external payable {
+        if (msg.sender != tenant) revert Unauthorized();
+        if (state != ContractState.Active) revert NotActive();
+        if (n == 0) revert InvalidMonths();
+        if (msg.value != rentAmount * n) revert IncorrectRent();
+
+        uint128 paid = _totalPaid + uint128(msg.value);
+        if (paid > rentAmount * leaseDuration) revert ExceedsLeaseTotal();
+        _totalPaid = paid;
+        if (_leaseElapsed()) {
+            state = ContractState.Completed;
+        }
+        emit PaymentMade(msg.sender, msg.value, paid);
+
+        _send(landlord, msg.value);
+    }
+
+    function checkCompletion() external {
+        if (state != ContractState.Active) revert NotActive();
+        if (_leaseElapsed()) {
+            state = ContractState.Completed;
+            emit AgreementTerminated(address(0), block.timestamp); // Completion logged as termination
+        }
+    }
+
+    function terminateAgreement() external payable {
+        ContractState current = state;
+        if (current == ContractState.Completed) revert AlreadyCompleted();
+        if (msg.sender != landlord && msg.sender != tenant) revert Unauthorized();
+
+        bool refundTenant = false;
+        if (current == ContractState.Active) {
+            if (msg.sender == landlord) {
+                // Landlord terminates, refund the tenant exactly one month
+                if (msg.value != rentAmount) revert IncorrectRefundAmount();
+                refundTenant = true;
+            } else if (msg.value != 0) {
+                revert TenantShouldNotSendFunds();
+            }
+        }
+
+        state = ContractState.Terminated;
+        emit AgreementTerminated(msg.sender, block.timestamp);
+
+        if (refundTenant) {
+            _send(tenant, msg.value);
+        }
+    }
+
+    function getBalance() external view returns (uint256) {
+        return address(this).balance;
+    }
+
+    function _leaseElapsed() private view returns (bool) {
+        return (block.timestamp - _startDate) / 30 days >= leaseDuration;
+    }
+
+    // call instead of transfer: no 2300 gas stipend limit for contract wallets
+    function _send(address to, uint256 amount) private {
+        (bool ok, ) = payable(to).call{value: amount}("");
+        if (!ok) revert TransferFailed();
+    }
+}
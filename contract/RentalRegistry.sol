@@ -0,0 +1,233 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.4;
+
+// Holds every lease in one contract instead of deploying a RentalAgreement per lease.
+// Leases are keyed by leaseKey(landlord, id), id being the backend's contract id, so nobody
+// can take ids that belong to another landlord. sign, pay, terminate and checkCompletion
+// behave like RentalAgreement.sol with that key as first argument.
+contract RentalRegistry {
+    enum ContractState {
+        Pending,
+        Active,
+        Completed,
+        Terminated
+    }
+
+    // Three storage slots per lease:
+    //   landlord (20) + startDate (8) + isSigned (1) + state (1)
+    //   tenant (20) + leaseDuration (4)
+    //   rentAmount (16) + totalPaid (16)
+    struct Lease {
+        address landlord;
+        uint64 startDate;
+        bool isSigned;
+        ContractState state;
+        address tenant;
+        uint32 leaseDuration;
+        uint128 rentAmount;
+        uint128 totalPaid;
+    }
+
+    mapping(uint256 => Lease) private _leases;
+
+    // Events, indexed by lease key so one address filter covers every lease
+    event AgreementCreated(
+        uint256 indexed leaseId,
+        address indexed tenant,
+        address indexed landlord,
+        uint256 rentAmount,
+        uint256 leaseDuration
+    );
+    event AgreementSigned(
+        uint256 indexed leaseId,
+        address indexed signer,
+        bool isSigned,
+        ContractState state
+    );
+    event PaymentMade(
+        uint256 indexed leaseId,
+        address indexed tenant,
+        uint256 amount,
+        uint256 totalPaid
+    );
+    event AgreementTerminated(
+        uint256 indexed leaseId,
+        address indexed terminatedBy,
+        uint256 terminationDate
+    );
+
+    // Errors
+    error LeaseExists();
+    error LeaseNotFound();
+    error InvalidTerms();
+    error Unauthorized();
+    error TenantRequired();
+    error NotPending();
+    error LandlordMustSignFirst();
+    error UnauthorizedSigner();
+    error NotActive();
+    error IncorrectRent();
+    error AlreadyCompleted();
+    error IncorrectRefundAmount();
+    error TenantShouldNotSendFunds();
+    error TransferFailed();
+    error InvalidMonths();
+    error ExceedsLeaseTotal();
+
+    // Key of a lease created by landlord under id; the other functions take this key
+    function leaseKey(address landlord, uint256 id) public pure returns (uint256) {
+        return uint256(keccak256(abi.encode(landlord, id)));
+    }
+
+    // The caller becomes the landlord. Creating a lease is the landlord's signature,
+    // the equivalent of deploying a RentalAgreement and calling signAgreement.
+    function createLease(
+        uint256 id,
+        address tenant,
+        uint256 rentAmount,
+        uint256 leaseDuration
+    ) external {
+        uint256 leaseId = leaseKey(msg.sender, id);
+        if (tenant == address(0)) revert TenantRequired();
+        if (_leases[leaseId].landlord != address(0)) revert LeaseExists();
+        if (rentAmount == 0 || rentAmount > type(uint128).max) revert InvalidTerms();
+        if (leaseDuration == 0 || leaseDuration > type(uint32).max) revert InvalidTerms();
+
+        _leases[leaseId] = Lease({
+            landlord: msg.sender,
+            startDate: 0,
+            isSigned: true,
+            state: ContractState.Pending,
+            tenant: tenant,
+            leaseDuration: uint32(leaseDuration),
+            rentAmount: uint128(rentAmount),
+            totalPaid: 0
+        });
+        emit AgreementCreated(leaseId, tenant, msg.sender, rentAmount, leaseDuration);
+        emit AgreementSigned(leaseId, msg.sender, true, ContractState.Pending);
+    }
+
+    function getLease(uint256 leaseId)
+        external
+        view
+        returns (
+            address landlord,
+            address tenant,
+            uint256 rentAmount,
+            uint256 leaseDuration,
+            uint256 startDate,
+            uint256 totalPaid,
+            bool isSigned,
+            ContractState state
+        )
+    {
+        Lease storage lease = _lease(leaseId);
+        return (
+            lease.landlord,
+            lease.tenant,
+            lease.rentAmount,
+            lease.leaseDuration,
+            lease.startDate,
+            lease.totalPaid,
+            lease.isSigned,
+            lease.state
+        );
+    }
+
+    function state(uint256 leaseId) external view returns (ContractState) {
+        return _lease(leaseId).state;
+    }
+
+    function isSigned(uint256 leaseId) external view returns (bool) {
+        return _lease(leaseId).isSigned;
+    }
+
+    function signAgreement(uint256 leaseId) external {
+        Lease storage lease = _lease(leaseId);
+        if (lease.state != ContractState.Pending) revert NotPending();
+        if (msg.sender != lease.tenant) revert UnauthorizedSigner();
+        if (!lease.isSigned) revert LandlordMustSignFirst();
+
+        lease.state = ContractState.Active;
+        lease.startDate = uint64(block.timestamp);
+        emit AgreementSigned(leaseId, msg.sender, true, ContractState.Active);
+    }
+
+    function makePayment(uint256 leaseId) external payable {
+        _pay(leaseId, 1);
+    }
+
+    // Pays n months of rent in a single transaction
+    function payMonths(uint256 leaseId, uint256 n) external payable {
+        if (n == 0) revert InvalidMonths();
+        _pay(leaseId, n);
+    }
+
+    function checkCompletion(uint256 leaseId) external {
+        Lease storage lease = _lease(leaseId);
+        if (lease.state != ContractState.Active) revert NotActive();
+        if (_leaseElapsed(lease)) {
+            lease.state = ContractState.Completed;
+            emit AgreementTerminated(leaseId, address(0), block.timestamp); // Completion logged as termination
+        }
+    }
+
+    function terminateAgreement(uint256 leaseId) external payable {
+        Lease storage lease = _lease(leaseId);
+        ContractState current = lease.state;
+        if (current == ContractState.Completed) revert AlreadyCompleted();
+        if (msg.sender != lease.landlord && msg.sender != lease.tenant) revert Unauthorized();
+
+        bool refundTenant = false;
+        if (current == ContractState.Active) {
+            if (msg.sender == lease.landlord) {
+                // Landlord terminates, refund the tenant exactly one month
+                if (msg.value != lease.rentAmount) revert IncorrectRefundAmount();
+                refundTenant = true;
+            } else if (msg.value != 0) {
+                revert TenantShouldNotSendFunds();
+            }
+        }
+
+        lease.state = ContractState.Terminated;
+        emit AgreementTerminated(leaseId, msg.sender, block.timestamp);
+
+        if (refundTenant) {
+            _send(lease.tenant, msg.value);
+        }
+    }
+
+    function _pay(uint256 leaseId, uint256 months) private {
+        Lease storage lease = _lease(leaseId);
+        if (msg.sender != lease.tenant) revert Unauthorized();
+        if (lease.state != ContractState.Active) revert NotActive();
+        uint256 rent = lease.rentAmount;
+        if (msg.value != rent * months) revert IncorrectRent();
+
+        uint256 paid = lease.totalPaid + msg.value;
+        if (months > 1 && paid > rent * lease.leaseDuration) revert ExceedsLeaseTotal();
+        lease.totalPaid = uint128(paid);
+        if (_leaseElapsed(lease)) {
+            lease.state = ContractState.Completed;
+        }
+        emit PaymentMade(leaseId, msg.sender, msg.value, paid);
+
+        // Rent is forwarded straight away, the registry never holds a lease's funds
+        _send(lease.landlord, msg.value);
+    }
+
+    function _lease(uint256 leaseId) private view returns (Lease storage lease) {
+        lease = _leases[leaseId];
+        if (lease.landlord == address(0)) revert LeaseNotFound();
+    }
+
+    function _leaseElapsed(Lease storage lease) private view returns (bool) {
+        return (block.timestamp - lease.startDate) / 30 days >= lease.leaseDuration;
+    }
+
+    // call instead of transfer: no 2300 gas stipend limit for contract wallets
+    function _send(address to, uint256 amount) private {
+        (bool ok, ) = payable(to).call{value: amount}("");
+        if (!ok) revert TransferFailed();
+    }
+}
@@ -0,0 +1,236 @@
+"""Market-level reports for admins, computed in SQLite and NumPy and cached for a while.
+
+Aggregates, rankings and running totals are SQL (GROUP BY and window functions).
+Percentiles and histograms come from columnar extracts: one column read straight
+into a NumPy array, already sorted by SQLite, so the per-group percentiles are a
+few vectorized index operations instead of a Python loop over rows.
+"""
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from archive import CLOSED_STATUSES
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# Both live and archived leases, for reports over all time
+ALL_CONTRACTS = ('(SELECT id, landlord_wallet, apartment_id, start_date, end_date, lease_duration, status '
+                 'FROM contracts UNION ALL '
+                 'SELECT id, landlord_wallet, apartment_id, start_date, end_date, lease_duration, status '
+                 'FROM contracts_archive)')
+
+
+def init_analytics_indexes(cursor):
+    # Rent by location reads (location, price) in index order, without touching the table
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_apartments_location_price ON apartments (location, price_in_jod)')
+
+
+def column(cursor, sql, params=(), dtype=np.float64):
+    """One-column query result as a NumPy array, read in fetchmany chunks."""
+    cursor.execute(sql, params)
+    values = []
+    while True:
+        rows = cursor.fetchmany(10000)
+        if not rows:
+            break
+        values.append(np.fromiter((row[0] for row in rows), dtype=dtype, count=len(rows)))
+    return np.concatenate(values) if values else np.empty(0, dtype=dtype)
+
+
+def grouped_percentiles(values, counts, percentiles=PERCENTILES):
+    """Percentiles of consecutive groups of sorted values, as a (groups, percentiles) array.
+
+    values holds every group one after the other, each sorted ascending; counts gives
+    the group sizes. Uses the same linear interpolation as np.percentile.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    positions = (counts[:, None] - 1) * (np.asarray(percentiles, dtype=np.float64)[None, :] / 100)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, counts[:, None] - 1)
+    fraction = positions - lower
+    below, above = values[starts[:, None] + lower], values[starts[:, None] + upper]
+    return below + (above - below) * fraction
+
+
+def histogram(values, bin_width, max_bins=60):
+    """{"edges", "counts"} with bins bin_width wide from 0, the last bin open-ended."""
+    if not len(values):
+        return {"edges": [], "counts": []}
+    bins = int(min(np.ceil((values.max() + 1) / bin_width), max_bins))
+    edges = np.arange(bins + 1, dtype=np.float64) * bin_width
+    counts, _ = np.histogram(np.minimum(values, edges[-1] - 1e-9), bins=edges)
+    return {"edges": edges.tolist(), "counts": counts.tolist()}
+
+
+def summarize(values):
+    if not len(values):
+        return {"count": 0}
+    percentiles = np.percentile(values, PERCENTILES)
+    return dict({"count": int(len(values)), "mean": float(values.mean()), "min": float(values.min()),
+                 "max": float(values.max())},
+                **{f"p{p}": float(v) for p, v in zip(PERCENTILES, percentiles)})
+
+
+class Analytics:
+    """Admin reports, each cached for ttl seconds per set of parameters.
+
+    Only one thread computes an expired report; the others wait for its result
+    instead of running the same queries.
+    """
+
+    def __init__(self, database_file, ttl=300):
+        self.database_file = database_file
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cache = {}  # (report, params) -> (result, expires_at)
+        self._computing = {}  # (report, params) -> lock held while computing
+        self._stats = {"hits": 0, "misses": 0}
+        self.reports = {
+            "rent-by-location": self.rent_by_location,
+            "occupancy": self.occupancy,
+            "lease-durations": self.lease_durations,
+            "revenue-by-landlord": self.revenue_by_landlord,
+        }
+
+    def report(self, name, refresh=False, **params):
+        """Cached result of a report, with computed_at and cached added. KeyError for unknown reports."""
+        compute = self.reports[name]
+        key = (name, tuple(sorted(params.items())))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[1] > time.monotonic() and not refresh:
+                self._stats["hits"] += 1
+                return dict(cached[0], cached=True)
+            key_lock = self._computing.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached and cached[1] > time.monotonic() and not refresh:
+                    self._stats["hits"] += 1  # Computed by another thread meanwhile
+                    return dict(cached[0], cached=True)
+                self._stats["misses"] += 1
+            started = time.perf_counter()
+            conn = sqlite3.connect(self.database_file)
+            try:
+                result = compute(conn.cursor(), **params)
+            finally:
+                conn.close()
+            result = dict(result, computed_at=datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                          compute_ms=round((time.perf_counter() - started) * 1000, 1))
+            with self._lock:
+                self._cache[key] = (result, time.monotonic() + self.ttl)
+            return dict(result, cached=False)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, cached_reports=len(self._cache))
+
+    def rent_by_location(self, cursor, min_listings=1):
+        """Listing count, mean, range and percentiles of the JOD price per location."""
+        cursor.execute('''
+            SELECT location, count(*), avg(price_in_jod), min(price_in_jod), max(price_in_jod),
+                   RANK() OVER (ORDER BY avg(price_in_jod) DESC)
+            FROM apartments WHERE price_in_jod IS NOT NULL
+            GROUP BY location ORDER BY location
+        ''')
+        groups = cursor.fetchall()
+        prices = column(cursor, '''
+            SELECT price_in_jod FROM apartments WHERE price_in_jod IS NOT NULL ORDER BY location, price_in_jod
+        ''')
+        if not groups:
+            return {"locations": [], "overall": summarize(prices)}
+        percentiles = grouped_percentiles(prices, [group[1] for group in groups])
+
+        locations = [
+            dict({"location": location, "listings": count, "mean_price_jod": mean, "min_price_jod": low,
+                  "max_price_jod": high, "rank_by_mean_price": rank},
+                 **{f"p{p}_price_jod": float(v) for p, v in zip(PERCENTILES, row)})
+            for (location, count, mean, low, high, rank), row in zip(groups, percentiles)
+            if count >= min_listings
+        ]
+        return {"locations": locations, "overall": summarize(prices)}
+
+    def occupancy(self, cursor):
+        """Share of apartments with an active lease, overall and per location."""
+        cursor.execute('''
+            SELECT a.location, count(*) AS apartments,
+                   sum(a.id IN (SELECT apartment_id FROM contracts WHERE status = 'Active')),  -- Built once, not per row
+                   sum(a.availability = 'Available')
+            FROM apartments a
+            GROUP BY a.location ORDER BY apartments DESC, a.location
+        ''')
+        locations = [
+            {"location": location, "apartments": apartments, "occupied": occupied,
+             "listed_available": listed_available, "occupancy_rate": occupied / apartments if apartments else 0.0}
+            for location, apartments, occupied, listed_available in cursor.fetchall()
+        ]
+        total = sum(row["apartments"] for row in locations)
+        occupied = sum(row["occupied"] for row in locations)
+        cursor.execute(f'''
+            SELECT status, count(*) FROM contracts WHERE status NOT IN {CLOSED_STATUSES} GROUP BY status
+        ''')
+        return {"apartments": total, "occupied": occupied, "occupancy_rate": occupied / total if total else 0.0,
+                "open_contracts_by_status": dict(cursor.fetchall()), "locations": locations}
+
+    def lease_durations(self, cursor):
+        """Distribution of agreed lease lengths in months and of booked periods in days, all leases ever."""
+        cursor.execute(f'''
+            SELECT lease_duration, count(*), sum(count(*)) OVER (ORDER BY lease_duration) * 1.0
+                   / sum(count(*)) OVER ()
+            FROM {ALL_CONTRACTS} WHERE lease_duration IS NOT NULL
+            GROUP BY lease_duration ORDER BY lease_duration
+        ''')
+        months = [{"months": months, "contracts": count, "cumulative_share": share}
+                  for months, count, share in cursor.fetchall()]
+        days = column(cursor, f'''
+            SELECT julianday(end_date) - julianday(start_date) FROM {ALL_CONTRACTS}
+            WHERE julianday(end_date) > julianday(start_date)
+        ''')
+        return {"lease_duration_months": months, "booked_days": summarize(days),
+                "booked_days_histogram": histogram(days, bin_width=30)}
+
+    def revenue_by_landlord(self, cursor, limit=50):
+        """Rent received per landlord with rank and share of the total, plus revenue per month.
+        Amounts are ETH as floating point, which is precise enough for reporting."""
+        cursor.execute(f'''
+            WITH revenue AS (
+                SELECT c.landlord_wallet, count(*) AS payments, sum(p.months) AS months_paid,
+                       total(CAST(p.amount_wei AS REAL)) / 1e18 AS revenue_eth
+                FROM payments p JOIN {ALL_CONTRACTS} c ON c.id = p.contract_id
+                GROUP BY c.landlord_wallet
+            )
+            SELECT landlord_wallet, payments, months_paid, revenue_eth,
+                   RANK() OVER (ORDER BY revenue_eth DESC),
+                   revenue_eth / nullif(sum(revenue_eth) OVER (), 0),
+                   sum(revenue_eth) OVER (ORDER BY revenue_eth DESC ROWS UNBOUNDED PRECEDING)
+                       / nullif(sum(revenue_eth) OVER (), 0),
+                   count(*) OVER ()
+            FROM revenue ORDER BY revenue_eth DESC LIMIT ?
+        ''', (limit,))
+        rows = cursor.fetchall()
+        landlords = [
+            {"landlord_wallet": wallet, "payments": payments, "months_paid": months_paid,
+             "revenue_eth": revenue, "rank": rank, "share": share, "cumulative_share": cumulative}
+            for wallet, payments, months_paid, revenue, rank, share, cumulative, _ in rows
+        ]
+        cursor.execute('''
+            SELECT month, revenue_eth, revenue_eth - lag(revenue_eth) OVER (ORDER BY month),
+                   sum(revenue_eth) OVER (ORDER BY month)
+            FROM (SELECT substr(paid_at, 1, 7) AS month, total(CAST(amount_wei AS REAL)) / 1e18 AS revenue_eth
+                  FROM payments GROUP BY month)
+            ORDER BY month
+        ''')
+        monthly = [{"month": month, "revenue_eth": revenue, "change_eth": change, "running_total_eth": running}
+                   for month, revenue, change, running in cursor.fetchall()]
+        # Per-landlord totals again as a column, for the spread across all landlords and not only the top
+        spread = column(cursor, f'''
+            SELECT total(CAST(p.amount_wei AS REAL)) / 1e18 FROM payments p
+            JOIN {ALL_CONTRACTS} c ON c.id = p.contract_id GROUP BY c.landlord_wallet
+        ''')
+        return {"landlords": landlords, "landlords_total": rows[0][7] if rows else 0,
+                "revenue_per_landlord": summarize(spread), "monthly": monthly}
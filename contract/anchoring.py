@@ -0,0 +1,324 @@
+"""Lease document hashes, batched into Merkle trees and anchored on-chain.
+
+Each contract's terms (parties, apartment, dates, rent) are serialized as canonical
+JSON and hashed with keccak256 into contracts.contract_hash when the lease is created.
+Once per batch window the anchorer puts every hash not yet anchored into one Merkle
+tree and sends its root in a single transaction, then stores each contract's
+inclusion proof, so one transaction anchors the whole batch. Anyone holding the terms,
+the proof and the transaction can check the lease was recorded, without this server.
+
+Tree nodes hash the sorted pair of their children, keccak256(min(a, b) + max(a, b)),
+so a proof is a flat list of sibling hashes; an odd node at the end of a level moves
+up unchanged. This is the scheme OpenZeppelin's MerkleProof.verify checks.
+"""
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+
+from web3 import Web3
+
+from db import ensure_column
+from receipts import ReceiptTimeout, ReceiptWaiter, TransactionDropped
+
+logger = logging.getLogger(__name__)
+
+TERMS_VERSION = 1  # Bumped whenever the canonical terms change shape
+
+# Anchors look like a call to anchor(bytes32): a recognizable tag on a plain transaction,
+# and the right calldata should ANCHOR_ADDRESS ever point at a contract with that function
+ANCHOR_SELECTOR = Web3.keccak(text="anchor(bytes32)")[:4]
+
+# Columns lease_terms reads, in order
+TERMS_COLUMNS = ("id", "landlord_wallet", "tenant_wallet", "apartment_id", "start_date", "end_date",
+                 "rent_amount_wei", "lease_duration")
+
+
+def init_anchor_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS anchor_batches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            merkle_root TEXT NOT NULL, -- 0x-hex keccak256 root over the batch's contract hashes
+            leaf_count INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'Pending' CHECK(status IN ('Pending', 'Sent', 'Anchored')),
+            tx_hash TEXT,
+            block_number INTEGER,
+            created_at TEXT NOT NULL,
+            anchored_at TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_anchor_batches_status ON anchor_batches (status, id)')
+    ensure_column(cursor, 'contracts', 'anchor_batch_id', 'INTEGER')
+    ensure_column(cursor, 'contracts', 'merkle_proof', 'TEXT')  # JSON array of 0x-hex sibling hashes
+
+    # The anchorer only reads hashed contracts that are not in a batch yet
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_contracts_unanchored ON contracts (id)
+        WHERE contract_hash IS NOT NULL AND anchor_batch_id IS NULL
+    ''')
+
+    # Leases created before hashing existed. Rows with a malformed wallet stay unhashed and unanchored.
+    cursor.execute(f'SELECT {", ".join(TERMS_COLUMNS)} FROM contracts WHERE contract_hash IS NULL')
+    hashes = []
+    for row in cursor.fetchall():
+        try:
+            hashes.append((contract_hash(lease_terms(row)), row[0]))
+        except ValueError as e:
+            logger.warning("Contract %s not hashed: %s", row[0], e)
+    cursor.executemany('UPDATE contracts SET contract_hash = ? WHERE id = ?', hashes)
+
+
+def lease_terms(row):
+    """The hashed terms of a contract, from a row of TERMS_COLUMNS. Raises ValueError for malformed wallets."""
+    contract_id, landlord, tenant, apartment_id, start_date, end_date, rent_amount_wei, lease_duration = row
+    for wallet in (landlord, tenant):
+        if not isinstance(wallet, str) or not Web3.is_address(wallet):
+            raise ValueError(f"invalid wallet address {wallet!r}")
+    return {
+        "version": TERMS_VERSION,
+        "contract_id": contract_id,
+        "landlord_wallet": Web3.to_checksum_address(landlord),
+        "tenant_wallet": Web3.to_checksum_address(tenant),
+        "apartment_id": apartment_id,
+        "start_date": start_date,
+        "end_date": end_date,
+        "rent_amount_wei": str(rent_amount_wei) if rent_amount_wei is not None else None,
+        "lease_duration": lease_duration,
+    }
+
+
+def canonical_json(terms):
+    """Sorted keys, no whitespace, ASCII only: the same terms always give the same bytes."""
+    return json.dumps(terms, sort_keys=True, separators=(",", ":"), ensure_ascii=True).encode()
+
+
+def contract_hash(terms):
+    return Web3.to_hex(Web3.keccak(canonical_json(terms)))
+
+
+def _parent(a, b):
+    return Web3.keccak(a + b if a <= b else b + a)
+
+
+def merkle_levels(leaves):
+    """Every level of the tree over the leaves (32-byte hashes), leaves first and the root last."""
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [_parent(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def merkle_proof(levels, index):
+    """Sibling hashes from the leaf at index up to the root."""
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append(level[sibling])
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf, proof, root):
+    node = leaf
+    for sibling in proof:
+        node = _parent(node, sibling)
+    return node == root
+
+
+def _to_bytes(hex_hash):
+    return bytes.fromhex(hex_hash.removeprefix("0x"))
+
+
+def verify_lease(cursor, contract_id):
+    """Checks a contract's stored hash against its terms and its proof against its batch root.
+    Returns None for unknown contracts. Archived contracts are checked too."""
+    columns = ", ".join(f"c.{name}" for name in TERMS_COLUMNS)
+    for table in ('contracts', 'contracts_archive'):
+        cursor.execute(f'''
+            SELECT {columns}, c.contract_hash, c.merkle_proof,
+                   b.id, b.merkle_root, b.leaf_count, b.status, b.tx_hash, b.block_number, b.anchored_at
+            FROM {table} c LEFT JOIN anchor_batches b ON b.id = c.anchor_batch_id
+            WHERE c.id = ?
+        ''', (contract_id,))
+        row = cursor.fetchone()
+        if row:
+            break
+    else:
+        return None
+
+    terms = lease_terms(row[:len(TERMS_COLUMNS)])
+    stored_hash, proof, batch_id, root, leaf_count, status, tx_hash, block_number, anchored_at = row[len(TERMS_COLUMNS):]
+    computed_hash = contract_hash(terms)
+    result = {
+        "contract_id": contract_id,
+        "terms": terms,
+        "contract_hash": stored_hash,
+        "hash_matches_terms": stored_hash is not None and stored_hash == computed_hash,
+        "batch": None,
+        "merkle_proof": json.loads(proof) if proof else None,
+        "proof_valid": None,
+        "anchored": False,
+    }
+    if batch_id is not None:
+        result["batch"] = {"id": batch_id, "merkle_root": root, "leaf_count": leaf_count, "status": status,
+                           "tx_hash": tx_hash, "block_number": block_number, "anchored_at": anchored_at}
+        result["proof_valid"] = verify_proof(_to_bytes(computed_hash), [_to_bytes(h) for h in result["merkle_proof"]],
+                                             _to_bytes(root))
+        result["anchored"] = status == 'Anchored' and result["hash_matches_terms"] and result["proof_valid"]
+    return result
+
+
+def anchor_data(root):
+    return ANCHOR_SELECTOR + root
+
+
+class LeaseAnchorer:
+    """Once per interval, batches new contract hashes into a Merkle tree and anchors its root.
+
+    Batches and proofs are written before anything is sent, so a restart resumes with the
+    same roots: Pending batches are sent, Sent batches are waited for (and sent again if
+    the node dropped them). Without an operator key, batches are built but not anchored.
+    """
+
+    def __init__(self, database_file, web3, fee_strategy, operator_key=None, anchor_address=None,
+                 max_batch_size=10000, interval=3600, receipt_waiter=None):
+        self.database_file = database_file
+        self.web3 = web3
+        self.fee_strategy = fee_strategy
+        self.receipt_waiter = receipt_waiter or ReceiptWaiter(web3)
+        self.operator = web3.eth.account.from_key(operator_key) if operator_key else None
+        # Anchors go to the operator's own address unless another one is configured
+        self.anchor_address = anchor_address or (self.operator.address if self.operator else None)
+        self.max_batch_size = max_batch_size
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="lease-anchorer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                stats = self.run_once()
+                logger.info("Lease anchoring finished: %s", stats)
+            except Exception:
+                logger.exception("Lease anchoring failed")
+            self._stop.wait(self.interval)
+
+    def run_once(self):
+        stats = {"batches": 0, "leaves": 0, "anchor_txs": 0, "anchored": 0}
+        # Autocommit mode so each batch is its own short BEGIN IMMEDIATE transaction
+        conn = sqlite3.connect(self.database_file, isolation_level=None, timeout=30)
+        try:
+            cursor = conn.cursor()
+            while not self._stop.is_set():
+                leaves = self._build_batch(cursor)
+                if not leaves:
+                    break
+                stats["batches"] += 1
+                stats["leaves"] += leaves
+            if self.operator:
+                cursor.execute("SELECT id, merkle_root, tx_hash FROM anchor_batches "
+                               "WHERE status IN ('Pending', 'Sent') ORDER BY id")
+                for batch_id, root, tx_hash in cursor.fetchall():
+                    if self._stop.is_set():
+                        break
+                    sent, anchored = self._anchor(cursor, batch_id, root, tx_hash)
+                    stats["anchor_txs"] += sent
+                    stats["anchored"] += anchored
+            return stats
+        finally:
+            conn.close()
+
+    def _build_batch(self, cursor):
+        """Puts up to max_batch_size unanchored hashes into a new batch. Returns the number of leaves."""
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('''
+                SELECT id, contract_hash FROM contracts
+                WHERE contract_hash IS NOT NULL AND anchor_batch_id IS NULL
+                ORDER BY id LIMIT ?
+            ''', (self.max_batch_size,))
+            rows = cursor.fetchall()
+            if not rows:
+                cursor.execute('COMMIT')
+                return 0
+            levels = merkle_levels([_to_bytes(row[1]) for row in rows])
+            cursor.execute('INSERT INTO anchor_batches (merkle_root, leaf_count, created_at) VALUES (?, ?, ?)',
+                           (Web3.to_hex(levels[-1][0]), len(rows), datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')))
+            batch_id = cursor.lastrowid
+            cursor.executemany('UPDATE contracts SET anchor_batch_id = ?, merkle_proof = ? WHERE id = ?', [
+                (batch_id, json.dumps([Web3.to_hex(h) for h in merkle_proof(levels, index)]), row[0])
+                for index, row in enumerate(rows)
+            ])
+            cursor.execute('COMMIT')
+            return len(rows)
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+
+    def _anchor(self, cursor, batch_id, root, tx_hash):
+        """Sends the batch root unless already sent and waits for it. Returns (transactions sent, anchored)."""
+        sent = 0
+        receipt = None
+        if tx_hash:
+            try:
+                receipt = self.receipt_waiter.wait(tx_hash)
+            except TransactionDropped:
+                logger.warning("Anchor of batch %s was dropped, sending it again", batch_id)
+            except ReceiptTimeout:
+                return sent, 0  # Still pending, checked again next run
+        if receipt is None:
+            tx = {
+                'from': self.operator.address,
+                'to': self.anchor_address,
+                'value': 0,
+                'data': Web3.to_hex(anchor_data(_to_bytes(root))),
+                'nonce': self.web3.eth.get_transaction_count(self.operator.address, 'pending'),
+                'chainId': self.web3.eth.chain_id,
+            }
+            tx.update(self.fee_strategy.fee_params())
+            tx['gas'] = self.fee_strategy.gas_limit(tx)
+            tx_hash = Web3.to_hex(self.web3.eth.send_raw_transaction(self.operator.sign_transaction(tx).raw_transaction))
+            sent = 1
+            cursor.execute("UPDATE anchor_batches SET status = 'Sent', tx_hash = ? WHERE id = ?", (tx_hash, batch_id))
+            try:
+                receipt = self.receipt_waiter.wait(tx_hash)
+            except (ReceiptTimeout, TransactionDropped) as e:
+                logger.warning("Anchor of batch %s not confirmed yet: %s", batch_id, e)
+                return sent, 0
+            self.fee_strategy.record('anchor', tx, receipt)
+
+        if receipt['status'] != 1:
+            # Sent again next run
+            cursor.execute("UPDATE anchor_batches SET status = 'Pending', tx_hash = NULL WHERE id = ?", (batch_id,))
+            return sent, 0
+        cursor.execute('''
+            UPDATE anchor_batches SET status = 'Anchored', block_number = ?, anchored_at = ? WHERE id = ?
+        ''', (receipt['blockNumber'], datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'), batch_id))
+        return sent, 1
+
+    def check_on_chain(self, tx_hash, root):
+        """Whether the transaction is mined and carries the root. None when the node cannot tell."""
+        try:
+            tx = self.web3.eth.get_transaction(tx_hash)
+        except Exception as e:
+            logger.info("Anchor transaction %s unavailable: %s", tx_hash, e)
+            return None
+        data = tx['input']
+        data = bytes(data) if not isinstance(data, str) else _to_bytes(data)
+        return tx.get('blockNumber') is not None and data == anchor_data(_to_bytes(root))
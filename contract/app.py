@@ -1,8 +1,16 @@
 import streamlit as st
 import requests
+import threading
+import json
+import time
+import jwt
+import uuid
+from collections import deque
+from eth_account import Account
 
 # Constants
 BASE_URL = "http://localhost:5000"  # Backend API URL
+CONTRACTS_CACHE_TTL = 300  # Seconds; events keep the cache current, this covers a dropped stream
 
 
 # Initialize session state
@@ -10,10 +18,16 @@ if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
 if "token" not in st.session_state:
     st.session_state.token = None
+if "refresh_token" not in st.session_state:
+    st.session_state.refresh_token = None
 if "user" not in st.session_state:
     st.session_state.user = None
 if "wallet_address" not in st.session_state:
     st.session_state.wallet_address = None
+if "contracts_cache" not in st.session_state:
+    st.session_state.contracts_cache = {}  # endpoint -> (fetched_at, contracts)
+if "event_listener" not in st.session_state:
+    st.session_state.event_listener = None
 
 # Helper functions
 def login(email, password):
@@ -22,6 +36,7 @@ def login(email, password):
     if response.status_code == 200:
         response_data = response.json()
         st.session_state.token = response_data["token"]
+        st.session_state.refresh_token = response_data["refresh_token"]
         st.session_state.user = response_data["user"]
         st.session_state.wallet_address = response_data["user"]["wallet_address"]
         st.session_state.logged_in = True
@@ -30,9 +45,19 @@ def login(email, password):
         st.error(response.json().get("error", "Login failed."))
 
 def logout():
-    """Clears session state for logout."""
+    """Revokes the refresh token and clears session state for logout."""
+    if st.session_state.refresh_token:
+        try:
+            requests.post(f"{BASE_URL}/logout", json={"refresh_token": st.session_state.refresh_token})
+        except requests.RequestException:
+            pass  # The refresh token expires on its own
+    if st.session_state.event_listener:
+        st.session_state.event_listener.stop()
+    st.session_state.event_listener = None
+    st.session_state.contracts_cache = {}
     st.session_state.logged_in = False
     st.session_state.token = None
+    st.session_state.refresh_token = None
     st.session_state.user = None
     st.session_state.wallet_address = None
     st.success("Logged out successfully!")
@@ -42,13 +67,200 @@ def get_headers():
     """Returns headers with Authorization token."""
     return {"Authorization": f"Bearer {st.session_state.token}"} if st.session_state.token else {}
 
-def add_apartment(title, location, description, price_in_jod, lease_duration, availability, photos=None):
-    headers = get_headers()
-
-    # Calculate equivalent ETH price
-    JOD_TO_ETH_RATE = 0.001  # Ensure this matches the backend
-    rent_amount_eth = price_in_jod * JOD_TO_ETH_RATE
+def refresh_access_token():
+    """Swaps the refresh token for a new token pair. Returns False when the session is over."""
+    if not st.session_state.refresh_token:
+        return False
+    response = requests.post(f"{BASE_URL}/token/refresh", json={"refresh_token": st.session_state.refresh_token})
+    if response.status_code != 200:
+        st.session_state.refresh_token = None
+        return False
+    response_data = response.json()
+    st.session_state.token = response_data["token"]
+    st.session_state.refresh_token = response_data["refresh_token"]
+    return True
+
+def token_expiring(margin=60):
+    """True if the access token expires within margin seconds. The signature is checked by the backend."""
+    if not st.session_state.token:
+        return False
+    claims = jwt.decode(st.session_state.token, options={"verify_signature": False})
+    return claims.get("exp", 0) - time.time() < margin
+
+def api_request(method, path, **kwargs):
+    """Calls the backend with the access token, refreshing it silently instead of asking for a new login."""
+    extra_headers = kwargs.pop("headers", {})
+    if token_expiring():
+        refresh_access_token()
+    response = requests.request(method, f"{BASE_URL}{path}", headers={**get_headers(), **extra_headers}, **kwargs)
+    if response.status_code == 401 and refresh_access_token():
+        response = requests.request(method, f"{BASE_URL}{path}", headers={**get_headers(), **extra_headers}, **kwargs)
+    return response
+
+def idempotent_request(action, method, path, **kwargs):
+    """Sends a chain-writing request with an Idempotency-Key that is reused until the backend gives a final answer.
+
+    A double-click, rerun or network retry then returns the first result instead of sending another transaction.
+    """
+    keys = st.session_state.setdefault("idempotency_keys", {})
+    key = keys.setdefault(action, uuid.uuid4().hex)
+    response = api_request(method, path, headers={"Idempotency-Key": key}, **kwargs)
+    if response.status_code not in (409, 502, 503, 504):
+        keys.pop(action, None)  # Final outcome, the next submit is a new request
+    return response
+
+def signed_request(action, path, payload, private_key):
+    """Gets the unsigned transaction from the backend, signs it here and sends it through /tx/relay.
+
+    The private key never leaves this app. A new lease with its own contract takes two
+    rounds (deploy, then sign), every other action one.
+    """
+    response = None
+    for _ in range(3):
+        response = idempotent_request(action, "POST", path, json=payload)
+        if response.status_code != 200 or "template_id" not in response.json():
+            return response
+        template = response.json()
+        transaction = {key: int(value, 16) if key not in ("to", "data") else value
+                       for key, value in template["transaction"].items() if key != "from"}
+        signed = Account.sign_transaction(transaction, private_key)
+        response = api_request("POST", "/tx/relay", json={
+            "template_id": template["template_id"],
+            "raw_transaction": "0x" + bytes(signed.raw_transaction).hex()
+        })
+        if response.status_code != 200 or template["action"] != "deploy":
+            return response
+    return response
+
+class ContractEventListener:
+    """Reads the backend's event stream on a background thread and queues events for the page."""
+
+    def __init__(self, token):
+        self.token = token  # Updated by the page whenever the access token is refreshed
+        self.events = deque(maxlen=500)
+        self.connected = False
+        self.last_event_id = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="contract-events", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            headers = {"Last-Event-ID": str(self.last_event_id)} if self.last_event_id is not None else {}
+            try:
+                # A single-use ticket opens the stream, the access token never goes in the URL
+                ticket = requests.post(f"{BASE_URL}/events/ticket", headers={"Authorization": f"Bearer {self.token}"},
+                                       timeout=5)
+                if ticket.status_code != 200:
+                    raise requests.RequestException(ticket.text)
+                with requests.get(f"{BASE_URL}/events/stream", params={"ticket": ticket.json()["ticket"]},
+                                  headers=headers, stream=True, timeout=(5, 60)) as response:
+                    if response.status_code == 200:
+                        self.connected = True
+                        backoff = 1
+                        self._read(response)
+            except requests.RequestException:
+                pass
+            self.connected = False
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _read(self, response):
+        event = {}
+        for line in response.iter_lines(decode_unicode=True):
+            if self._stop.is_set():
+                return
+            if not line:
+                # A blank line ends the event
+                if "data" in event:
+                    self.last_event_id = int(event.get("id", self.last_event_id or 0))
+                    self.events.append((event.get("event", "message"), json.loads(event["data"])))
+                event = {}
+            elif not line.startswith(":"):  # Lines starting with ':' are heartbeats
+                field, _, value = line.partition(":")
+                event[field] = value.lstrip(" ")
+
+
+EVENT_MESSAGES = {
+    "contract.initiated": "New lease request for apartment {apartment_id}.",
+    "contract.status": "Lease for apartment {apartment_id} is now {status}.",
+    "payment.confirmed": "Rent payment confirmed for apartment {apartment_id}.",
+    "contract.terminated": "Lease for apartment {apartment_id} was terminated.",
+    "contract.completed": "Lease for apartment {apartment_id} is complete.",
+    "contract.cancelled": "Lease request for apartment {apartment_id} was cancelled.",
+    "contract.overdue": "Rent for apartment {apartment_id} is overdue since {overdue_since}."
+}
+
+def apply_contract_event(event_type, data):
+    """Patches the cached contract lists in place. Returns True if the page should be redrawn."""
+    cache = st.session_state.contracts_cache
+    if event_type == "resync":
+        cache.clear()  # Events were missed, refetch on the next render
+        return True
+    if event_type not in EVENT_MESSAGES:
+        return False
+
+    st.toast(EVENT_MESSAGES[event_type].format(**data))
+    found = False
+    for _, contracts in cache.values():
+        for contract in contracts:
+            if contract["id"] == data["id"]:
+                contract.update({key: data[key] for key in ("status", "next_payment_date", "overdue_since")})
+                found = True
+    if not found:
+        cache.clear()  # A new contract, the lists need its full row
+    return True
+
+@st.fragment(run_every=2)
+def live_contract_updates():
+    """Applies pushed events every few seconds and redraws the page only when something changed."""
+    if st.session_state.event_listener is None:
+        st.session_state.event_listener = ContractEventListener(st.session_state.token)
+    listener = st.session_state.event_listener
+    if token_expiring():
+        refresh_access_token()
+    listener.token = st.session_state.token
+
+    changed = False
+    while listener.events:
+        event_type, data = listener.events.popleft()
+        changed = apply_contract_event(event_type, data) or changed
+    if changed:
+        st.rerun()
+
+def get_exchange_rate():
+    """Fetches the current JOD to ETH rate from the backend."""
+    response = requests.get(f"{BASE_URL}/exchange-rate")
+    response.raise_for_status()
+    return response.json()["jod_to_eth"]
+
+def upload_photos_direct(photos):
+    """Uploads photos straight to storage with presigned URLs. Returns their keys, or None if unsupported."""
+    keys = []
+    for idx, photo in enumerate(photos):
+        response = api_request("POST", "/photos/upload-url",
+                               json={"filename": f"photo_{idx}.jpg", "content_type": "image/jpeg"})
+        if response.status_code != 200:
+            return None  # Local storage, the photos go with the form instead
+        upload = response.json()
+        requests.request(upload["method"], upload["url"], data=photo, headers=upload["headers"]).raise_for_status()
+        keys.append(upload["key"])
+    return keys
+
+def photo_form_fields(photos):
+    """Form data and files for the apartment photos, preferring direct uploads."""
+    if not photos:
+        return {}, []
+    keys = upload_photos_direct(photos)
+    if keys is not None:
+        return {"photo_keys": keys}, []
+    return {}, [('photos', (f'photo_{idx}.jpg', photo, 'image/jpeg')) for idx, photo in enumerate(photos)]
 
+def add_apartment(title, location, description, price_in_jod, lease_duration, availability, photos=None):
     # Prepare form data
     apartment_data = {
         "landlord_wallet": st.session_state.wallet_address,
@@ -60,20 +272,21 @@ def add_apartment(title, location, description, price_in_jod, lease_duration, av
         "availability": availability
     }
 
-    # Prepare files
-    files = []
-    if photos:
-        for idx, photo in enumerate(photos):
-            files.append(('photos', (f'photo_{idx}.jpg', photo, 'image/jpeg')))
-
     try:
+        # Prepare photos
+        photo_fields, files = photo_form_fields(photos)
+        apartment_data.update(photo_fields)
+
+        # Calculate equivalent ETH price using the backend's current rate
+        rent_amount_eth = price_in_jod * get_exchange_rate()
+
         # Display ETH price for confirmation
         st.write(f"Price in ETH (converted): {rent_amount_eth:.6f} ETH")
 
-        response = requests.post(
-            f"{BASE_URL}/add-apartment",
+        response = api_request(
+            "POST",
+            "/add-apartment",
             data=apartment_data,
-            headers=headers,
             files=files
         )
 
@@ -90,8 +303,6 @@ def add_apartment(title, location, description, price_in_jod, lease_duration, av
 
 
 def edit_apartment(apartment_id, location, title, description, price_in_jod, lease_duration, availability, photos=None):
-    headers = get_headers()
-
     apartment_data = {
         "title": title,
         "location": location,
@@ -101,19 +312,15 @@ def edit_apartment(apartment_id, location, title, description, price_in_jod, lea
         "availability": availability
     }
 
-    files = []
-    if photos:
-        for idx, photo in enumerate(photos):
-            files.append(('photos', (f'photo_{idx}.jpg', photo, 'image/jpeg')))
-
     try:
-       
-        st.write(f"Uploading {len(files)} photos")
+        photo_fields, files = photo_form_fields(photos)
+        apartment_data.update(photo_fields)
+        st.write(f"Uploading {len(photos or [])} photos")
 
-        response = requests.put(
-            f"{BASE_URL}/edit-apartment/{apartment_id}",
+        response = api_request(
+            "PUT",
+            f"/edit-apartment/{apartment_id}",
             data=apartment_data,
-            headers=headers,
             files=files
         )
 
@@ -129,8 +336,7 @@ def edit_apartment(apartment_id, location, title, description, price_in_jod, lea
 
 def delete_apartment(apartment_id):
     """Sends a request to delete an apartment."""
-    headers = get_headers()
-    response = requests.delete(f"{BASE_URL}/delete-apartment/{apartment_id}", headers=headers)
+    response = api_request("DELETE", f"/delete-apartment/{apartment_id}")
     if response.status_code == 200:
         
          # Trigger a refresh of the apartment listings
@@ -138,10 +344,10 @@ def delete_apartment(apartment_id):
     else:
         st.error(response.json().get("error", "Failed to delete apartment."))
 
-def sign_agreement(apartment_id, role):
-    with st.form(f"sign_form_{apartment_id}_{role}", clear_on_submit=True):
+def sign_agreement(apartment_id, role, contract_id):
+    with st.form(f"sign_form_{contract_id}_{role}", clear_on_submit=True):
         st.write(f"Sign agreement for Apartment {apartment_id}")
-        private_key = st.text_input("Enter private key", type="password", key=f"key_{apartment_id}")
+        private_key = st.text_input("Enter private key", type="password", key=f"key_{contract_id}")
         submitted = st.form_submit_button("Sign Agreement")
         
         if submitted:
@@ -150,15 +356,16 @@ def sign_agreement(apartment_id, role):
                 return
             
             try:
-                response = requests.post(
-                    f"{BASE_URL}/contracts/sign",
-                    json={
+                response = signed_request(
+                    f"sign_{contract_id}_{role}",
+                    "/contracts/sign",
+                    {
+                        "contract_id": contract_id,
                         "apartment_id": apartment_id,
                         "wallet_address": st.session_state.wallet_address,
-                        "role": role,
-                        "private_key": private_key
+                        "role": role
                     },
-                    headers=get_headers()
+                    private_key
                 )
                 
                 if response.status_code == 200:
@@ -171,11 +378,18 @@ def sign_agreement(apartment_id, role):
 
 
 def fetch_contracts(endpoint):
-    response = requests.get(f"{BASE_URL}/{endpoint}", headers=get_headers())
+    """Returns the contract list, from the session cache when it is fresh."""
+    cached = st.session_state.contracts_cache.get(endpoint)
+    if cached and time.time() - cached[0] < CONTRACTS_CACHE_TTL:
+        return cached[1]
+
+    response = api_request("GET", f"/{endpoint}")
 
     if response.status_code == 200:
         try:
-            return response.json()
+            contracts = response.json()
+            st.session_state.contracts_cache[endpoint] = (time.time(), contracts)
+            return contracts
         except ValueError:
             st.error("Invalid JSON response from server.")
             return []
@@ -188,6 +402,9 @@ def make_payment(apartment_id, amount, unique_key):
     with st.form(f"payment_form_{apartment_id}_{unique_key}", clear_on_submit=True):  # Use unique_key for uniqueness
         st.write(f"Make Payment for Apartment {apartment_id}")
         private_key = st.text_input("Enter your private key", type="password", key=f"private_key_{apartment_id}_{unique_key}")
+        months = st.number_input("Months to pay", min_value=1, max_value=12, value=1, step=1,
+                                 key=f"months_{apartment_id}_{unique_key}")
+        st.caption(f"{amount} ETH per month, several months are paid in a single transaction")
         submitted = st.form_submit_button("Make Payment")
 
         if submitted:
@@ -196,16 +413,18 @@ def make_payment(apartment_id, amount, unique_key):
                 return
 
             payload = {
+                "contract_id": unique_key,  # The contract id, an apartment can have several leases
                 "apartment_id": apartment_id,
                 "wallet_address": st.session_state.wallet_address,  # Ensure wallet address is included
-                "private_key": private_key,  # Include the private key for signing the transaction
-                "payment_amount": amount
+                "payment_amount": amount,
+                "months": int(months)
             }
 
             try:
-                response = requests.post(f"{BASE_URL}/contracts/pay", json=payload, headers=get_headers())
+                # Signed here, the key is not sent to the backend
+                response = signed_request(f"pay_{apartment_id}_{unique_key}", "/contracts/pay", payload, private_key)
                 if response.status_code == 200:
-                    st.success("Payment made successfully!")
+                    st.success(f"Payment made successfully! Next payment due {response.json().get('next_payment_date')}.")
                 else:
                     error_message = response.json().get("error", "Failed to make payment.")
                     st.error(f"Error: {error_message}")
@@ -225,15 +444,16 @@ def terminate_contract(apartment_id, role, unique_key):
 
             # Construct the payload
             payload = {
+                "contract_id": unique_key,  # The contract id, an apartment can have several leases
                 "apartment_id": apartment_id,
                 "role": role,
-                "wallet_address": st.session_state.wallet_address,
-                "private_key": private_key
+                "wallet_address": st.session_state.wallet_address
             }
 
-            # Make the API request to terminate the contract
+            # Make the API request to terminate the contract, signed here
             try:
-                response = requests.post(f"{BASE_URL}/contracts/terminate", json=payload, headers=get_headers())
+                response = signed_request(f"terminate_{apartment_id}_{unique_key}", "/contracts/terminate", payload,
+                                          private_key)
                 if response.status_code == 200:
                     st.success("Contract terminated successfully!")
                     st.json(response.json())  # Optionally display the transaction details
@@ -319,8 +539,37 @@ def landing_page():
         st.write("Contact Us: Reach out at support@rentalsystem.com or call +123456789.")
 
 
+def show_landlord_summary():
+    """Headline numbers from the precomputed summary, one small request."""
+    response = api_request("GET", "/landlord/summary")
+    if response.status_code != 200:
+        st.error(response.json().get("error", "Failed to load your summary."))
+        return
+
+    summary = response.json()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Apartments", summary["apartments_total"], f"{summary['apartments_available']} available", delta_color="off")
+    occupancy = summary["occupancy_rate"]
+    col2.metric("Occupancy", f"{occupancy:.0%}" if occupancy is not None else "-")
+    col3.metric("Monthly Rent", f"{summary['expected_monthly_rent_jod']:,.2f} JOD",
+                f"{summary['expected_monthly_rent_eth']:.4f} ETH", delta_color="off")
+    col4.metric("Overdue", summary["overdue_contracts"])
+    st.caption(
+        f"Pending: {summary['contracts_pending']} | Landlord Signed: {summary['contracts_landlord_signed']} | "
+        f"Active: {summary['contracts_active']} | Completed: {summary['contracts_completed']} | "
+        f"Terminated: {summary['contracts_terminated']}"
+    )
+
+    if summary["upcoming_payments"]:
+        st.write("**Upcoming Payments**")
+        for payment in summary["upcoming_payments"]:
+            overdue = f" (overdue since {payment['overdue_since']})" if payment["overdue_since"] else ""
+            st.write(f"Apartment {payment['apartment_id']}: {payment['next_payment_date']}{overdue}")
+
+
 def landlord_dashboard():
     st.header(f"Welcome, {st.session_state.user['name']} (Landlord)")
+    show_landlord_summary()
     tab1, tab2, tab3, tab4 = st.tabs(["Add Apartment", "Manage Listings", "My Profile", "My Contracts"])
 
     # Add Apartment
@@ -344,7 +593,7 @@ def landlord_dashboard():
     # Manage Listings
     with tab2:
         st.subheader("Your Current Listings")
-        response = requests.get(f"{BASE_URL}/landlord-apartments", headers=get_headers())
+        response = api_request("GET", "/landlord-apartments")
         if response.status_code == 200:
             apartments = response.json()
             for apt in apartments:
@@ -380,9 +629,9 @@ def landlord_dashboard():
         # Button to save profile changes
         if st.button("Save Profile Changes"):
             try:
-                response = requests.put(
-                    f"{BASE_URL}/update-profile",
-                    headers=get_headers(),
+                response = api_request(
+                    "PUT",
+                    "/update-profile",
                     json={
                         "name": name,
                         "phone": phone
@@ -401,12 +650,15 @@ def landlord_dashboard():
     with tab4:
         tab1, tab2 = st.tabs(["Pending Contracts", "Active Contracts"])
 
+        # One request, grouped by status for both tabs
+        contracts_by_status = {}
+        for contract in fetch_contracts("landlord-contracts"):
+            contracts_by_status.setdefault(contract["status"], []).append(contract)
+
         # Pending Contracts Tab
         with tab1:
-            
-            contracts = fetch_contracts("landlord-contracts")
-            pending_contracts = [contract for contract in contracts if contract["status"] == "Pending"]
-            landlord_signed_contracts = [contract for contract in contracts if contract["status"] == "Landlord Signed"]
+            pending_contracts = contracts_by_status.get("Pending", [])
+            landlord_signed_contracts = contracts_by_status.get("Landlord Signed", [])
             # Display Pending Contracts
             st.subheader("Pending Contracts")
             for contract in pending_contracts:
@@ -417,7 +669,7 @@ def landlord_dashboard():
               st.write(f"**End Date:** {contract.get('end_date', 'Not Specified')}")
               st.write(f"**Rent Amount:** {contract['rent_amount']} ETH")
               st.write(f"**Lease Duration:** {contract['lease_duration']} months")
-              sign_agreement(contract['apartment_id'], "Landlord")
+              sign_agreement(contract['apartment_id'], "Landlord", contract['id'])
 
             # Display Landlord Signed Contracts
             st.subheader("Landlord Signed Contracts")
@@ -439,8 +691,7 @@ def landlord_dashboard():
         # Active Contracts Tab
         with tab2:
             st.subheader("Active Contracts")
-            contracts = fetch_contracts("landlord-contracts?status=Active")
-            for contract in contracts:
+            for contract in contracts_by_status.get("Active", []):
                 st.subheader(f"Apartment {contract['apartment_id']}")
                 st.write(f"**Contract Address:** {contract['contract_address']}")
                 st.write(f"**Tenant Wallet:** {contract['tenant_wallet']}")
@@ -465,7 +716,7 @@ def tenant_dashboard():
     with tab1:
         st.subheader("Browse Available Apartments")
         try:
-            response = requests.get(f"{BASE_URL}/available-apartments", headers=get_headers())
+            response = api_request("GET", "/available-apartments")
 
             if response.status_code == 200:
                 apartments = response.json()
@@ -505,15 +756,15 @@ def tenant_dashboard():
                                     st.error("The rental period must be at least 1 month.")
                                 else:
                                     try:
-                                        rent_response = requests.post(
-                                            f"{BASE_URL}/contracts/initiate",
+                                        rent_response = api_request(
+                                            "POST",
+                                            "/contracts/initiate",
                                             json={
                                                 "tenant_wallet": st.session_state.wallet_address,
                                                 "apartment_id": apt["id"],
                                                 "start_date": start_date.strftime('%Y-%m-%d'),
                                                 "end_date": end_date.strftime('%Y-%m-%d')
-                                            },
-                                            headers=get_headers()
+                                            }
                                         )
 
                                         if rent_response.status_code == 200:
@@ -540,12 +791,16 @@ def tenant_dashboard():
         st.subheader("My Contracts")
         tab1, tab2 = st.tabs(["Pending Contracts", "Active Contracts"])
 
+        # One request, grouped by status for both tabs
+        contracts_by_status = {}
+        for contract in fetch_contracts("tenant-contracts"):
+            contracts_by_status.setdefault(contract["status"], []).append(contract)
+
         # Pending Contracts
         with tab1:
             st.subheader("Landlord Signed Contracts")
-            contracts = fetch_contracts("tenant-contracts")
-            pending_contracts = [contract for contract in contracts if contract["status"] == "Pending"]
-            landlord_signed_contracts = [contract for contract in contracts if contract["status"] == "Landlord Signed"]
+            pending_contracts = contracts_by_status.get("Pending", [])
+            landlord_signed_contracts = contracts_by_status.get("Landlord Signed", [])
             for contract in landlord_signed_contracts:
                 st.write(f"**Landlord Wallet:** {contract['landlord_wallet']}")
                 st.write(f"**Apartment ID:** {contract['apartment_id']}")
@@ -553,7 +808,7 @@ def tenant_dashboard():
                 st.write(f"**End Date:** {contract.get('end_date', 'Not Specified')}")
                 st.write(f"**Status:** {contract['status']}")
                 st.info("Ready for you to sign.")
-                sign_agreement(contract['apartment_id'], "Tenant")
+                sign_agreement(contract['apartment_id'], "Tenant", contract['id'])
                 
             st.subheader("Pending Contracts")
             for contract in pending_contracts:
@@ -571,8 +826,7 @@ def tenant_dashboard():
         # Active Contracts
         with tab2:
             st.subheader("Active Contracts")
-            contracts = fetch_contracts("tenant-contracts?status=Active")
-            for contract in contracts:
+            for contract in contracts_by_status.get("Active", []):
                 st.subheader(f"Apartment {contract['apartment_id']}")
                 st.write(f"**Contract Address:** {contract['contract_address']}")
                 st.write(f"**Landlord Wallet:** {contract['landlord_wallet']}")
@@ -599,9 +853,9 @@ def tenant_dashboard():
         # Button to save profile changes
         if st.button("Save Profile Changes"):
             try:
-                response = requests.put(
-                    f"{BASE_URL}/update-profile",
-                    headers=get_headers(),
+                response = api_request(
+                    "PUT",
+                    "/update-profile",
                     json={
                         "name": name,
                         "phone": phone
@@ -629,4 +883,6 @@ else:
     if role == "Landlord":
         landlord_dashboard()
     elif role == "Tenant":
-        tenant_dashboard()
\ No newline at end of file
+        tenant_dashboard()
+    if role in ("Landlord", "Tenant"):
+        live_contract_updates()
\ No newline at end of file
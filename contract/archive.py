@@ -0,0 +1,161 @@
+"""Moves closed contracts out of the hot contracts table.
+
+Runs inside the backend on a timer, or once from the command line:
+    python archive.py --days 90
+"""
+import argparse
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from db import column_names, ensure_column
+
+logger = logging.getLogger(__name__)
+
+CLOSED_STATUSES = ('Completed', 'Terminated', 'Cancelled')
+
+
+def enable_incremental_vacuum(conn):
+    """Switches the database to incremental auto-vacuum. Must run outside a transaction.
+
+    The mode only applies to an existing file after a full VACUUM, so that one-off
+    rewrite happens the first time this runs against an older database.
+    """
+    if conn.execute('PRAGMA auto_vacuum').fetchall()[0][0] != 2:  # 2 = INCREMENTAL
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+
+
+def init_archive_tables(cursor):
+    ensure_column(cursor, 'contracts', 'closed_at', 'TEXT')  # Set when the lease is completed, terminated or cancelled
+    cursor.execute('DROP TRIGGER IF EXISTS trg_contracts_closed_at')  # Recreated with the current CLOSED_STATUSES
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_contracts_closed_at AFTER UPDATE OF status ON contracts
+        FOR EACH ROW WHEN NEW.status IN {CLOSED_STATUSES} AND OLD.status IS NOT NEW.status
+        BEGIN
+            UPDATE contracts SET closed_at = strftime('%Y-%m-%d', 'now') WHERE id = NEW.id;
+        END
+    ''')
+
+    # Same columns as contracts plus archived_at; no constraints, rows are copied as they were
+    cursor.execute('CREATE TABLE IF NOT EXISTS contracts_archive AS SELECT * FROM contracts WHERE 0')
+    sync_archive_columns(cursor)
+    ensure_column(cursor, 'contracts_archive', 'archived_at', 'TEXT')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_contracts_archive_id ON contracts_archive (id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contracts_archive_tenant_status ON contracts_archive (tenant_wallet, status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contracts_archive_landlord_status ON contracts_archive (landlord_wallet, status)')
+
+    # Tenant contract lists filter by wallet and status (the landlord index comes with the summary)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contracts_tenant_status ON contracts (tenant_wallet, status)')
+
+
+def sync_archive_columns(cursor):
+    """Adds columns that were added to contracts since the archive table was created."""
+    cursor.execute('PRAGMA table_info(contracts)')
+    for _, name, column_type, *_ in cursor.fetchall():
+        ensure_column(cursor, 'contracts_archive', name, column_type)
+
+
+class ContractArchiver:
+    """Copies closed contracts older than min_age_days into contracts_archive in small transactions."""
+
+    def __init__(self, database_file, min_age_days=90, chunk_size=500, vacuum_pages=2000, interval=86400,
+                 housekeeping=None):
+        self.database_file = database_file
+        self.min_age_days = min_age_days
+        self.chunk_size = chunk_size
+        self.vacuum_pages = vacuum_pages  # Free pages returned to the OS per run
+        self.interval = interval
+        self.housekeeping = housekeeping or {}  # stat name -> callable returning a row count, run before vacuuming
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="contract-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                stats = self.run_once()
+                logger.info("Contract archive finished: %s", stats)
+            except Exception:
+                logger.exception("Contract archive failed")
+            self._stop.wait(self.interval)
+
+    def run_once(self, today=None):
+        today = today or datetime.utcnow().strftime('%Y-%m-%d')
+        cutoff = (datetime.strptime(today, '%Y-%m-%d') - timedelta(days=self.min_age_days)).strftime('%Y-%m-%d')
+        stats = {"archived": 0, "chunks": 0, "pages_freed": 0}
+
+        # Autocommit mode so each chunk is its own short BEGIN IMMEDIATE transaction
+        conn = sqlite3.connect(self.database_file, isolation_level=None, timeout=30)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            sync_archive_columns(cursor)
+            cursor.execute('COMMIT')
+            columns = ", ".join(column_names(cursor, 'contracts'))
+
+            while not self._stop.is_set():
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute(f'''
+                    SELECT id FROM contracts
+                    WHERE status IN {CLOSED_STATUSES} AND COALESCE(closed_at, end_date) < ?
+                    LIMIT ?
+                ''', (cutoff, self.chunk_size))
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    cursor.execute('COMMIT')
+                    break
+
+                placeholders = ", ".join("?" * len(ids))
+                cursor.execute(f'''
+                    INSERT OR REPLACE INTO contracts_archive ({columns}, archived_at)
+                    SELECT {columns}, ? FROM contracts WHERE id IN ({placeholders})
+                ''', [today] + ids)
+                cursor.execute(f'DELETE FROM contracts WHERE id IN ({placeholders})', ids)
+                cursor.execute('COMMIT')
+                stats["archived"] += len(ids)
+                stats["chunks"] += 1
+
+            for name, task in self.housekeeping.items():
+                stats[name] = task()
+
+            # Give a bounded number of the freed pages back to the filesystem
+            cursor.execute('PRAGMA freelist_count')
+            free_before = cursor.fetchone()[0]
+            cursor.execute(f'PRAGMA incremental_vacuum({int(self.vacuum_pages)})').fetchall()
+            cursor.execute('PRAGMA freelist_count')
+            stats["pages_freed"] = free_before - cursor.fetchone()[0]
+            return stats
+        except Exception:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="rental_agreement.db")
+    parser.add_argument("--days", type=int, default=90, help="archive leases closed more than this many days ago")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--vacuum-pages", type=int, default=2000)
+    args = parser.parse_args()
+
+    archiver = ContractArchiver(args.database, min_age_days=args.days, chunk_size=args.chunk_size,
+                                vacuum_pages=args.vacuum_pages)
+    print(archiver.run_once())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import functools
+import hashlib
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import bcrypt
+import jwt
+from flask import g, jsonify, request
+
+REQUIRED_CLAIMS = ("user_id", "role", "wallet_address", "exp")
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class RefreshTokenError(Exception):
+    pass
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded pool so a login storm cannot tie up every request thread."""
+
+    def __init__(self, rounds=12, workers=2, use_processes=False, max_pending=32, queue_timeout=10):
+        self.rounds = rounds
+        pool_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self._pool = pool_class(max_workers=workers)
+        # Callers beyond max_pending wait up to queue_timeout, then get PasswordHasherBusy
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.queue_timeout = queue_timeout
+
+    def hash(self, password):
+        return self._run(_hashpw, password.encode('utf-8'), self.rounds).decode('utf-8')
+
+    def verify(self, password, hashed):
+        return self._run(_checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PasswordHasherBusy("Too many concurrent password checks, try again shortly.")
+        try:
+            return self._pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+
+class TokenVerifier:
+    """Verifies JWTs and caches the claims of valid tokens until they expire."""
+
+    def __init__(self, secret, algorithms=("HS256",), cache_size=10000, user_loader=None):
+        self.secret = secret
+        self.user_loader = user_loader  # Optional user_id -> user record, for current role and wallet
+        self.algorithms = list(algorithms)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # token -> claims, oldest first
+        self._lock = threading.Lock()
+
+    def verify(self, token):
+        """Returns the token's claims, or None if it is invalid, expired or missing claims."""
+        now = time.time()
+        with self._lock:
+            claims = self._cache.get(token)
+            if claims is not None:
+                if claims["exp"] > now:
+                    self._cache.move_to_end(token)
+                    return claims
+                del self._cache[token]
+
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=self.algorithms,
+                                options={"require": ["exp"]})
+        except jwt.InvalidTokenError:
+            return None
+        if any(claims.get(name) is None for name in REQUIRED_CLAIMS):
+            return None
+
+        with self._lock:
+            self._cache[token] = claims
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return claims
+
+    def require_auth(self, roles=None):
+        """Route decorator: parses the Bearer token, checks the role and exposes the claims as g.user."""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                header = request.headers.get("Authorization")
+                if not header:
+                    return jsonify({"error": "Authorization header missing"}), 401
+                token = header.split("Bearer ")[-1]
+
+                claims = self.verify(token)
+                if not claims:
+                    return jsonify({"error": "Invalid or expired token"}), 401
+
+                # Role and wallet come from the user record so changes apply before the token expires
+                if self.user_loader:
+                    user = self.user_loader(claims["user_id"])
+                    if not user:
+                        return jsonify({"error": "User no longer exists"}), 401
+                    claims = dict(claims, role=user["role"], wallet_address=user["wallet_address"])
+                if roles and claims["role"] not in roles:
+                    return jsonify({"error": "Unauthorized access"}), 403
+
+                g.user = claims
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+def init_refresh_token_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS refresh_tokens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            token_hash TEXT NOT NULL UNIQUE, -- SHA-256 of the token, the token itself is never stored
+            family_id TEXT NOT NULL, -- Every token rotated from the same sign-in shares a family
+            expires_at INTEGER NOT NULL,
+            revoked_at INTEGER,
+            replaced_by INTEGER,
+            created_at INTEGER NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_refresh_tokens_family ON refresh_tokens (family_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_refresh_tokens_expires ON refresh_tokens (expires_at)')
+
+
+def _hash_refresh_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class RefreshTokenStore:
+    """Long-lived, single-use refresh tokens with rotation and reuse detection."""
+
+    def __init__(self, database_file, lifetime=30 * 24 * 3600):
+        self.database_file = database_file
+        self.lifetime = lifetime
+
+    def issue(self, user_id, family_id=None, cursor=None):
+        """Creates a refresh token for a new sign-in, or for an existing family when rotating."""
+        token = secrets.token_urlsafe(32)
+        now = int(time.time())
+        own_connection = cursor is None
+        if own_connection:
+            conn = sqlite3.connect(self.database_file)
+            cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO refresh_tokens (user_id, token_hash, family_id, expires_at, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (user_id, _hash_refresh_token(token), family_id or uuid.uuid4().hex, now + self.lifetime, now))
+        if own_connection:
+            conn.commit()
+            conn.close()
+        return token
+
+    def rotate(self, token):
+        """Consumes a refresh token and returns (user_id, new_refresh_token)."""
+        now = int(time.time())
+        conn = sqlite3.connect(self.database_file, isolation_level=None)
+        try:
+            cursor = conn.cursor()
+            # Take the write lock up front so two concurrent refreshes cannot both succeed
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                SELECT id, user_id, family_id, expires_at, revoked_at FROM refresh_tokens WHERE token_hash = ?
+            ''', (_hash_refresh_token(token),))
+            row = cursor.fetchone()
+            if not row:
+                cursor.execute('ROLLBACK')
+                raise RefreshTokenError("Invalid refresh token")
+
+            token_id, user_id, family_id, expires_at, revoked_at = row
+            if revoked_at is not None:
+                # A rotated token was presented again, assume it leaked and end the whole session
+                cursor.execute('''
+                    UPDATE refresh_tokens SET revoked_at = ? WHERE family_id = ? AND revoked_at IS NULL
+                ''', (now, family_id))
+                cursor.execute('COMMIT')
+                raise RefreshTokenError("Refresh token reuse detected, please log in again")
+            if expires_at <= now:
+                cursor.execute('ROLLBACK')
+                raise RefreshTokenError("Refresh token expired, please log in again")
+
+            new_token = self.issue(user_id, family_id, cursor)
+            cursor.execute('UPDATE refresh_tokens SET revoked_at = ?, replaced_by = ? WHERE id = ?',
+                           (now, cursor.lastrowid, token_id))
+            cursor.execute('COMMIT')
+            return user_id, new_token
+        finally:
+            conn.close()
+
+    def revoke(self, token):
+        """Revokes the token's whole family (logout). Returns False for unknown tokens."""
+        conn = sqlite3.connect(self.database_file)
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE refresh_tokens SET revoked_at = ?
+            WHERE revoked_at IS NULL
+              AND family_id = (SELECT family_id FROM refresh_tokens WHERE token_hash = ?)
+        ''', (int(time.time()), _hash_refresh_token(token)))
+        revoked = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return revoked
+
+    def purge_expired(self):
+        conn = sqlite3.connect(self.database_file)
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM refresh_tokens WHERE expires_at <= ?', (int(time.time()),))
+        purged = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return purged
@@ -1,18 +1,39 @@
 from web3 import Web3
 import json
 import os
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
-import bcrypt
 import jwt
 import sqlite3
 import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
 from flask import send_from_directory
-from werkzeug.utils import secure_filename
-from solcx import compile_source
+from auth import (PasswordHasher, PasswordHasherBusy, RefreshTokenError, RefreshTokenStore, TokenVerifier,
+                  init_refresh_token_tables)
+from compiler import CONTRACT_VARIANTS
+from bindings import bindings_from_env
 from datetime import datetime, timedelta
-from decimal import Decimal
+from money import jod_to_wei, wei_to_eth, wei_to_db, wei_from_db, migrate_money_columns
+from rates import RateProvider, init_rate_tables, DEFAULT_JOD_TO_ETH_RATE
+from fees import FeeStrategy
+from receipts import ReceiptWaiter, TransactionDropped
+from preflight import Preflight, TransactionReverted
+from scheduler import PENDING_HOLD_HOURS, LeaseSweeper, init_schedule_tables
+from user_cache import UserCache, init_user_indexes, public_user, same_wallet
+from summary import init_summary_tables, read_landlord_summary
+from events import EventBroker, EventBrokerFull
+from archive import CLOSED_STATUSES, ContractArchiver, enable_incremental_vacuum, init_archive_tables
+from photo_gc import PhotoGarbageCollector, init_photo_tables
+from storage import StorageError, new_photo_key, storage_from_env
+from idempotency import IdempotencyStore, init_idempotency_tables
+from relay import RelayError, TransactionRelay, apply_effect, init_relay_tables
+from leases import available_apartment_ids, init_lease_index, overlapping_leases
+from geo import apartments_near, init_geo_index, listing_coordinates
+from streaming import iter_rows, streaming_response
+from fields import LANDLORD_CONTRACT_FIELDS, TENANT_CONTRACT_FIELDS, apartment_fields
+from analytics import Analytics, init_analytics_indexes
+from anchoring import LeaseAnchorer, contract_hash, init_anchor_tables, lease_terms, verify_lease
 
 # Load environment variables
 load_dotenv()
@@ -35,12 +56,29 @@ app = Flask(__name__)
 CORS(app)
 
 DATABASE_FILE = "rental_agreement.db"
+PHOTO_GC_MIN_AGE_SECONDS = int(os.getenv("PHOTO_GC_MIN_AGE_SECONDS", 3600))
+MAX_SEARCH_RADIUS_KM = float(os.getenv("MAX_SEARCH_RADIUS_KM", 50))  # Largest /apartments/near radius
+STREAM_FETCH_ROWS = int(os.getenv("STREAM_FETCH_ROWS", 500))  # Rows read per fetchmany by streamed lists
+
+# Which RentalAgreement variant new leases are deployed with, see compiler.CONTRACT_VARIANTS
+RENTAL_CONTRACT_VARIANT = os.getenv("RENTAL_CONTRACT_VARIANT", "standard")
+if RENTAL_CONTRACT_VARIANT not in CONTRACT_VARIANTS:
+    raise Exception(f"Unknown RENTAL_CONTRACT_VARIANT: {RENTAL_CONTRACT_VARIANT}")
+
+# New leases get their own contract (CONTRACT_MODE=per-lease) or an entry in the shared RentalRegistry
+lease_bindings = bindings_from_env(web3, CONTRACT_ABI, RENTAL_CONTRACT_VARIANT)
 
 # Initialize SQLite database
 def init_db():
     conn = sqlite3.connect(DATABASE_FILE)
     cursor = conn.cursor()
 
+    # Lets the archiver return freed pages without a full VACUUM
+    enable_incremental_vacuum(conn)
+
+    # WAL lets the background sweeper write while request handlers read
+    cursor.execute('PRAGMA journal_mode=WAL')
+
     # Users table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -53,6 +91,7 @@ def init_db():
             role TEXT NOT NULL CHECK(role IN ('Landlord', 'Tenant', 'Admin'))
         )
     ''')
+    init_user_indexes(cursor)
 
     # Apartments table with added columns for price in JOD and ETH
     cursor.execute('''
@@ -63,7 +102,8 @@ def init_db():
             title TEXT NOT NULL,
             description TEXT NOT NULL,
             price_in_jod REAL NOT NULL, -- Price in JOD entered by the landlord
-            rent_amount_eth REAL NOT NULL, -- Converted ETH price for the smart contract
+            rent_amount_eth REAL NOT NULL, -- Converted ETH price, for display only
+            rent_amount_wei TEXT, -- Exact rent in wei as integer text, used for transactions
             lease_duration INTEGER NOT NULL,
             availability TEXT NOT NULL CHECK(availability IN ('Available', 'Unavailable')),
             contract_address TEXT -- Column for the smart contract address
@@ -79,6 +119,7 @@ def init_db():
             FOREIGN KEY (apartment_id) REFERENCES apartments (id) ON DELETE CASCADE
         )
     ''')
+    init_photo_tables(cursor)
 
     # Contracts table for storing agreements between landlords and tenants
     cursor.execute('''
@@ -87,7 +128,8 @@ def init_db():
             landlord_wallet TEXT NOT NULL,
             tenant_wallet TEXT NOT NULL,
             apartment_id INTEGER NOT NULL,
-            rent_amount REAL,
+            rent_amount REAL, -- ETH, for display only
+            rent_amount_wei TEXT, -- Exact rent in wei as integer text
             lease_duration INTEGER,
             start_date TEXT,
             end_date TEXT,
@@ -99,6 +141,42 @@ def init_db():
         )
     ''')
 
+    # Refresh tokens for long-lived sessions
+    init_refresh_token_tables(cursor)
+
+    # Stored outcomes of sign/pay/terminate requests, by Idempotency-Key
+    init_idempotency_tables(cursor)
+
+    # Unsigned transactions handed to clients that sign locally
+    init_relay_tables(cursor)
+
+    # JOD->ETH rate history
+    init_rate_tables(cursor)
+
+    # Move rent amounts from REAL ETH to exact integer wei
+    migrate_money_columns(conn)
+
+    # Anchor batches and inclusion proofs; hashes leases created before hashing existed, from wei rents
+    init_anchor_tables(cursor)
+
+    # Overdue tracking and the indexes used by the lease sweeper
+    init_schedule_tables(cursor)
+
+    # closed_at, contracts_archive and the wallet/status indexes
+    init_archive_tables(cursor)
+
+    # Per-landlord dashboard counters, kept current by triggers
+    init_summary_tables(cursor)
+
+    # Open lease periods per apartment, for overlap checks and date-range search
+    init_lease_index(cursor)
+
+    # Listing coordinates and their R*Tree, for radius search
+    init_geo_index(cursor)
+
+    # Indexes behind the admin analytics reports
+    init_analytics_indexes(cursor)
+
     conn.commit()
     conn.close()
 
@@ -106,29 +184,262 @@ def init_db():
 # Initialize the database
 init_db()
 
+# Current JOD->ETH rate, cached in memory and optionally fed from a local file
+rate_provider = RateProvider(
+    DATABASE_FILE,
+    rate_file=os.getenv("JOD_ETH_RATE_FILE"),
+    default_rate=float(os.getenv("DEFAULT_JOD_TO_ETH_RATE", DEFAULT_JOD_TO_ETH_RATE))
+)
+rate_provider.load()
+
+# Gas limits from cached estimates and EIP-1559 fees from a cached fee history
+fee_strategy = FeeStrategy(
+    web3,
+    gas_margin=float(os.getenv("GAS_ESTIMATE_MARGIN", 1.2)),
+    estimate_ttl=int(os.getenv("GAS_ESTIMATE_TTL_SECONDS", 600)),
+    fee_ttl=int(os.getenv("FEE_HISTORY_TTL_SECONDS", 12))
+)
+
+# One background thread follows new blocks and fetches the receipts every request is waiting for
+receipt_waiter = ReceiptWaiter(
+    web3,
+    poll_interval=float(os.getenv("RECEIPT_POLL_INTERVAL_SECONDS", 1.0)),
+    timeout=int(os.getenv("RECEIPT_TIMEOUT_SECONDS", 120)),
+    dropped_after=int(os.getenv("RECEIPT_DROPPED_AFTER_SECONDS", 60))
+)
+
+# Every transaction is simulated against the pending block first; custom errors come from both newer ABIs
+with open("RentalAgreementOptimizedABI.json") as abi_file, open("RentalRegistryABI.json") as registry_abi_file:
+    preflight = Preflight(web3, CONTRACT_ABI, json.load(abi_file), json.load(registry_abi_file),
+                          cache_ttl=int(os.getenv("PREFLIGHT_CACHE_TTL_SECONDS", 3)))
+
+# Apartment photos on the local disk or in an S3-compatible bucket, see PHOTO_STORAGE
+photo_storage = storage_from_env()
+
+# Contract events pushed to each wallet's open /events/stream connections, streams beyond
+# EVENT_MAX_SUBSCRIBERS get a 503. Under serve.py an idle stream is a greenlet, not a thread.
+event_broker = EventBroker(
+    max_queue=int(os.getenv("EVENT_QUEUE_SIZE", 100)),
+    history=int(os.getenv("EVENT_HISTORY_SIZE", 1000)),
+    heartbeat=int(os.getenv("EVENT_HEARTBEAT_SECONDS", 15)),
+    max_subscribers=int(os.getenv("EVENT_MAX_SUBSCRIBERS", 500)),
+    ticket_ttl=int(os.getenv("EVENT_TICKET_TTL_SECONDS", 30))
+)
+
+# Unsigned lease requests hold the apartment's dates this long, then the sweeper cancels them
+PENDING_HOLD_HOURS = int(os.getenv("PENDING_HOLD_HOURS", PENDING_HOLD_HOURS))
+
+# Background job that flags overdue rent, cancels lapsed lease requests and completes expired leases
+lease_sweeper = LeaseSweeper(
+    DATABASE_FILE,
+    web3,
+    lease_bindings,
+    fee_strategy,
+    receipt_waiter=receipt_waiter,
+    operator_key=os.getenv("SCHEDULER_PRIVATE_KEY"),
+    interval=int(os.getenv("SWEEP_INTERVAL_SECONDS", 3600)),
+    overdue_grace_days=int(os.getenv("OVERDUE_GRACE_DAYS", 0)),
+    event_broker=event_broker
+)
+
+
+# bcrypt runs in a bounded pool, off the request threads
+password_hasher = PasswordHasher(
+    rounds=int(os.getenv("BCRYPT_ROUNDS", 12)),
+    workers=int(os.getenv("BCRYPT_WORKERS", 2)),
+    use_processes=os.getenv("BCRYPT_POOL", "thread") == "process",
+    max_pending=int(os.getenv("BCRYPT_MAX_PENDING", 32))
+)
+
+# User records by id, email and wallet, shared by every role and wallet check
+user_cache = UserCache(
+    DATABASE_FILE,
+    max_size=int(os.getenv("USER_CACHE_SIZE", 5000)),
+    ttl=int(os.getenv("USER_CACHE_TTL_SECONDS", 300))
+)
+
+# Verified tokens are cached for their remaining lifetime
+token_verifier = TokenVerifier(
+    JWT_SECRET,
+    cache_size=int(os.getenv("TOKEN_CACHE_SIZE", 10000)),
+    user_loader=user_cache.get_by_id
+)
+require_auth = token_verifier.require_auth
+
+# Refresh tokens let clients renew access tokens without another password check
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL_SECONDS", 3600))
+refresh_tokens = RefreshTokenStore(DATABASE_FILE, lifetime=int(os.getenv("REFRESH_TOKEN_TTL_DAYS", 30)) * 24 * 3600)
+
+# Replays of sign/pay/terminate requests return the stored result instead of sending another transaction
+idempotency_store = IdempotencyStore(DATABASE_FILE, ttl=int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", 24 * 3600)))
+
+# Clients that sign locally get transaction templates and send the signed result through /tx/relay
+tx_relay = TransactionRelay(
+    DATABASE_FILE,
+    web3,
+    receipt_waiter,
+    fee_strategy,
+    ttl=int(os.getenv("TX_TEMPLATE_TTL_SECONDS", 600)),
+    sent_timeout=int(os.getenv("TX_SENT_TIMEOUT_SECONDS", 24 * 3600)),
+    on_confirmed=lambda cursor, event_type, contract_id, tx_hash: event_broker.publish_contracts(
+        cursor, event_type, [contract_id], transaction_hash=tx_hash)
+)
+
+# Background job that moves old closed leases to contracts_archive and purges expired rows
+contract_archiver = ContractArchiver(
+    DATABASE_FILE,
+    min_age_days=int(os.getenv("ARCHIVE_AFTER_DAYS", 90)),
+    chunk_size=int(os.getenv("ARCHIVE_CHUNK_SIZE", 500)),
+    interval=int(os.getenv("ARCHIVE_INTERVAL_SECONDS", 86400)),
+    housekeeping={
+        "refresh_tokens_purged": refresh_tokens.purge_expired,
+        "idempotency_keys_purged": idempotency_store.purge_expired,
+        "tx_templates_resumed": tx_relay.resume_sent,
+        "tx_templates_purged": tx_relay.purge_expired
+    }
+)
+
+# Background job that anchors each batch window's lease hashes on-chain as one Merkle root
+lease_anchorer = LeaseAnchorer(
+    DATABASE_FILE,
+    web3,
+    fee_strategy,
+    receipt_waiter=receipt_waiter,
+    operator_key=os.getenv("ANCHOR_PRIVATE_KEY"),
+    anchor_address=os.getenv("ANCHOR_ADDRESS"),
+    max_batch_size=int(os.getenv("ANCHOR_MAX_BATCH_SIZE", 10000)),
+    interval=int(os.getenv("ANCHOR_INTERVAL_SECONDS", 3600))
+)
+# Both jobs take their nonce from the account's pending count, sharing an account would make them collide
+if (lease_anchorer.operator and lease_sweeper.operator
+        and lease_anchorer.operator.address == lease_sweeper.operator.address):
+    raise Exception("ANCHOR_PRIVATE_KEY must be a different account than SCHEDULER_PRIVATE_KEY")
+
+# Admin market reports, recomputed at most once per TTL
+analytics = Analytics(DATABASE_FILE, ttl=int(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", 300)))
+
 
 # Helper functions
 def hash_password(password):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return password_hasher.hash(password)
 
 def verify_password(password, hashed):
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    return password_hasher.verify(password, hashed)
 
 def generate_token(user_id, role, wallet_address):
     payload = {
         "user_id": user_id,
         "role": role,
         "wallet_address": wallet_address,  # Include wallet_address in the token payload
-        "exp": int(time.time()) + 3600  # Token valid for 1 hour
+        "exp": int(time.time()) + ACCESS_TOKEN_TTL  # 1 hour by default, renewed through /token/refresh
     }
     return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
 
+def check_apartment_owner(cursor, apartment_id):
+    """Returns an error response unless the signed-in landlord owns the apartment."""
+    cursor.execute('SELECT landlord_wallet FROM apartments WHERE id = ?', (apartment_id,))
+    apartment = cursor.fetchone()
+    if not apartment:
+        return jsonify({"error": "Apartment not found"}), 404
+    if not same_wallet(apartment[0], g.user["wallet_address"]):
+        return jsonify({"error": "Unauthorized access"}), 403
+    return None
+
+def photo_url_for(storage_key, stored_url=None):
+    """Public URL of a photo, derived from its storage key so the storage or CDN can change."""
+    if not storage_key:
+        return stored_url  # Rows from before storage keys existed
+    return photo_storage.url(storage_key) or f"{request.host_url}uploads/{storage_key}"
+
+
+# Fields listing endpoints can return, selected with ?fields=
+APARTMENT_FIELDS = apartment_fields(photo_url_for)
+
+
+def requested_fields(field_set):
+    """The request's fields= selection. Compact responses leave out the placeholder strings too.
+    Raises ValueError for unknown fields."""
+    return field_set.select(request.args.get("fields"), placeholders=request.args.get("format") != "compact")
+
+def store_request_photos():
+    """Stores uploaded 'photos' files and checks directly uploaded 'photo_keys'. Returns (keys, error)."""
+    keys = []
+    for photo in request.files.getlist('photos'):
+        key = new_photo_key(g.user["user_id"], photo.filename)
+        photo_storage.put(key, photo.stream, photo.mimetype)
+        keys.append(key)
+
+    # Keys from /photos/upload-url must belong to this user and have actually been uploaded
+    for key in request.form.getlist('photo_keys'):
+        if not key.startswith(f"u{g.user['user_id']}/") or not photo_storage.exists(key):
+            return None, (jsonify({"error": f"Unknown photo: {key}"}), 400)
+        keys.append(key)
+    return keys, None
+
+def send_transaction(tx_type, call, tx_params, private_key):
+    """Simulates, signs and broadcasts a transaction, then waits for it. Returns (tx_hash, receipt).
+
+    Raises TransactionReverted before anything is sent if the simulation reverts.
+    """
+    tx = fee_strategy.build_transaction(call, tx_params, preflight=lambda tx: preflight.check(tx, tx_type))
+    signed_tx = web3.eth.account.sign_transaction(tx, private_key)
+    tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+    idempotency_store.record_transaction(web3.to_hex(tx_hash))
+    tx_receipt = receipt_waiter.wait(tx_hash)
+    fee_strategy.record(tx_type, tx, tx_receipt)
+    if tx_receipt.status != 1:
+        raise Exception("Transaction failed on the blockchain.")
+    return tx_hash, tx_receipt
+
+def transaction_template(tx_type, call, wallet_address, contract_id, value=None, params=None):
+    """Builds and simulates the transaction, then returns it unsigned for the client to sign and send to /tx/relay."""
+    tx_params = {'from': wallet_address, 'nonce': web3.eth.get_transaction_count(wallet_address, 'pending')}
+    if value:
+        tx_params['value'] = value
+    tx = fee_strategy.build_transaction(call, tx_params, preflight=lambda tx: preflight.check(tx, tx_type))
+    template = tx_relay.issue(wallet_address, tx_type, contract_id, tx, params)
+    return jsonify(dict(template, message="Sign this transaction locally and send it to /tx/relay.")), 200
+
+def revert_response(error):
+    return jsonify({
+        "error": f"Transaction would revert: {error.reason}",
+        "revert_reason": error.reason,
+        "revert_error": error.error_name
+    }), 400
+
+def check_request_wallet(wallet_address):
+    """Returns an error response unless the wallet in the request body is the signed-in user's."""
+    if not same_wallet(wallet_address, g.user["wallet_address"]):
+        return jsonify({"error": "Wallet address does not match the signed-in user"}), 403
+    return None
+
+
+def find_contract(cursor, data, columns):
+    """Fetches the contract a sign/pay/terminate request refers to, as (row, error response).
+
+    contract_id names it directly. Requests with only apartment_id get the caller's earliest
+    open lease on that apartment, since an apartment can have several leases over time.
+    """
+    wallet = g.user["wallet_address"]
+    if data.get('contract_id') is not None:
+        cursor.execute(f'SELECT {columns}, landlord_wallet, tenant_wallet FROM contracts WHERE id = ?',
+                       (int(data['contract_id']),))
+    elif data.get('apartment_id') is None:
+        return None, (jsonify({"error": "contract_id or apartment_id is required."}), 400)
+    else:
+        cursor.execute(f'''
+            SELECT {columns}, landlord_wallet, tenant_wallet FROM contracts
+            WHERE apartment_id = ?1 AND status NOT IN {CLOSED_STATUSES}
+              AND (landlord_wallet = ?2 COLLATE NOCASE OR tenant_wallet = ?2 COLLATE NOCASE)
+            ORDER BY start_date LIMIT 1
+        ''', (data['apartment_id'], wallet))
+    row = cursor.fetchone()
+    if not row:
+        return None, (jsonify({"error": "Contract not found."}), 404)
+    if not (same_wallet(row[-2], wallet) or same_wallet(row[-1], wallet)):
+        return None, (jsonify({"error": "You are not a party to this contract."}), 403)
+    return row[:-2], None
 
-def decode_token(token):
-    try:
-        return jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-    except jwt.ExpiredSignatureError:
-        return None
 
 # Routes
 @app.route('/register', methods=['POST'])
@@ -144,6 +455,9 @@ def register():
 
         if not all([name, email, wallet_address, phone, password, role]):
             return jsonify({"error": "All fields are required"}), 400
+        if not isinstance(wallet_address, str) or not Web3.is_address(wallet_address):
+            return jsonify({"error": "wallet_address is not a valid Ethereum address"}), 400
+        wallet_address = Web3.to_checksum_address(wallet_address)
 
         hashed_password = hash_password(password)
 
@@ -155,10 +469,14 @@ def register():
         ''', (name, email, wallet_address, phone, hashed_password, role))
         conn.commit()
         conn.close()
+        user_cache.invalidate(email=email)
+        user_cache.invalidate(wallet_address=wallet_address)
 
         return jsonify({"message": "User registered successfully"}), 200
     except sqlite3.IntegrityError:
         return jsonify({"error": "User with this email or wallet address already exists"}), 400
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
@@ -172,44 +490,67 @@ def login():
         if not all([email, password]):
             return jsonify({"error": "Email and password are required"}), 400
 
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
-        user = cursor.fetchone()
-        conn.close()
+        user = user_cache.get_by_email(email)
 
-        if user and verify_password(password, user[5]):
-            token = generate_token(user[0], user[6], user[3])  # Pass user_id, role, and wallet_address
+        if user and verify_password(password, user["password"]):
+            token = generate_token(user["id"], user["role"], user["wallet_address"])
             return jsonify({
                 "message": "Login successful",
                 "token": token,
-                "user": {
-                    "id": user[0],
-                    "name": user[1],
-                    "email": user[2],
-                    "wallet_address": user[3],
-                    "phone": user[4],
-                    "role": user[6]
-                }
+                "refresh_token": refresh_tokens.issue(user["id"]),
+                "user": public_user(user)
             }), 200
         else:
             return jsonify({"error": "Invalid credentials"}), 401
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 
-@app.route('/update-profile', methods=['PUT'])
-def update_profile():
+@app.route('/token/refresh', methods=['POST'])
+def refresh_token():
     try:
-        token = request.headers.get("Authorization")
+        data = request.json or {}
+        token = data.get('refresh_token')
         if not token:
-            return jsonify({"error": "Authorization header missing"}), 401
+            return jsonify({"error": "refresh_token is required"}), 400
+
+        try:
+            user_id, new_refresh_token = refresh_tokens.rotate(token)
+        except RefreshTokenError as e:
+            return jsonify({"error": str(e)}), 401
+
+        user = user_cache.get_by_id(user_id)
+        if not user:
+            return jsonify({"error": "User no longer exists"}), 401
 
-        decoded = decode_token(token.split("Bearer ")[-1])
-        if not decoded:
-            return jsonify({"error": "Invalid or expired token"}), 401
+        return jsonify({
+            "token": generate_token(user["id"], user["role"], user["wallet_address"]),
+            "refresh_token": new_refresh_token
+        }), 200
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
-        user_id = decoded["user_id"]
+@app.route('/logout', methods=['POST'])
+def logout():
+    try:
+        data = request.json or {}
+        token = data.get('refresh_token')
+        if not token:
+            return jsonify({"error": "refresh_token is required"}), 400
+
+        refresh_tokens.revoke(token)
+        return jsonify({"message": "Logged out successfully"}), 200
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+@app.route('/update-profile', methods=['PUT'])
+@require_auth()
+def update_profile():
+    try:
+        user_id = g.user["user_id"]
         data = request.json
         name = data.get("name")
         phone = data.get("phone")
@@ -224,21 +565,54 @@ def update_profile():
         ''', (name, phone, user_id))
         conn.commit()
         conn.close()
+        user_cache.invalidate(user_id=user_id)
 
         return jsonify({"message": "Profile updated successfully"}), 200
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
-JOD_TO_ETH_RATE = 0.001  # Example conversion rate, update this value as needed
+@app.route('/exchange-rate', methods=['GET'])
+def get_exchange_rate():
+    try:
+        response = {"jod_to_eth": rate_provider.get_rate()}
+        history_limit = request.args.get("history", type=int)
+        if history_limit:
+            response["history"] = rate_provider.history(history_limit)
+        return jsonify(response), 200
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+@app.route('/admin/exchange-rate', methods=['POST'])
+@require_auth(roles=["Admin"])
+def set_exchange_rate():
+    try:
+        data = request.json
+        try:
+            rate = float(data.get("jod_to_eth"))
+        except (TypeError, ValueError):
+            return jsonify({"error": "jod_to_eth must be a number"}), 400
+        if rate <= 0:
+            return jsonify({"error": "jod_to_eth must be positive"}), 400
+
+        repriced = rate_provider.set_rate(rate, f"admin:{g.user['wallet_address']}")
+        return jsonify({
+            "message": "Exchange rate updated successfully",
+            "jod_to_eth": rate,
+            "apartments_repriced": repriced
+        }), 200
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 @app.route('/add-apartment', methods=['POST'])
+@require_auth(roles=["Landlord"])
 def add_apartment():
     try:
-        # Ensure the uploads directory exists
-        os.makedirs("uploads", exist_ok=True)
+        # Listings always belong to the signed-in landlord
+        landlord_wallet = g.user["wallet_address"]
+        if request.form.get('landlord_wallet') and not same_wallet(request.form.get('landlord_wallet'), landlord_wallet):
+            return jsonify({"error": "You can only list apartments for your own wallet"}), 403
 
         # Extract form fields
-        landlord_wallet = request.form.get('landlord_wallet')
         title = request.form.get('title')
         location = request.form.get('location')
         description = request.form.get('description')
@@ -246,41 +620,46 @@ def add_apartment():
         lease_duration = int(request.form.get('lease_duration'))
         availability = request.form.get('availability')
 
-        # Convert JOD to ETH
-        rent_amount_eth = price_in_jod * JOD_TO_ETH_RATE
+        # Convert JOD to exact wei, the ETH value is kept for display
+        rent_amount_wei = jod_to_wei(price_in_jod, rate_provider.get_rate())
+        rent_amount_eth = float(wei_to_eth(rent_amount_wei))
 
         # Validate required fields
         if not all([landlord_wallet, title, location, description, price_in_jod, lease_duration, availability]):
             return jsonify({"error": "All fields are required"}), 400
 
-        # Get photos
-        photos = request.files.getlist('photos')
-        if not photos:
+        # Coordinates from the form, or looked up from the location
+        try:
+            latitude, longitude = listing_coordinates(location, request.form.get('latitude'),
+                                                      request.form.get('longitude'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Get photos, either uploaded with the form or already in storage
+        photo_keys, error = store_request_photos()
+        if error:
+            return error
+        if not photo_keys:
             return jsonify({"error": "At least one photo is required"}), 400
-
-        # Save photos and generate URLs
-        photo_urls = []
-        for photo in photos:
-            photo_filename = secure_filename(f"{title.replace(' ', '_')}_{int(time.time())}_{photo.filename}")
-            photo_path = os.path.join("uploads", photo_filename)
-            photo.save(photo_path)
-            photo_urls.append(f"{request.host_url}uploads/{photo_filename}")
+        photo_urls = [photo_url_for(key) for key in photo_keys]
 
         # Save apartment details to the database
         conn = sqlite3.connect(DATABASE_FILE)
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO apartments (
-                landlord_wallet, location, title, description, price_in_jod, rent_amount_eth, lease_duration, availability, contract_address
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (landlord_wallet, location, title, description, price_in_jod, rent_amount_eth, lease_duration, availability, None))
+                landlord_wallet, location, title, description, price_in_jod, rent_amount_eth, rent_amount_wei,
+                lease_duration, availability, contract_address, latitude, longitude
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (landlord_wallet, location, title, description, price_in_jod, rent_amount_eth, wei_to_db(rent_amount_wei),
+              lease_duration, availability, None, latitude, longitude))
         apartment_id = cursor.lastrowid
 
         # Save photo URLs to the apartment_photos table
-        for photo_url in photo_urls:
+        for photo_url, photo_key in zip(photo_urls, photo_keys):
             cursor.execute('''
-                INSERT INTO apartment_photos (apartment_id, photo_url) VALUES (?, ?)
-            ''', (apartment_id, photo_url))
+                INSERT INTO apartment_photos (apartment_id, photo_url, storage_key) VALUES (?, ?, ?)
+            ''', (apartment_id, photo_url, photo_key))
 
         conn.commit()
         conn.close()
@@ -291,6 +670,7 @@ def add_apartment():
             "apartment_id": apartment_id,
             "price_in_jod": price_in_jod,
             "rent_amount_eth": rent_amount_eth,
+            "rent_amount_wei": wei_to_db(rent_amount_wei),
             "photo_urls": photo_urls
         }), 200
 
@@ -299,92 +679,67 @@ def add_apartment():
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 @app.route('/tenant-contracts', methods=['GET'])
+@require_auth(roles=["Tenant"])
 def get_tenant_contracts():
     try:
-        token = request.headers.get("Authorization")
-        if not token:
-            return jsonify({"error": "Authorization header missing"}), 401
-
-        decoded = decode_token(token.split("Bearer ")[-1])
-        if not decoded:
-            return jsonify({"error": "Invalid or expired token"}), 401
-
-        tenant_wallet = decoded.get("wallet_address")
+        tenant_wallet = g.user["wallet_address"]
         status = request.args.get("status", "all")  # Get status query parameter
+        include_archived = request.args.get("include_archived", "false").lower() == "true"
+        try:
+            selection = requested_fields(TENANT_CONTRACT_FIELDS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         conn = sqlite3.connect(DATABASE_FILE)
         cursor = conn.cursor()
 
-        # Adjust query based on status
-        if status == "pending":
-            query = '''
-                SELECT c.id, c.landlord_wallet, c.apartment_id, c.start_date, c.end_date, c.next_payment_date, c.status, c.rent_amount ,c.contract_address 
-                FROM contracts c
-                WHERE c.tenant_wallet = ? AND c.status = "Pending"
-            '''
-        elif status == "active":
-            query = '''
-                SELECT c.id, c.landlord_wallet, c.apartment_id, c.start_date, c.end_date, c.next_payment_date, c.status, c.rent_amount,c.contract_address 
-                FROM contracts c
-                WHERE c.tenant_wallet = ? AND c.status = "Active"
-            '''
-        else:
-            query = '''
-                SELECT c.id, c.landlord_wallet, c.apartment_id, c.start_date, c.end_date, c.next_payment_date, c.status, c.rent_amount ,c.contract_address 
-                FROM contracts c
-                WHERE c.tenant_wallet = ?
-            '''
-
-        cursor.execute(query, (tenant_wallet,))
-        contracts = cursor.fetchall()
-
-        # Format contracts for response
-        contracts_list = [
-            {
-                "id": contract[0],
-                "landlord_wallet": contract[1],
-                "apartment_id": contract[2],
-                "start_date": contract[3] if contract[3] else "Not Specified",
-                "end_date": contract[4] if contract[4] else "Not Specified",
-                "next_payment_due": contract[5] if contract[5] else "Not Specified",
-                "status": contract[6],
-                "rent_amount": contract[7],  # Include rent amount
-                "contract_address": contract[8]
-            }
-            for contract in contracts
-        ]
+        # Adjust query based on status, using the (tenant_wallet, status) index; only the requested fields are read
+        query = f'''
+            SELECT {selection.sql()}
+            FROM {{table}} c
+            WHERE c.tenant_wallet = ?
+        '''
+        params = [tenant_wallet]
+        if status in ("pending", "active"):
+            query += ' AND c.status = ?'
+            params.append(status.capitalize())
 
-        conn.close()
-        return jsonify(contracts_list), 200
+        # Closed leases moved to the archive are only read when asked for
+        tables = ["contracts", "contracts_archive"] if include_archived else ["contracts"]
+        cursor.execute(" UNION ALL ".join(query.format(table=table) for table in tables), params * len(tables))
+
+        # Format contracts for response, streamed as they are read
+        contracts = (selection.values(row) for row in iter_rows(cursor, STREAM_FETCH_ROWS))
+        return streaming_response(request, selection.columns, contracts, on_close=conn.close)
 
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 @app.route('/landlord-contracts', methods=['GET'])
+@require_auth(roles=["Landlord"])
 def landlord_contracts():
     try:
-        token = request.headers.get("Authorization")
-        if not token:
-            return jsonify({"error": "Authorization header missing"}), 401
-
-        decoded = decode_token(token.split("Bearer ")[-1])
-        if not decoded:
-            return jsonify({"error": "Invalid or expired token"}), 401
-
-        landlord_wallet = decoded["wallet_address"]
+        landlord_wallet = g.user["wallet_address"]
         status_filter = request.args.get("status")  # Get the status filter from query parameters
+        include_archived = request.args.get("include_archived", "false").lower() == "true"
+        try:
+            selection = requested_fields(LANDLORD_CONTRACT_FIELDS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         conn = sqlite3.connect(DATABASE_FILE)
         cursor = conn.cursor()
 
-        # Build the SQL query dynamically based on the status filter
-        query = '''
-            SELECT c.id, c.tenant_wallet, c.start_date, c.end_date, c.contract_hash, 
-                   c.apartment_id, a.title AS apartment_title, a.contract_address, c.status,
-                   c.rent_amount, c.lease_duration
-            FROM contracts c
-            JOIN apartments a ON c.apartment_id = a.id
-            WHERE a.landlord_wallet = ?
+        # Build the SQL query dynamically based on the status filter, using the (landlord_wallet, status) index.
+        # Archived leases may outlive their apartment, hence the LEFT JOIN, made only for apartment fields.
+        join = ''
+        if any(field.sql.startswith('a.') for field in selection.fields):
+            join = 'LEFT JOIN apartments a ON c.apartment_id = a.id'
+        query = f'''
+            SELECT {selection.sql()}
+            FROM {{table}} c
+            {join}
+            WHERE c.landlord_wallet = ?
         '''
         params = [landlord_wallet]
 
@@ -392,74 +747,74 @@ def landlord_contracts():
             query += ' AND c.status = ?'
             params.append(status_filter)
 
-        cursor.execute(query, params)
-        contracts = cursor.fetchall()
-
-        contracts_list = [
-            {
-                "id": contract[0],
-                "tenant_wallet": contract[1],
-                "start_date": contract[2],
-                "end_date": contract[3],
-                "contract_hash": contract[4],
-                "apartment_id": contract[5],
-                "apartment_title": contract[6],
-                "contract_address": contract[7],
-                "status": contract[8],
-                "rent_amount": contract[9],
-                "lease_duration": contract[10]
-            }
-            for contract in contracts
-        ]
+        tables = ["contracts", "contracts_archive"] if include_archived else ["contracts"]
+        cursor.execute(" UNION ALL ".join(query.format(table=table) for table in tables), params * len(tables))
 
-        conn.close()
-        return jsonify(contracts_list), 200
+        contracts = (selection.values(row) for row in iter_rows(cursor, STREAM_FETCH_ROWS))
+        return streaming_response(request, selection.columns, contracts, on_close=conn.close)
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 
 @app.route('/edit-apartment/<int:apartment_id>', methods=['PUT'])
+@require_auth(roles=["Landlord"])
 def edit_apartment(apartment_id):
     try:
         conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
+        try:
+            cursor = conn.cursor()
 
-        # Parse form data
-        title = request.form.get('title')
-        location = request.form.get('location')
-        description = request.form.get('description')
-        price_in_jod = float(request.form.get('price_in_jod'))
-        lease_duration = int(request.form.get('lease_duration'))
-        availability = request.form.get('availability')
+            error = check_apartment_owner(cursor, apartment_id)
+            if error:
+                return error
 
-        # Validate inputs
-        if not all([title, location, description, price_in_jod, lease_duration, availability]):
-            return jsonify({"error": "All fields are required"}), 400
+            # Parse form data
+            title = request.form.get('title')
+            location = request.form.get('location')
+            description = request.form.get('description')
+            price_in_jod = float(request.form.get('price_in_jod'))
+            lease_duration = int(request.form.get('lease_duration'))
+            availability = request.form.get('availability')
 
-        # Update apartment details in the database
-        cursor.execute('''
-            UPDATE apartments
-            SET title = ?, location = ?, description = ?, price_in_jod = ?, 
-                lease_duration = ?, availability = ?
-            WHERE id = ?
-        ''', (title, location, description, price_in_jod, lease_duration, availability, apartment_id))
-
-        # Handle photo updates (if provided)
-        photos = request.files.getlist('photos')
-        if photos:
-            # Delete existing photos for this apartment
-            cursor.execute('DELETE FROM apartment_photos WHERE apartment_id = ?', (apartment_id,))
-            for photo in photos:
-                photo_filename = secure_filename(f"{title.replace(' ', '_')}_{int(time.time())}_{photo.filename}")
-                photo_path = os.path.join("uploads", photo_filename)
-                photo.save(photo_path)
-                photo_url = f"{request.host_url}uploads/{photo_filename}"
-                cursor.execute('INSERT INTO apartment_photos (apartment_id, photo_url) VALUES (?, ?)', (apartment_id, photo_url))
+            # Validate inputs
+            if not all([title, location, description, price_in_jod, lease_duration, availability]):
+                return jsonify({"error": "All fields are required"}), 400
 
-        conn.commit()
-        conn.close()
+            # Coordinates from the form, or looked up again from the location
+            try:
+                latitude, longitude = listing_coordinates(location, request.form.get('latitude'),
+                                                          request.form.get('longitude'))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            # Keep the stored ETH price in line with the new JOD price
+            rent_amount_wei = jod_to_wei(price_in_jod, rate_provider.get_rate())
+            rent_amount_eth = float(wei_to_eth(rent_amount_wei))
 
-        return jsonify({"message": "Apartment updated successfully"}), 200
+            # Update apartment details in the database
+            cursor.execute('''
+                UPDATE apartments
+                SET title = ?, location = ?, description = ?, price_in_jod = ?, rent_amount_eth = ?,
+                    rent_amount_wei = ?, lease_duration = ?, availability = ?, latitude = ?, longitude = ?
+                WHERE id = ?
+            ''', (title, location, description, price_in_jod, rent_amount_eth, wei_to_db(rent_amount_wei),
+                  lease_duration, availability, latitude, longitude, apartment_id))
+
+            # Handle photo updates (if provided), replaced files are removed later by photo_gc
+            photo_keys, error = store_request_photos()
+            if error:
+                return error
+            if photo_keys:
+                # Delete existing photos for this apartment
+                cursor.execute('DELETE FROM apartment_photos WHERE apartment_id = ?', (apartment_id,))
+                for photo_key in photo_keys:
+                    cursor.execute('INSERT INTO apartment_photos (apartment_id, photo_url, storage_key) '
+                                   'VALUES (?, ?, ?)', (apartment_id, photo_url_for(photo_key), photo_key))
+
+            conn.commit()
+            return jsonify({"message": "Apartment updated successfully"}), 200
+        finally:
+            conn.close()
 
     except Exception as e:
         print(f"Error during update: {e}")
@@ -469,11 +824,17 @@ def edit_apartment(apartment_id):
 
 
 @app.route('/delete-apartment/<int:apartment_id>', methods=['DELETE'])
+@require_auth(roles=["Landlord"])
 def delete_apartment(apartment_id):
     try:
         conn = sqlite3.connect(DATABASE_FILE)
         cursor = conn.cursor()
 
+        error = check_apartment_owner(cursor, apartment_id)
+        if error:
+            conn.close()
+            return error
+
         # Delete photos associated with the apartment from the apartment_photos table
         cursor.execute('DELETE FROM apartment_photos WHERE apartment_id = ?', (apartment_id,))
 
@@ -488,59 +849,36 @@ def delete_apartment(apartment_id):
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 
+@app.route('/landlord/summary', methods=['GET'])
+@require_auth(roles=["Landlord"])
+def landlord_summary():
+    try:
+        conn = sqlite3.connect(DATABASE_FILE)
+        cursor = conn.cursor()
+        summary = read_landlord_summary(cursor, g.user["wallet_address"])
+        conn.close()
+        return jsonify(summary), 200
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
 @app.route('/landlord-apartments', methods=['GET'])
+@require_auth(roles=["Landlord"])
 def landlord_apartments():
     try:
-        # Check for Authorization header
-        token = request.headers.get("Authorization")
-        if not token:
-            return jsonify({"error": "Authorization header missing"}), 401
-
-        # Decode the token
-        decoded = decode_token(token.split("Bearer ")[-1])
-        if not decoded:
-            return jsonify({"error": "Invalid or expired token"}), 401
-
-        landlord_wallet = decoded.get("wallet_address")
-        if not landlord_wallet:
-            return jsonify({"error": "Unauthorized access"}), 403
+        landlord_wallet = g.user["wallet_address"]
+        try:
+            selection = requested_fields(APARTMENT_FIELDS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         # Connect to database and fetch apartments
         conn = sqlite3.connect(DATABASE_FILE)
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, landlord_wallet, title, location, description, price_in_jod, 
-                   rent_amount_eth, lease_duration, availability, contract_address
-            FROM apartments WHERE landlord_wallet = ?
-        ''', (landlord_wallet,))
-        apartments = cursor.fetchall()
+        cursor.execute(f'SELECT {selection.sql()} FROM apartments WHERE landlord_wallet = ?', (landlord_wallet,))
 
-        apartments_list = []
-        for apt in apartments:
-            apt_id = apt[0]
-
-            # Fetch photo URLs for the apartment
-            cursor.execute('SELECT photo_url FROM apartment_photos WHERE apartment_id = ?', (apt_id,))
-            photos = cursor.fetchall()
-            photo_urls = [photo[0] for photo in photos]  # Extract photo URLs
-
-            # Append apartment details to the list
-            apartments_list.append({
-                "id": apt_id,
-                "landlord_wallet": apt[1],
-                "title": apt[2],
-                "location": apt[3],
-                "description": apt[4],
-                "price_in_jod": apt[5],
-                "rent_amount_eth": apt[6],
-                "lease_duration": apt[7],
-                "availability": apt[8],
-                "contract_address": apt[9] if apt[9] else "Not Available",  # Handle None gracefully
-                "photo_urls": photo_urls
-            })
-
-        conn.close()
-        return jsonify(apartments_list), 200
+        # Apartment details with their photo URLs, streamed as they are read
+        apartments = (selection.values(apt) for apt in iter_rows(cursor, STREAM_FETCH_ROWS))
+        return streaming_response(request, selection.columns, apartments, on_close=conn.close)
 
     except sqlite3.Error as db_err:
         print(f"Database error: {db_err}")
@@ -553,39 +891,106 @@ def landlord_apartments():
 @app.route('/available-apartments', methods=['GET'])
 def available_apartments():
     try:
+        try:
+            selection = requested_fields(APARTMENT_FIELDS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         conn = sqlite3.connect(DATABASE_FILE)
         cursor = conn.cursor()
 
-        # Query apartments and fetch photos separately
-        cursor.execute('''
-            SELECT id, landlord_wallet, title, location, description, price_in_jod, 
-                   rent_amount_eth, lease_duration, availability, contract_address
-            FROM apartments WHERE availability = "Available"
-        ''')
-        apartments = cursor.fetchall()
+        # Apartments with their photos in one query, streamed as they are read
+        cursor.execute(f'SELECT {selection.sql()} FROM apartments WHERE availability = "Available"')
+        apartments = (selection.values(apt) for apt in iter_rows(cursor, STREAM_FETCH_ROWS))
+        return streaming_response(request, selection.columns, apartments, on_close=conn.close)
+
+    except sqlite3.Error as db_err:
+        print(f"Database error: {str(db_err)}")
+        return jsonify({"error": "Database error"}), 500
+
+    except Exception as e:
+        print(f"Error fetching apartments: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
 
+@app.route('/apartments/available', methods=['GET'])
+def apartments_available_between():
+    """Apartments with no pending, signed or active lease overlapping [from, to), a page at a time.
+    The availability flag is not consulted: it only reflects the current lease."""
+    try:
+        try:
+            start_date = datetime.strptime(request.args['from'], '%Y-%m-%d').strftime('%Y-%m-%d')
+            end_date = datetime.strptime(request.args['to'], '%Y-%m-%d').strftime('%Y-%m-%d')
+        except (KeyError, ValueError):
+            return jsonify({"error": "from and to are required, as YYYY-MM-DD."}), 400
+        if end_date <= start_date:
+            return jsonify({"error": "to must be after from."}), 400
+        try:
+            limit = min(max(int(request.args.get("limit", 100)), 1), 1000)
+            after_id = int(request.args.get("after_id", 0))  # Last id of the previous page
+        except ValueError:
+            return jsonify({"error": "limit and after_id must be integers."}), 400
+        try:
+            selection = requested_fields(APARTMENT_FIELDS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        conn = sqlite3.connect(DATABASE_FILE)
+        cursor = conn.cursor()
+        apartment_ids = available_apartment_ids(cursor, start_date, end_date, after_id, limit)
         apartments_list = []
-        for apt in apartments:
-            apt_id = apt[0]
-            cursor.execute('SELECT photo_url FROM apartment_photos WHERE apartment_id = ?', (apt_id,))
-            photos = cursor.fetchall()
-            photo_urls = [photo[0] for photo in photos]  # Extract photo URLs
-
-            apartments_list.append({
-                "id": apt_id,
-                "landlord_wallet": apt[1],
-                "title": apt[2],
-                "location": apt[3],
-                "description": apt[4],
-                "price_in_jod": apt[5],
-                "rent_amount_eth": apt[6],
-                "lease_duration": apt[7],
-                "availability": apt[8],
-                "contract_address": apt[9] if apt[9] else "Not Available",
-                "photo_urls": photo_urls  # Include photo URLs in the response
-            })
+        if apartment_ids:
+            cursor.execute(f'SELECT {selection.sql()} FROM apartments '
+                           f'WHERE id IN ({", ".join("?" * len(apartment_ids))}) ORDER BY id', apartment_ids)
+            apartments_list = [selection.item(apt) for apt in cursor.fetchall()]
+        conn.close()
+
+        return jsonify({
+            "from": start_date,
+            "to": end_date,
+            "apartments": apartments_list,
+            "next_after_id": apartment_ids[-1] if len(apartment_ids) == limit else None
+        }), 200
+
+    except sqlite3.Error as db_err:
+        print(f"Database error: {str(db_err)}")
+        return jsonify({"error": "Database error"}), 500
 
+    except Exception as e:
+        print(f"Error fetching apartments: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/apartments/near', methods=['GET'])
+def apartments_near_point():
+    """Apartments within km of lat/lon, nearest first, each with its distance_km."""
+    try:
+        try:
+            latitude, longitude = listing_coordinates(None, request.args['lat'], request.args['lon'])
+            km = float(request.args.get('km', 5))
+            limit = min(max(int(request.args.get("limit", 100)), 1), 1000)
+        except (KeyError, ValueError):
+            return jsonify({"error": "lat and lon are required numbers, km and limit must be numbers."}), 400
+        if latitude is None:
+            return jsonify({"error": "lat and lon are required."}), 400
+        if not 0 < km <= MAX_SEARCH_RADIUS_KM:
+            return jsonify({"error": f"km must be within (0, {MAX_SEARCH_RADIUS_KM}]."}), 400
+        try:
+            selection = requested_fields(APARTMENT_FIELDS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        conn = sqlite3.connect(DATABASE_FILE)
+        cursor = conn.cursor()
+        nearest = apartments_near(cursor, latitude, longitude, km, limit)
+        apartments_list = []
+        if nearest:
+            cursor.execute(f'SELECT {selection.sql()} FROM apartments '
+                           f'WHERE id IN ({", ".join("?" * len(nearest))})', [apartment_id for apartment_id, _ in nearest])
+            rows = {row[0]: row for row in cursor.fetchall()}  # id is always the first field
+            apartments_list = [dict(selection.item(rows[apartment_id]), distance_km=round(distance, 3))
+                               for apartment_id, distance in nearest if apartment_id in rows]
         conn.close()
+
         return jsonify(apartments_list), 200
 
     except sqlite3.Error as db_err:
@@ -600,10 +1005,21 @@ def available_apartments():
 
 
 @app.route('/contracts/initiate', methods=['POST'])
+@require_auth(roles=["Tenant"])
 def initiate_contract():
     try:
         data = request.json
+        if not isinstance(data.get('tenant_wallet'), str) or not Web3.is_address(data['tenant_wallet']):
+            return jsonify({"error": "tenant_wallet is not a valid Ethereum address"}), 400
         tenant_wallet = Web3.to_checksum_address(data['tenant_wallet'])
+
+        # The tenant must be a registered tenant, and the one making the request
+        error = check_request_wallet(tenant_wallet)
+        if error:
+            return error
+        tenant = user_cache.get_by_wallet(tenant_wallet)
+        if not tenant or tenant["role"] != "Tenant":
+            return jsonify({"error": "Tenant wallet is not registered"}), 400
         apartment_id = int(data.get('apartment_id'))
         start_date = data.get('start_date')
         end_date = data.get('end_date')
@@ -618,58 +1034,93 @@ def initiate_contract():
             end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
         except ValueError:
             return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
+        # Zero-padded, as the lease index and date comparisons in SQL expect
+        start_date, end_date = start_date_obj.strftime('%Y-%m-%d'), end_date_obj.strftime('%Y-%m-%d')
 
         # Ensure the rental period is at least 1 month
         rental_period_days = (end_date_obj - start_date_obj).days
         if rental_period_days < 30:
             return jsonify({"error": "The rental period must be at least 1 month."}), 400
 
-        # Connect to the database
-        conn = sqlite3.connect(DATABASE_FILE)
+        # Connect to the database. The overlap check and the insert run in one write transaction,
+        # so two tenants cannot book the same dates at once.
+        conn = sqlite3.connect(DATABASE_FILE, isolation_level=None)
         cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
 
         # Fetch apartment details
         cursor.execute('''
-            SELECT id, landlord_wallet, rent_amount_eth, lease_duration 
-            FROM apartments 
+            SELECT id, landlord_wallet, rent_amount_eth, rent_amount_wei, lease_duration
+            FROM apartments
             WHERE id = ?
         ''', (apartment_id,))
         apartment_details = cursor.fetchone()
 
         if not apartment_details:
+            conn.rollback()
+            conn.close()
             return jsonify({"error": "Apartment not found"}), 404
 
-        fetched_apartment_id, landlord_wallet, rent_amount_eth, lease_duration = apartment_details
+        fetched_apartment_id, landlord_wallet, rent_amount_eth, rent_amount_wei, lease_duration = apartment_details
         lease_duration = int(lease_duration)
 
         # Ensure the fetched apartment ID matches the provided ID
         if fetched_apartment_id != apartment_id:
+            conn.rollback()
+            conn.close()
             return jsonify({"error": "Apartment ID mismatch detected"}), 400
 
-        # Save contract details to the database
-        next_payment_date = start_date_obj + timedelta(days=30)
+        # Signed and active leases hold their dates, Pending ones until their hold lapses
+        conflicts = overlapping_leases(cursor, apartment_id, start_date, end_date)
+        if conflicts:
+            conn.rollback()
+            conn.close()
+            return jsonify({"error": "The apartment is already booked for part of this period.",
+                            "conflicting_contracts": conflicts}), 409
+
+        # Save contract details to the database, the first rent is due on the start date
+        next_payment_date = start_date_obj
+        hold_until = (datetime.utcnow() + timedelta(hours=PENDING_HOLD_HOURS)).strftime('%Y-%m-%dT%H:%M:%SZ')
 
         cursor.execute('''
             INSERT INTO contracts (
-                landlord_wallet, tenant_wallet, apartment_id, rent_amount, lease_duration, 
-                start_date, end_date, next_payment_date, status
+                landlord_wallet, tenant_wallet, apartment_id, rent_amount, rent_amount_wei, lease_duration,
+                start_date, end_date, next_payment_date, status, hold_until
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (landlord_wallet, tenant_wallet, fetched_apartment_id, rent_amount_eth, lease_duration,
-              start_date, end_date, next_payment_date.strftime('%Y-%m-%d'), 'Pending'))
-        conn.commit()
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (landlord_wallet, tenant_wallet, fetched_apartment_id, rent_amount_eth, rent_amount_wei, lease_duration,
+              start_date, end_date, next_payment_date.strftime('%Y-%m-%d'), 'Pending', hold_until))
+        contract_id = cursor.lastrowid
+
+        # Hash of the agreed terms, anchored on-chain with the next batch
+        try:
+            terms = lease_terms((contract_id, landlord_wallet, tenant_wallet, fetched_apartment_id, start_date,
+                                 end_date, rent_amount_wei, lease_duration))
+        except ValueError as e:
+            app.logger.error(f"Apartment {apartment_id} cannot be leased: {e}")
+            conn.rollback()
+            conn.close()
+            return jsonify({"error": "The apartment's landlord wallet is not a valid address"}), 409
+        document_hash = contract_hash(terms)
+        cursor.execute('UPDATE contracts SET contract_hash = ? WHERE id = ?', (document_hash, contract_id))
+        cursor.execute('COMMIT')
+        event_broker.publish_contracts(cursor, 'contract.initiated', [contract_id])
         conn.close()
 
         return jsonify({
             "message": "Contract details saved successfully. Deployment will occur upon signing.",
+            "contract_id": contract_id,
+            "contract_hash": document_hash,
             "landlord": landlord_wallet,
             "tenant": tenant_wallet,
             "apartment_id": fetched_apartment_id,
             "rent_amount_eth": rent_amount_eth,
+            "rent_amount_wei": rent_amount_wei,
             "lease_duration": lease_duration,
             "start_date": start_date,
             "end_date": end_date,
-            "next_payment_date": next_payment_date.strftime('%Y-%m-%d')
+            "next_payment_date": next_payment_date.strftime('%Y-%m-%d'),
+            "hold_until": hold_until
         }), 200
 
     except sqlite3.Error as db_error:
@@ -681,34 +1132,47 @@ def initiate_contract():
     
     
 @app.route('/contracts/sign', methods=['POST'])
+@require_auth(roles=["Landlord", "Tenant"])
+@idempotency_store.idempotent('/contracts/sign')
 def sign_contract():
     try:
         tx_hash = None 
         data = request.json
-        app.logger.info(f"Debug: Payload received: {data}")
-        apartment_id = data['apartment_id']
+        app.logger.info(f"Debug: Payload received: apartment_id={data.get('apartment_id')}, role={data.get('role')}")
+        apartment_id = data.get('apartment_id')  # Older clients name the apartment instead of the contract
         wallet_address = data['wallet_address']
-        private_key = data['private_key']
+        private_key = data.get('private_key')  # Without it the client gets a transaction to sign itself
         user_role = data['role']
 
+        error = check_request_wallet(wallet_address)
+        if error:
+            return error
+        if user_role != g.user["role"]:
+            return jsonify({"error": "Role does not match the signed-in user"}), 403
+
         # Fetch the contract address and current status
         conn = sqlite3.connect(DATABASE_FILE)
         cursor = conn.cursor()
-        cursor.execute('SELECT contract_address, status, start_date, landlord_wallet, tenant_wallet, rent_amount, lease_duration FROM contracts WHERE apartment_id = ?', (apartment_id,))
-        result = cursor.fetchone()
-
-        if not result:
+        result, error = find_contract(cursor, data, 'id, contract_address, status, start_date, landlord_wallet, tenant_wallet, rent_amount_wei, lease_duration')
+        if error:
             app.logger.error(f"Debug: Contract not found for apartment_id: {apartment_id}")
-            return jsonify({"error": "Contract not found."}), 404
+            conn.close()
+            return error
 
-        contract_address, current_status, start_date, landlord_wallet, tenant_wallet, rent_amount, lease_duration = result
+        contract_id, contract_address, current_status, start_date, landlord_wallet, tenant_wallet, rent_amount_wei, lease_duration = result
         app.logger.info(f"Debug: Contract address: {contract_address}, Current status: {current_status}")
 
         # Verify private key matches wallet
-        provided_account = web3.eth.account.from_key(private_key).address
-        if wallet_address.lower() != provided_account.lower():
-            app.logger.error("Debug: Private key does not match wallet address.")
-            return jsonify({"error": "Private key does not match the provided wallet address."}), 400
+        if private_key:
+            provided_account = web3.eth.account.from_key(private_key).address
+            if wallet_address.lower() != provided_account.lower():
+                app.logger.error("Debug: Private key does not match wallet address.")
+                conn.close()
+                return jsonify({"error": "Private key does not match the provided wallet address."}), 400
+        else:
+            conn.close()
+            return sign_contract_template(contract_id, contract_address, current_status, user_role, wallet_address,
+                                          landlord_wallet, tenant_wallet, rent_amount_wei, lease_duration)
 
         # Initialize new_status to avoid unassigned variable errors
         new_status = None
@@ -717,78 +1181,38 @@ def sign_contract():
         nonce = web3.eth.get_transaction_count(wallet_address)
 
         if user_role == 'Landlord' and current_status == 'Pending':
-            # Landlord deploys the contract
-            compiled_contract_path = "RentalAgreement.sol"
-            with open(compiled_contract_path, 'r') as file:
-                contract_source_code = file.read()
-
-            compiled_sol = compile_source(contract_source_code, solc_version='0.8.0')
-            contract_id, contract_interface = compiled_sol.popitem()
-
-            abi = contract_interface['abi']
-            bytecode = contract_interface['bin']
-            contract = web3.eth.contract(abi=abi, bytecode=bytecode)
-
-            tx = contract.constructor(
-                Web3.to_checksum_address(landlord_wallet),
-                Web3.to_checksum_address(tenant_wallet),  # Include tenant address in deployment
-                int(float(rent_amount) * 10**18),
-                lease_duration
-            ).build_transaction({
-                'from': wallet_address,
-                'nonce': nonce,
-                'gas': 1500000,
-                'gasPrice': web3.to_wei('20', 'gwei')
-            })
-
-            signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-            tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-            tx_receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
-            
-            contract_address = tx_receipt.contractAddress
-            contract = web3.eth.contract(address=contract_address, abi=abi)
-
-            # Landlord signs the contract
-            tx_sign = contract.functions.signAgreement().build_transaction({
-                'from': wallet_address,
-                'nonce': nonce + 1,  # Increment nonce for signing
-                'gas': 300000,
-                'gasPrice': web3.to_wei('20', 'gwei')
-            })
-            signed_tx_sign = web3.eth.account.sign_transaction(tx_sign, private_key)
-            tx_sign_hash = web3.eth.send_raw_transaction(signed_tx_sign.raw_transaction)
-            web3.eth.wait_for_transaction_receipt(tx_sign_hash)
-
-            # Verify isSigned is updated
-            is_signed = contract.functions.isSigned().call()
-            app.logger.info(f"Debug: isSigned after landlord signing: {is_signed}")
-            
-
-            new_status = 'Landlord Signed'
-
-            # Update the contract address and status in the database
-            cursor.execute('UPDATE contracts SET contract_address = ?, status = ? WHERE apartment_id = ?', 
-                           (contract_address, new_status, apartment_id))
+            # Landlord deploys and signs a contract of its own, or stores the lease in the registry
+            binding = lease_bindings.for_lease(contract_address) if contract_address else lease_bindings.for_new_lease()
+            while new_status is None:
+                tx_type, call = binding.creation_call((contract_id, contract_address, landlord_wallet), landlord_wallet,
+                                                      tenant_wallet, wei_from_db(rent_amount_wei), lease_duration)
+                tx_hash, tx_receipt = send_transaction(tx_type, call, {
+                    'from': wallet_address,
+                    'nonce': nonce
+                }, private_key)
+                nonce += 1
+                _, changes = apply_effect(cursor, tx_type, contract_id, tx_receipt)
+                conn.commit()  # The transaction is mined, keep its effect even if the next one fails
+                contract_address = changes.get("contract_address", contract_address)
+                new_status = changes.get("new_status")
             app.logger.info(f"Debug: Contract deployed and signed at {contract_address}")
 
         if user_role == 'Tenant' and current_status == 'Landlord Signed':
             # Tenant signing
-            contract = web3.eth.contract(address=contract_address, abi=CONTRACT_ABI)
-            contract_state = contract.functions.state().call()
+            lease = (contract_id, contract_address, landlord_wallet)
+            binding = lease_bindings.for_lease(contract_address)
+            contract = binding.contract(lease)
+            contract_state = binding.state(lease).call()
             app.logger.info(f"Debug: Contract state before tenant signing: {contract_state}")
             if contract_state != 0:  # Assuming 0 = Pending
                  app.logger.error("Error: Contract is not in the Pending state.")
+                 conn.close()
                  return jsonify({"error": "Contract is not in the Pending state."}), 400
             nonce = web3.eth.get_transaction_count(wallet_address)
-            tx = contract.functions.signAgreement().build_transaction({
+            tx_hash, tx_receipt = send_transaction('tenant_sign', binding.sign(lease), {
                 'from': wallet_address,
-                'nonce': nonce,
-                'gas': 300000,
-                'gasPrice': web3.to_wei('20', 'gwei')
-            })
-            signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-            tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-            tx_receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+                'nonce': nonce
+            }, private_key)
             # Process logs from the transaction receipt
             try:
                for log in tx_receipt.logs:
@@ -797,56 +1221,32 @@ def sign_contract():
             except Exception as e:
              app.logger.error(f"Error decoding event log: {str(e)}")
 
-            # Debugging: Fetch the state from the smart contract
-            contract_state = contract.functions.state().call()
-            is_signed = contract.functions.isSigned().call()
-            app.logger.info(f"Debug: Contract state after tenant signing: {contract_state}, isSigned: {is_signed}")
-
-            if contract_state == 1:  # Active state
-                new_status = 'Active'
-                app.logger.info(f"Debug: Contract is now active for apartment_id: {apartment_id}")
-                current_status=new_status
+            # A mined signAgreement from the tenant activates the lease
+            _, changes = apply_effect(cursor, 'tenant_sign', contract_id, tx_receipt)
+            conn.commit()
+            new_status = current_status = changes["new_status"]
+            app.logger.info(f"Debug: Contract is now active for apartment_id: {apartment_id}")
         if user_role == 'Tenant' and current_status == 'Active':
             # Tenant paying
-            contract = web3.eth.contract(address=contract_address, abi=CONTRACT_ABI)
+            lease = (contract_id, contract_address, landlord_wallet)
+            binding = lease_bindings.for_lease(contract_address)
             nonce = web3.eth.get_transaction_count(wallet_address)
             # Fetch rent amount from the database
-            payment_amount = int(float(rent_amount) * 10**18)  # Convert rent amount to Wei
+            payment_amount = wei_from_db(rent_amount_wei)
             app.logger.info(f"Debug: Payment amount calculated as {payment_amount} Wei")
 
-            tx = contract.functions.makePayment().build_transaction({
+            tx_hash, tx_receipt = send_transaction('pay', binding.make_payment(lease), {
                 'from': wallet_address,
                 'value': payment_amount,  # Set payment amount here
-                'nonce': nonce,
-                'gas': 300000,
-                'gasPrice': web3.to_wei('20', 'gwei')
-            })
-            signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-            tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-            tx_receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
-
-            # Debugging: Fetch the state from the smart contract
-            contract_state = contract.functions.state().call()
-            app.logger.info(f"Debug: Contract state after payment: {contract_state}")
-
-            # Update next payment date
-            from datetime import datetime, timedelta
-            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
-            next_payment_date = start_date_obj + timedelta(days=30)
-            cursor.execute('UPDATE contracts SET next_payment_date = ? WHERE apartment_id = ?', 
-                           (next_payment_date.strftime('%Y-%m-%d'), apartment_id))
-            app.logger.info(f"Debug: Next payment date set to {next_payment_date}")
+                'nonce': nonce
+            }, private_key)
 
-        # Ensure new_status is set before updating
-        if new_status:
-            cursor.execute('UPDATE contracts SET status = ? WHERE apartment_id = ?', (new_status, apartment_id))
-            app.logger.info(f"Debug: Updated contract status to '{new_status}' for apartment_id: {apartment_id}")
+            # Move the due date forward from where it was, not from the start date
+            _, changes = apply_effect(cursor, 'pay', contract_id, tx_receipt, {"amount_wei": payment_amount})
+            conn.commit()
+            app.logger.info(f"Debug: Next payment date set to {changes['next_payment_date']}")
 
-        # Optionally update apartment availability if the contract becomes active
-        if new_status == 'Active':
-            cursor.execute('UPDATE apartments SET availability = ? WHERE id = ?', ('Unavailable', apartment_id))
-
-        conn.commit()
+        event_broker.publish_contracts(cursor, 'contract.status', [contract_id])
         conn.close()
 
         return jsonify({
@@ -855,112 +1255,161 @@ def sign_contract():
             "new_status": new_status
         }), 200
 
+    except TransactionReverted as e:
+        app.logger.info(f"Debug: sign_contract stopped before broadcasting: {e.reason}")
+        return revert_response(e)
+    except RelayError as e:
+        return jsonify({"error": str(e)}), e.status
     except Exception as e:
         app.logger.error(f"Error during sign_contract: {str(e)}")
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
+def sign_contract_template(contract_id, contract_address, current_status, user_role, wallet_address,
+                           landlord_wallet, tenant_wallet, rent_amount_wei, lease_duration):
+    """The next signing transaction of the lease, unsigned, for the client to sign and relay."""
+    lease = (contract_id, contract_address, landlord_wallet)
+    if user_role == 'Landlord' and current_status == 'Pending':
+        binding = lease_bindings.for_lease(contract_address) if contract_address else lease_bindings.for_new_lease()
+        tx_type, call = binding.creation_call(lease, landlord_wallet, tenant_wallet, wei_from_db(rent_amount_wei),
+                                              lease_duration)
+        return transaction_template(tx_type, call, wallet_address, contract_id)
+    if user_role == 'Tenant' and current_status == 'Landlord Signed':
+        return transaction_template('tenant_sign', lease_bindings.for_lease(contract_address).sign(lease),
+                                    wallet_address, contract_id)
+    if user_role == 'Tenant' and current_status == 'Active':
+        payment_amount = wei_from_db(rent_amount_wei)
+        return transaction_template('pay', lease_bindings.for_lease(contract_address).make_payment(lease),
+                                    wallet_address, contract_id, value=payment_amount,
+                                    params={"months": 1, "amount_wei": str(payment_amount)})
+    return jsonify({"error": f"Nothing to sign for a {user_role.lower()} while the contract is {current_status}."}), 400
+
 @app.route('/contracts/pay', methods=['POST'])
+@require_auth(roles=["Tenant"])
+@idempotency_store.idempotent('/contracts/pay')
 def make_payment():
     try:
         data = request.json
-        apartment_id = data['apartment_id']
         wallet_address = data['wallet_address']
-        private_key = data['private_key']
+        private_key = data.get('private_key')  # Without it the client gets a transaction to sign itself
+        months = data.get('months', 1)
+
+        error = check_request_wallet(wallet_address)
+        if error:
+            return error
+        if not isinstance(months, int) or isinstance(months, bool) or months < 1:
+            return jsonify({"error": "months must be a positive integer"}), 400
 
         # Connect to the database and fetch contract details
         conn = sqlite3.connect(DATABASE_FILE)
         cursor = conn.cursor()
-        cursor.execute('SELECT contract_address, rent_amount FROM contracts WHERE apartment_id = ?', (apartment_id,))
-        result = cursor.fetchone()
-
-        if not result:
-            return jsonify({"error": "Contract not found."}), 404
-
-        contract_address, rent_amount = result
-        contract = web3.eth.contract(address=contract_address, abi=CONTRACT_ABI)
-
-        # Calculate payment amount from the database
-        payment_amount = int(float(rent_amount) * 10**18)  # Convert rent amount to Wei
+        result, error = find_contract(cursor, data,
+                                      'id, contract_address, landlord_wallet, rent_amount_wei, lease_duration')
+        if error:
+            conn.close()
+            return error
+
+        contract_id, contract_address, landlord_wallet, rent_amount_wei, lease_duration = result
+        if months > lease_duration:
+            conn.close()
+            return jsonify({"error": f"months cannot exceed the lease duration of {lease_duration}"}), 400
+        lease = (contract_id, contract_address, landlord_wallet)
+        binding = lease_bindings.for_lease(contract_address)
+
+        # Exact payment amount from the database
+        payment_amount = wei_from_db(rent_amount_wei) * months
+
+        # Several months go through payMonths in one transaction; leases deployed before it existed only take one
+        payment_call = binding.make_payment(lease) if months == 1 else binding.pay_months(lease, months)
+        if payment_call is None:
+            conn.close()
+            return jsonify({"error": "This lease's contract only accepts one month per payment"}), 400
+
+        tx_type = 'pay' if months == 1 else 'pay_months'
+        payment = {"months": months, "amount_wei": str(payment_amount)}
+        if not private_key:
+            conn.close()
+            return transaction_template(tx_type, payment_call, wallet_address, contract_id, value=payment_amount,
+                                        params=payment)
 
         # Fetch the nonce for the tenant's wallet
         nonce = web3.eth.get_transaction_count(wallet_address)
 
-        # Build the transaction
-        tx = contract.functions.makePayment().build_transaction({
+        # Simulate, sign and send the transaction using the tenant's private key
+        tx_hash, tx_receipt = send_transaction(tx_type, payment_call, {
             'from': wallet_address,
             'value': payment_amount,
-            'nonce': nonce,
-            'gas': 300000,
-            'gasPrice': web3.to_wei('20', 'gwei')
-        })
+            'nonce': nonce
+        }, private_key)
 
-        # Sign and send the transaction using the tenant's private key
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        web3.eth.wait_for_transaction_receipt(tx_hash)
+        event_type, changes = apply_effect(cursor, tx_type, contract_id, tx_receipt, payment)
+        conn.commit()
+        event_broker.publish_contracts(cursor, event_type, [contract_id], transaction_hash=web3.to_hex(tx_hash))
+        conn.close()
 
-        return jsonify({"message": "Payment made successfully.", "transaction_hash": web3.to_hex(tx_hash)}), 200
+        return jsonify(dict(changes, message="Payment made successfully.", transaction_hash=web3.to_hex(tx_hash))), 200
 
+    except TransactionReverted as e:
+        return revert_response(e)
+    except RelayError as e:
+        return jsonify({"error": str(e)}), e.status
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 
 @app.route('/contracts/terminate', methods=['POST'])
+@require_auth(roles=["Landlord", "Tenant"])
+@idempotency_store.idempotent('/contracts/terminate')
 def terminate_contract():
     try:
         data = request.json
-        apartment_id = data['apartment_id']
-        role = data['role']
+        role = g.user["role"]  # From the token, the role in the request body is not trusted
         wallet_address = data['wallet_address']
         private_key = data.get('private_key')
 
-        if not private_key:
-            return jsonify({"error": "Private key is required."}), 400
+        error = check_request_wallet(wallet_address)
+        if error:
+            return error
 
         # Verify that the private key matches the provided wallet address
-        provided_account = web3.eth.account.from_key(private_key).address
-        if provided_account.lower() != wallet_address.lower():
-            return jsonify({"error": "Private key does not match the provided wallet address."}), 400
+        if private_key:
+            provided_account = web3.eth.account.from_key(private_key).address
+            if provided_account.lower() != wallet_address.lower():
+                return jsonify({"error": "Private key does not match the provided wallet address."}), 400
 
         # Fetch contract details
         conn = sqlite3.connect(DATABASE_FILE)
         cursor = conn.cursor()
-        cursor.execute('SELECT contract_address, rent_amount FROM contracts WHERE apartment_id = ?', (apartment_id,))
-        result = cursor.fetchone()
+        result, error = find_contract(cursor, data, 'id, contract_address, landlord_wallet, rent_amount_wei, status')
+        if error:
+            conn.close()
+            return error
 
-        if not result:
-            return jsonify({"error": "Contract not found."}), 404
+        contract_id, contract_address, landlord_wallet, rent_amount_wei, status = result
+        lease = (contract_id, contract_address, landlord_wallet)
 
-        contract_address, rent_amount = result
-        contract = web3.eth.contract(address=contract_address, abi=CONTRACT_ABI)
-        
-        rent_amount_decimal = Decimal(str(rent_amount))  # Ensure exact value
-        refund_amount_wei = int(rent_amount_decimal * Decimal(10**18))
+        # The contract only takes a refund from the landlord of an active lease, anything else must send nothing
+        refund_amount_wei = wei_from_db(rent_amount_wei) if role == 'Landlord' and status == 'Active' else 0
 
-        app.logger.info(f"Role: {role}, Value: {0 if role == 'Tenant' else refund_amount_wei}")
+        app.logger.info(f"Role: {role}, Value: {refund_amount_wei}")
 
+        terminate_call = lease_bindings.for_lease(contract_address).terminate(lease)
+        if not private_key:
+            conn.close()
+            return transaction_template('terminate', terminate_call, wallet_address, contract_id,
+                                        value=refund_amount_wei)
 
-        # Build the transaction to call terminateAgreement
+        # Simulate, sign and send the transaction to call terminateAgreement
         nonce = web3.eth.get_transaction_count(wallet_address)
-        tx = contract.functions.terminateAgreement().build_transaction({
+        tx_hash, tx_receipt = send_transaction('terminate', terminate_call, {
             'from': wallet_address,
-            'value': 0 if role == 'tenant' else refund_amount_wei,   # Set the refund amount
-            'nonce': nonce,
-            'gas': 300000,
-            'gasPrice': web3.to_wei('20', 'gwei')
-        })
-
-        # Sign and send the transaction
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        tx_receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
-
-        if tx_receipt.status != 1:
-            raise Exception("Transaction failed on the blockchain.")
+            'value': refund_amount_wei,  # Set the refund amount
+            'nonce': nonce
+        }, private_key)
 
         # Update the database to mark the contract as terminated
-        cursor.execute('UPDATE contracts SET status = ? WHERE apartment_id = ?', ('Terminated', apartment_id))
+        event_type, _ = apply_effect(cursor, 'terminate', contract_id, tx_receipt)
         conn.commit()
+        event_broker.publish_contracts(cursor, event_type, [contract_id], transaction_hash=web3.to_hex(tx_hash))
         conn.close()
 
         return jsonify({
@@ -968,14 +1417,268 @@ def terminate_contract():
             "transaction_hash": web3.to_hex(tx_hash)
         }), 200
 
+    except TransactionReverted as e:
+        return revert_response(e)
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+
+@app.route('/contracts/cancel', methods=['POST'])
+@require_auth(roles=["Landlord", "Tenant"])
+def cancel_contract():
+    """Withdraws a lease nobody has signed yet and frees its dates. Signed leases are terminated on-chain instead."""
+    try:
+        data = request.json
+        conn = sqlite3.connect(DATABASE_FILE)
+        cursor = conn.cursor()
+        result, error = find_contract(cursor, data, 'id, status')
+        if error:
+            conn.close()
+            return error
+
+        contract_id, status = result
+        # Only while still Pending, a landlord signature may land in between
+        cursor.execute("UPDATE contracts SET status = 'Cancelled' WHERE id = ? AND status = 'Pending'", (contract_id,))
+        if cursor.rowcount != 1:
+            conn.close()
+            return jsonify({"error": f"Only Pending contracts can be cancelled, this one is {status}."}), 409
+        conn.commit()
+        event_broker.publish_contracts(cursor, 'contract.cancelled', [contract_id])
+        conn.close()
+
+        return jsonify({"message": "Contract cancelled.", "contract_id": contract_id, "new_status": 'Cancelled'}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+@app.route('/contracts/<int:contract_id>/verify', methods=['GET'])
+@require_auth(roles=["Landlord", "Tenant", "Admin"])
+def verify_contract(contract_id):
+    try:
+        conn = sqlite3.connect(DATABASE_FILE)
+        try:
+            result = verify_lease(conn.cursor(), contract_id)
+        except ValueError as e:
+            app.logger.error(f"Contract {contract_id} cannot be verified: {e}")
+            return jsonify({"error": "The contract's stored terms are malformed and cannot be verified."}), 409
+        finally:
+            conn.close()
+        if result is None:
+            return jsonify({"error": "Contract not found."}), 404
+        wallet = g.user["wallet_address"]
+        if g.user["role"] != "Admin" and not (same_wallet(result["terms"]["landlord_wallet"], wallet)
+                                              or same_wallet(result["terms"]["tenant_wallet"], wallet)):
+            return jsonify({"error": "You are not a party to this contract."}), 403
+
+        # The stored batch row says the root was anchored, the chain confirms it
+        batch = result["batch"]
+        result["on_chain"] = None
+        if batch and batch["tx_hash"] and batch["status"] == 'Anchored':
+            result["on_chain"] = lease_anchorer.check_on_chain(batch["tx_hash"], batch["merkle_root"])
+            result["anchored"] = result["anchored"] and result["on_chain"] is not False
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+@app.route('/tx/relay', methods=['POST'])
+@require_auth(roles=["Landlord", "Tenant"])
+def relay_transaction():
+    try:
+        data = request.json
+        template, confirmed = tx_relay.relay(g.user["wallet_address"], data['template_id'], data['raw_transaction'])
+        if confirmed is None:
+            # Already relayed, report where it is
+            return jsonify(template), 200 if template["status"] == 'confirmed' else 202
+        if not data.get('wait', True):
+            return jsonify(template), 202  # Events report the outcome
+
+        try:
+            changes = confirmed.result(timeout=receipt_waiter.timeout)
+        except FutureTimeoutError:
+            return jsonify(template), 202
+        return jsonify(dict(changes, message="Transaction confirmed.", action=template["action"],
+                            transaction_hash=template["transaction_hash"])), 200
+
+    except RelayError as e:
+        return jsonify({"error": str(e)}), e.status
+    except TransactionDropped as e:
+        return jsonify({"error": str(e)}), 502
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+@app.route('/tx/<template_id>', methods=['GET'])
+@require_auth(roles=["Landlord", "Tenant"])
+def relayed_transaction_status(template_id):
+    try:
+        return jsonify(tx_relay.status(g.user["wallet_address"], template_id)), 200
+    except RelayError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+@app.route('/events/ticket', methods=['POST'])
+@require_auth()
+def event_ticket():
+    # EventSource cannot send headers; the ticket goes in the stream URL instead of the access token
+    return jsonify({"ticket": event_broker.issue_ticket(g.user), "expires_in": event_broker.ticket_ttl}), 200
+
+
+@app.route('/events/stream', methods=['GET'])
+def event_stream():
+    user = event_broker.redeem_ticket(request.args.get("ticket", ""))
+    if not user:
+        return jsonify({"error": "Invalid or expired stream ticket"}), 401
+    try:
+        subscription = event_broker.subscribe(user["wallet_address"])
+    except EventBrokerFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "30"}
+
+    # EventSource sends Last-Event-ID on reconnect, other clients may use the query string
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    stream = event_broker.stream(
+        subscription,
+        last_event_id=int(last_event_id) if last_event_id and last_event_id.isdigit() else None,
+        expires_at=user["exp"]  # Ends with the access token, the client reconnects with a new ticket
+    )
+    return Response(stream, mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # Keep reverse proxies from buffering the stream
+    })
+
+
+@app.route('/metrics/events', methods=['GET'])
+@require_auth(roles=["Admin"])
+def event_metrics():
+    try:
+        return jsonify(event_broker.stats()), 200
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+@app.route('/admin/photos/gc', methods=['POST'])
+@require_auth(roles=["Admin"])
+def collect_orphan_photos():
+    try:
+        data = request.get_json(silent=True) or {}
+        dry_run = data.get("dry_run", True)  # Only report unless explicitly asked to remove
+        collector = PhotoGarbageCollector(
+            DATABASE_FILE,
+            photo_storage,
+            quarantine=data.get("quarantine", True),
+            min_age_seconds=int(data.get("min_age_seconds", PHOTO_GC_MIN_AGE_SECONDS))
+        )
+        return jsonify(collector.run(dry_run=dry_run)), 200
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+@app.route('/metrics/gas', methods=['GET'])
+@require_auth(roles=["Admin"])
+def gas_metrics():
+    try:
+        return jsonify(fee_strategy.report()), 200
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+@app.route('/metrics/preflight', methods=['GET'])
+@require_auth(roles=["Admin"])
+def preflight_metrics():
+    try:
+        return jsonify(preflight.stats()), 200
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+@app.route('/metrics/receipts', methods=['GET'])
+@require_auth(roles=["Admin"])
+def receipt_metrics():
+    try:
+        return jsonify(receipt_waiter.stats()), 200
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+@app.route('/admin/analytics/<report>', methods=['GET'])
+@require_auth(roles=["Admin"])
+def admin_analytics(report):
+    try:
+        if report not in analytics.reports:
+            return jsonify({"error": f"Unknown report. Available: {', '.join(analytics.reports)}"}), 404
+        params = {}
+        try:
+            if report == 'rent-by-location':
+                params["min_listings"] = max(int(request.args.get("min_listings", 1)), 1)
+            elif report == 'revenue-by-landlord':
+                params["limit"] = min(max(int(request.args.get("limit", 50)), 1), 1000)
+        except ValueError:
+            return jsonify({"error": "min_listings and limit must be integers"}), 400
+        refresh = request.args.get("refresh", "false").lower() == "true"  # Recompute before the TTL runs out
+        return jsonify(analytics.report(report, refresh=refresh, **params)), 200
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+@app.route('/metrics/analytics', methods=['GET'])
+@require_auth(roles=["Admin"])
+def analytics_metrics():
+    try:
+        return jsonify(analytics.stats()), 200
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+@app.route('/metrics/user-cache', methods=['GET'])
+@require_auth(roles=["Admin"])
+def user_cache_metrics():
+    try:
+        return jsonify(user_cache.stats()), 200
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 
+@app.route('/photos/upload-url', methods=['POST'])
+@require_auth(roles=["Landlord"])
+def photo_upload_url():
+    try:
+        data = request.json or {}
+        content_type = data.get("content_type", "")
+        if not content_type.startswith("image/"):
+            return jsonify({"error": "Only image uploads are allowed"}), 400
+        if not photo_storage.supports_direct_upload:
+            return jsonify({"error": "Direct uploads are not supported by this storage"}), 400
+
+        # The client PUTs the bytes straight to storage, then sends the key with the apartment form
+        key = new_photo_key(g.user["user_id"], data.get("filename"))
+        return jsonify(photo_storage.presigned_upload(key, content_type)), 200
+    except StorageError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
 
-@app.route('/uploads/<filename>')
+@app.route('/uploads/<path:filename>')
 def serve_uploaded_file(filename):
-    return send_from_directory("uploads", filename)
+    # Only used with local storage and no CDN in front of it
+    if not hasattr(photo_storage, "root"):
+        return jsonify({"error": "Not found"}), 404
+    return send_from_directory(photo_storage.root, filename)
+
+def start_background_jobs():
+    tx_relay.resume_sent()  # Relayed transactions the last run was still waiting for
+    lease_sweeper.start()
+    contract_archiver.start()
+    lease_anchorer.start()
+
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    # The debug reloader imports this module twice, only run background jobs in the serving process
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_jobs()
+    # Development server, one thread per request and open event stream; serve.py is for production
+    app.run(debug=True, threaded=True)
\ No newline at end of file
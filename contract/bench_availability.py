@@ -0,0 +1,118 @@
+"""Times overlap checks and date-range availability queries against the lease_intervals index.
+
+Builds a throwaway database with synthetic apartments and leases, then runs:
+    python bench_availability.py --leases 100000 --apartments 20000
+
+Each query runs once through the R*Tree and once as a plain scan of contracts,
+and the script prints the median time of both.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from leases import available_apartment_ids, init_lease_index, overlapping_leases
+
+STATUSES = ('Pending', 'Landlord Signed', 'Active', 'Active', 'Active', 'Completed', 'Terminated')
+
+
+def build_database(path, apartments, leases, seed):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('CREATE TABLE apartments (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT)')
+    cursor.execute('''
+        CREATE TABLE contracts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            apartment_id INTEGER NOT NULL,
+            start_date TEXT,
+            end_date TEXT,
+            status TEXT NOT NULL DEFAULT 'Pending'
+        )
+    ''')
+    init_lease_index(cursor)
+    cursor.executemany('INSERT INTO apartments (title) VALUES (?)', ((f"Apartment {i}",) for i in range(apartments)))
+
+    # Back-to-back leases per apartment from 2020 on, so live leases never overlap
+    next_start = {}
+    rows = []
+    for _ in range(leases):
+        apartment_id = rng.randint(1, apartments)
+        start = next_start.get(apartment_id, date(2020, 1, 1) + timedelta(days=rng.randint(0, 60)))
+        end = start + timedelta(days=30 * rng.randint(1, 12))
+        next_start[apartment_id] = end + timedelta(days=rng.randint(0, 45))
+        rows.append((apartment_id, start.isoformat(), end.isoformat(), rng.choice(STATUSES)))
+    cursor.executemany('INSERT INTO contracts (apartment_id, start_date, end_date, status) VALUES (?, ?, ?, ?)', rows)
+    conn.commit()
+    return conn
+
+
+def median_ms(fn, args_list):
+    timings = []
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def scan_overlapping(cursor, apartment_id, start_date, end_date):
+    cursor.execute('''
+        SELECT id FROM contracts
+        WHERE apartment_id = ? AND status NOT IN ('Completed', 'Terminated') AND start_date < ? AND end_date > ?
+    ''', (apartment_id, end_date, start_date))
+    return cursor.fetchall()
+
+
+def scan_available(cursor, start_date, end_date, after_id=0, limit=100):
+    cursor.execute('''
+        SELECT a.id FROM apartments a
+        WHERE a.id > ? AND NOT EXISTS (
+            SELECT 1 FROM contracts c
+            WHERE c.apartment_id = a.id AND c.status NOT IN ('Completed', 'Terminated')
+              AND c.start_date < ? AND c.end_date > ?
+        )
+        ORDER BY a.id LIMIT ?
+    ''', (after_id, end_date, start_date, limit))
+    return cursor.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leases", type=int, default=100000)
+    parser.add_argument("--apartments", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed + 1)
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        conn = build_database(os.path.join(directory, "bench.db"), args.apartments, args.leases, args.seed)
+        print(f"Built {args.leases} leases over {args.apartments} apartments in {time.perf_counter() - started:.1f}s")
+        cursor = conn.cursor()
+        indexed = cursor.execute('SELECT count(*) FROM lease_intervals').fetchone()[0]
+        print(f"{indexed} open leases in lease_intervals")
+
+        ranges = []
+        for _ in range(args.queries):
+            start = date(2020, 1, 1) + timedelta(days=rng.randint(0, 365 * 6))
+            ranges.append((start.isoformat(), (start + timedelta(days=30 * rng.randint(1, 6))).isoformat()))
+        checks = [(cursor, rng.randint(1, args.apartments), *dates) for dates in ranges]
+        pages = [(cursor, *dates, 0, args.page_size) for dates in ranges]
+
+        print(f"{'query':<32}{'R*Tree ms':>12}{'scan ms':>12}")
+        print(f"{'overlap check (one apartment)':<32}{median_ms(overlapping_leases, checks):>12.3f}"
+              f"{median_ms(scan_overlapping, checks):>12.3f}")
+        print(f"{'available, first page':<32}{median_ms(available_apartment_ids, pages):>12.3f}"
+              f"{median_ms(scan_available, pages):>12.3f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
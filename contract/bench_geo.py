@@ -0,0 +1,101 @@
+"""Times /apartments/near style radius queries over synthetic listings.
+
+Builds a throwaway database of listings scattered around Amman, then runs:
+    python bench_geo.py --listings 1000000 --km 2
+
+Each query runs through the apartment_locations R*Tree with the NumPy haversine
+refinement, and as a bounding box over a (latitude, longitude) B-tree index for
+comparison. The script prints the median time of both and checks they agree.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from geo import AMMAN_GAZETTEER, apartments_near, bounding_box, haversine_km, init_geo_index
+
+
+def build_database(path, listings, seed):
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('CREATE TABLE apartments (id INTEGER PRIMARY KEY AUTOINCREMENT, location TEXT NOT NULL)')
+    init_geo_index(cursor)
+
+    # Listings cluster around the gazetteer's neighbourhoods, a few km wide
+    centres = np.array(list(AMMAN_GAZETTEER.values()))
+    picks = centres[rng.integers(0, len(centres), listings)]
+    latitudes = picks[:, 0] + rng.normal(0, 0.02, listings)
+    longitudes = picks[:, 1] + rng.normal(0, 0.02, listings)
+    cursor.executemany('INSERT INTO apartments (location, latitude, longitude) VALUES (?, ?, ?)',
+                       (("Amman", float(lat), float(lon)) for lat, lon in zip(latitudes, longitudes)))
+    cursor.execute('CREATE INDEX idx_bench_apartments_lat_lon ON apartments (latitude, longitude)')
+    conn.commit()
+    return conn
+
+
+def btree_near(cursor, latitude, longitude, km, limit=100):
+    """The same search without the R*Tree: bounding box over the B-tree, then haversine."""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, km)
+    cursor.execute('''
+        SELECT id, latitude, longitude FROM apartments
+        WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?
+    ''', (min_lat, max_lat, min_lon, max_lon))
+    rows = cursor.fetchall()
+    if not rows:
+        return []
+    candidates = np.array(rows, dtype=np.float64)
+    distances = haversine_km(latitude, longitude, candidates[:, 1], candidates[:, 2])
+    inside = np.flatnonzero(distances <= km)
+    nearest = inside[np.argsort(distances[inside], kind="stable")][:limit]
+    return [(int(candidates[i, 0]), float(distances[i])) for i in nearest]
+
+
+def median_ms(fn, args_list):
+    timings, results = [], []
+    for args in args_list:
+        started = time.perf_counter()
+        results.append(fn(*args))
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", type=int, default=1000000)
+    parser.add_argument("--km", type=float, default=2.0)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed + 1)
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        conn = build_database(os.path.join(directory, "bench.db"), args.listings, args.seed)
+        print(f"Built {args.listings} listings in {time.perf_counter() - started:.1f}s")
+        cursor = conn.cursor()
+
+        points = [(cursor, rng.uniform(31.88, 32.06), rng.uniform(35.80, 36.00), args.km, args.limit)
+                  for _ in range(args.queries)]
+        rtree_ms, rtree_results = median_ms(apartments_near, points)
+        btree_ms, btree_results = median_ms(btree_near, points)
+        # Distances differ by the R*Tree's float32 rounding, compare the ids of the nearest listings
+        agree = sum(len(set(a for a, _ in r[:10]) ^ set(b for b, _ in t[:10])) <= 2
+                    for r, t in zip(rtree_results, btree_results))
+        found = statistics.median(len(result) for result in rtree_results)
+
+        print(f"radius {args.km} km, limit {args.limit}, median {found:.0f} results")
+        print(f"{'R*Tree + haversine':<24}{rtree_ms:>10.3f} ms")
+        print(f"{'B-tree + haversine':<24}{btree_ms:>10.3f} ms")
+        print(f"nearest listings agree on {agree}/{args.queries} queries")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
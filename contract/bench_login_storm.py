@@ -0,0 +1,73 @@
+"""Measures how a storm of /login requests affects the throughput of other routes.
+
+Start the backend first (python backend.py), then run:
+    python bench_login_storm.py --login-threads 16 --duration 15
+
+The script registers a throwaway tenant, measures /available-apartments alone,
+then again while the login threads hammer /login, and prints both rates.
+Compare runs with different BCRYPT_WORKERS / BCRYPT_ROUNDS settings.
+"""
+import argparse
+import threading
+import time
+import uuid
+
+import requests
+
+
+def hammer(url, stop, counter, lock, method="get", **kwargs):
+    session = requests.Session()
+    while not stop.is_set():
+        response = getattr(session, method)(url, **kwargs)
+        with lock:
+            counter[response.status_code] = counter.get(response.status_code, 0) + 1
+
+
+def run_phase(base_url, duration, reader_threads, login_threads, credentials):
+    stop = threading.Event()
+    lock = threading.Lock()
+    reads, logins = {}, {}
+    threads = [
+        threading.Thread(target=hammer, args=(f"{base_url}/available-apartments", stop, reads, lock))
+        for _ in range(reader_threads)
+    ] + [
+        threading.Thread(target=hammer, args=(f"{base_url}/login", stop, logins, lock, "post"),
+                         kwargs={"json": credentials})
+        for _ in range(login_threads)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return reads, logins
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:5000")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per phase")
+    parser.add_argument("--reader-threads", type=int, default=4)
+    parser.add_argument("--login-threads", type=int, default=16)
+    args = parser.parse_args()
+
+    suffix = uuid.uuid4().hex[:8]
+    credentials = {"email": f"storm-{suffix}@example.com", "password": "storm-password"}
+    requests.post(f"{args.base_url}/register", json={
+        **credentials,
+        "name": "Login Storm",
+        "wallet_address": f"0x{uuid.uuid4().hex}{suffix}",
+        "phone": "0000000000",
+        "role": "Tenant"
+    }).raise_for_status()
+
+    for label, login_threads in (("baseline", 0), ("login storm", args.login_threads)):
+        reads, logins = run_phase(args.base_url, args.duration, args.reader_threads, login_threads, credentials)
+        print(f"{label:<12} /available-apartments: {sum(reads.values()) / args.duration:8.1f} req/s {reads}")
+        if login_threads:
+            print(f"{'':<12} /login:                {sum(logins.values()) / args.duration:8.1f} req/s {logins}")
+
+
+if __name__ == "__main__":
+    main()
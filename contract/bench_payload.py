@@ -0,0 +1,87 @@
+"""Compares listing payload sizes and serialization times across response shapes.
+
+Builds a throwaway database of synthetic listings with photos, then runs:
+    python bench_payload.py --listings 20000 --fields id,title,price_in_jod,thumbnail_url
+
+For the full listing and the fields= selection, as JSON objects and as the compact
+columnar format, it prints the bytes sent, the gzipped bytes and the time to read
+and serialize every row.
+"""
+import argparse
+import random
+import sqlite3
+import time
+
+from fields import apartment_fields
+from streaming import encode_compact, encode_items, gzip_pieces, iter_rows
+
+WORDS = ("bright", "spacious", "quiet", "balcony", "view", "furnished", "parking", "elevator", "garden",
+         "kitchen", "renovated", "close", "to", "schools", "shops", "and", "the", "city", "centre")
+
+
+def build_database(listings, photos_per_listing, seed):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE apartments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, landlord_wallet TEXT, location TEXT, title TEXT,
+            description TEXT, price_in_jod REAL, rent_amount_eth REAL, rent_amount_wei TEXT,
+            lease_duration INTEGER, availability TEXT, contract_address TEXT, latitude REAL, longitude REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE apartment_photos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, apartment_id INTEGER NOT NULL, photo_url TEXT, storage_key TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_apartment_photos_apartment ON apartment_photos (apartment_id, id)')
+    for apartment_id in range(1, listings + 1):
+        price = rng.randint(200, 1500)
+        cursor.execute('INSERT INTO apartments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+            apartment_id, f"0x{rng.getrandbits(160):040x}", "Abdoun, Amman", f"Apartment {apartment_id}",
+            " ".join(rng.choice(WORDS) for _ in range(80)), price, price * 0.0004, str(price * 4 * 10 ** 14),
+            12, "Available", None, 31.95 + rng.random() / 10, 35.88 + rng.random() / 10
+        ))
+        cursor.executemany('INSERT INTO apartment_photos (apartment_id, storage_key) VALUES (?, ?)',
+                           [(apartment_id, f"{rng.getrandbits(128):032x}.jpg") for _ in range(photos_per_listing)])
+    conn.commit()
+    return conn
+
+
+def measure(conn, field_set, fields_param, compact):
+    selection = field_set.select(fields_param, placeholders=not compact)
+    started = time.perf_counter()
+    cursor = conn.execute(f'SELECT {selection.sql()} FROM apartments')
+    rows = (selection.values(row) for row in iter_rows(cursor))
+    if compact:
+        pieces = list(encode_compact(selection.columns, rows))
+    else:
+        pieces = list(encode_items(dict(zip(selection.columns, row)) for row in rows))
+    elapsed = time.perf_counter() - started
+    return sum(map(len, pieces)), sum(map(len, gzip_pieces(pieces))), elapsed * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", type=int, default=20000)
+    parser.add_argument("--photos", type=int, default=4, help="photos per listing")
+    parser.add_argument("--fields", default="id,title,price_in_jod,thumbnail_url")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    conn = build_database(args.listings, args.photos, args.seed)
+    field_set = apartment_fields(lambda storage_key, stored_url=None: f"https://cdn.example.com/{storage_key}")
+    print(f"{args.listings} listings, {args.photos} photos each")
+    print(f"{'shape':<28}{'bytes':>14}{'gzip bytes':>14}{'ms':>10}")
+    for label, fields_param, compact in (("full, objects", None, False),
+                                         ("full, compact", None, True),
+                                         ("fields=, objects", args.fields, False),
+                                         ("fields=, compact", args.fields, True)):
+        size, gzipped, elapsed = measure(conn, field_set, fields_param, compact)
+        print(f"{label:<28}{size:>14,}{gzipped:>14,}{elapsed:>10.1f}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
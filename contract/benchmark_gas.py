@@ -0,0 +1,120 @@
+"""Compares the gas used by every RentalAgreement variant and the shared RentalRegistry over
+a full lease lifecycle, and the gas per month of single payments against payMonths(n).
+
+Run against Ganache (GANACHE_URL from .env):
+    python benchmark_gas.py
+or against an in-process EVM (needs `pip install "web3[tester]"`):
+    python benchmark_gas.py --tester
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+from web3 import Web3
+
+from compiler import CONTRACT_VARIANTS, load_contract_interface
+
+STEPS = ["deploy", "sign (landlord)", "sign (tenant)", "pay", "pay months", "terminate"]
+
+
+def connect(use_tester):
+    if use_tester:
+        return Web3(Web3.EthereumTesterProvider())
+    load_dotenv()
+    web3 = Web3(Web3.HTTPProvider(os.getenv("GANACHE_URL", "http://127.0.0.1:7545")))
+    if not web3.is_connected():
+        raise Exception("Failed to connect to Ganache")
+    return web3
+
+
+def run_lifecycle(web3, variant, landlord, tenant, rent_amount, lease_duration, months):
+    """Deploys one lease and walks it through sign, pay, payMonths and terminate. Returns gas used per step."""
+    interface = load_contract_interface(variant)
+    gas_used = {}
+
+    def send(step, transaction):
+        receipt = web3.eth.wait_for_transaction_receipt(transaction)
+        if receipt.status != 1:
+            raise Exception(f"{variant}: {step} reverted")
+        gas_used[step] = receipt.gasUsed
+        return receipt
+
+    factory = web3.eth.contract(abi=interface['abi'], bytecode=interface['bin'])
+    receipt = send("deploy", factory.constructor(landlord, tenant, rent_amount, lease_duration).transact({'from': landlord}))
+    contract = web3.eth.contract(address=receipt.contractAddress, abi=interface['abi'])
+
+    send("sign (landlord)", contract.functions.signAgreement().transact({'from': landlord}))
+    send("sign (tenant)", contract.functions.signAgreement().transact({'from': tenant}))
+    send("pay", contract.functions.makePayment().transact({'from': tenant, 'value': rent_amount}))
+    send("pay months", contract.functions.payMonths(months).transact({'from': tenant, 'value': rent_amount * months}))
+    send("terminate", contract.functions.terminateAgreement().transact({'from': landlord, 'value': rent_amount}))
+    return gas_used
+
+
+def run_registry_lifecycle(web3, registry, lease_id, landlord, tenant, rent_amount, lease_duration, months):
+    """Same lifecycle as run_lifecycle on a lease stored in the registry. createLease stands in for deploy
+    and already carries the landlord's signature."""
+    gas_used = {"sign (landlord)": 0}
+
+    def send(step, transaction):
+        receipt = web3.eth.wait_for_transaction_receipt(transaction)
+        if receipt.status != 1:
+            raise Exception(f"registry: {step} reverted")
+        gas_used[step] = receipt.gasUsed
+        return receipt
+
+    functions = registry.functions
+    send("deploy", functions.createLease(lease_id, tenant, rent_amount, lease_duration).transact({'from': landlord}))
+    lease_id = functions.leaseKey(landlord, lease_id).call()  # The other calls take the landlord's key
+    send("sign (tenant)", functions.signAgreement(lease_id).transact({'from': tenant}))
+    send("pay", functions.makePayment(lease_id).transact({'from': tenant, 'value': rent_amount}))
+    send("pay months", functions.payMonths(lease_id, months).transact({'from': tenant, 'value': rent_amount * months}))
+    send("terminate", functions.terminateAgreement(lease_id).transact({'from': landlord, 'value': rent_amount}))
+    return gas_used
+
+
+def deploy_registry(web3, deployer):
+    interface = load_contract_interface("registry")
+    factory = web3.eth.contract(abi=interface['abi'], bytecode=interface['bin'])
+    receipt = web3.eth.wait_for_transaction_receipt(factory.constructor().transact({'from': deployer}))
+    return web3.eth.contract(address=receipt.contractAddress, abi=interface['abi']), receipt.gasUsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tester", action="store_true", help="use an in-process eth-tester EVM instead of Ganache")
+    parser.add_argument("--months", type=int, default=6, help="months paid in one payMonths call")
+    args = parser.parse_args()
+
+    web3 = connect(args.tester)
+    landlord, tenant = web3.eth.accounts[0], web3.eth.accounts[1]
+    rent_amount = web3.to_wei(0.5, 'ether')
+
+    results = {variant: run_lifecycle(web3, variant, landlord, tenant, rent_amount, 12, args.months)
+               for variant in CONTRACT_VARIANTS}
+    # The registry is deployed once; each lease afterwards is a storage write
+    registry, registry_deploy_gas = deploy_registry(web3, landlord)
+    results["registry"] = run_registry_lifecycle(web3, registry, 1, landlord, tenant, rent_amount, 12, args.months)
+
+    header = f"{'step':<18}" + "".join(f"{variant:>14}" for variant in results) + f"{'saved':>10}"
+    print(header)
+    print("-" * len(header))
+    for step in STEPS + ["total"]:
+        row = {variant: (sum(gas.values()) if step == "total" else gas[step]) for variant, gas in results.items()}
+        saved = 1 - row["optimized"] / row["standard"]
+        print(f"{step:<18}" + "".join(f"{row[variant]:>14,}" for variant in results) + f"{saved:>10.1%}")
+
+    print(f"\nregistry deployed once for all leases: {registry_deploy_gas:,} gas")
+
+    # Paying n months one by one costs n times the single payment
+    print()
+    header = f"{'gas per month':<18}" + "".join(f"{variant:>14}" for variant in results)
+    print(header)
+    print("-" * len(header))
+    print(f"{'makePayment()':<18}" + "".join(f"{gas['pay']:>14,}" for gas in results.values()))
+    print(f"{f'payMonths({args.months})':<18}" + "".join(f"{gas['pay months'] // args.months:>14,}" for gas in results.values()))
+    print(f"{'saved':<18}" + "".join(f"{1 - gas['pay months'] / (gas['pay'] * args.months):>14.1%}" for gas in results.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Where a lease lives on-chain: its own RentalAgreement contract, or an entry in the shared RentalRegistry.
+
+CONTRACT_MODE (per-lease or registry) only decides where new leases go. Each lease
+keeps the binding it was created with, chosen from its stored contract_address.
+
+Deploy the registry once, then set RENTAL_REGISTRY_ADDRESS and CONTRACT_MODE=registry:
+    python bindings.py --private-key 0x...
+"""
+import argparse
+import functools
+import json
+import os
+
+from eth_abi import encode
+from web3 import Web3
+
+from compiler import load_contract_interface
+
+CONTRACT_MODES = ("per-lease", "registry")
+
+
+class PerLeaseContracts:
+    """One RentalAgreement deployment per lease. A lease is (contract_id, contract_address, landlord_wallet)."""
+
+    mode = "per-lease"
+
+    def __init__(self, web3, contract_abi, variant):
+        self.web3 = web3
+        self.contract_abi = contract_abi
+        self.variant = variant  # RentalAgreement variant new leases are deployed with
+        # Contract code never changes, so the selector lookup is cached per address
+        self._supports = functools.lru_cache(maxsize=4096)(self._supports_function)
+
+    def contract(self, lease):
+        return self.web3.eth.contract(address=lease[1], abi=self.contract_abi)
+
+    def creation_call(self, lease, landlord, tenant, rent_amount_wei, lease_duration):
+        """Next landlord transaction of a new lease as (tx_type, call): deploy, then sign once deployed."""
+        if lease[1]:
+            return 'landlord_sign', self.contract(lease).functions.signAgreement()
+        interface = load_contract_interface(self.variant)
+        factory = self.web3.eth.contract(abi=interface['abi'], bytecode=interface['bin'])
+        return 'deploy', factory.constructor(
+            Web3.to_checksum_address(landlord),
+            Web3.to_checksum_address(tenant),
+            rent_amount_wei,
+            lease_duration
+        )
+
+    def state(self, lease):
+        return self.contract(lease).functions.state()
+
+    def sign(self, lease):
+        return self.contract(lease).functions.signAgreement()
+
+    def make_payment(self, lease):
+        return self.contract(lease).functions.makePayment()
+
+    def pay_months(self, lease, months):
+        """None for leases deployed before payMonths existed."""
+        if not self._supports(lease[1], 'payMonths(uint256)'):
+            return None
+        return self.contract(lease).functions.payMonths(months)
+
+    def terminate(self, lease):
+        return self.contract(lease).functions.terminateAgreement()
+
+    def check_completion(self, lease):
+        return self.contract(lease).functions.checkCompletion()
+
+    def period(self, lease):
+        """Calls reading the lease's on-chain startDate and leaseDuration, for one JSON-RPC batch."""
+        functions = self.contract(lease).functions
+        return [functions.startDate(), functions.leaseDuration()]
+
+    @staticmethod
+    def parse_period(results):
+        """(startDate, leaseDuration) from the results of period()."""
+        return results[0], results[1]
+
+    def _supports_function(self, contract_address, signature):
+        """True if the deployed bytecode dispatches the function."""
+        selector = Web3.keccak(text=signature)[:4]
+        return selector in bytes(self.web3.eth.get_code(contract_address))
+
+
+class RegistryContract:
+    """Every lease stored in one RentalRegistry, keyed by leaseKey(landlord_wallet, contract_id)."""
+
+    mode = "registry"
+
+    def __init__(self, web3, registry_abi, address):
+        self.web3 = web3
+        self.address = Web3.to_checksum_address(address)
+        self._contract = web3.eth.contract(address=self.address, abi=registry_abi)
+
+    def contract(self, lease=None):
+        return self._contract
+
+    @staticmethod
+    def key(lease):
+        """The registry's leaseKey of a lease, computed locally to save a call."""
+        landlord = Web3.to_checksum_address(lease[2])
+        return int.from_bytes(Web3.keccak(encode(['address', 'uint256'], [landlord, lease[0]])), 'big')
+
+    def creation_call(self, lease, landlord, tenant, rent_amount_wei, lease_duration):
+        """Stores the lease in the registry; creating it counts as the landlord's signature."""
+        return 'registry_create', self._contract.functions.createLease(
+            lease[0],
+            Web3.to_checksum_address(tenant),
+            rent_amount_wei,
+            lease_duration
+        )
+
+    def state(self, lease):
+        return self._contract.functions.state(self.key(lease))
+
+    def sign(self, lease):
+        return self._contract.functions.signAgreement(self.key(lease))
+
+    def make_payment(self, lease):
+        return self._contract.functions.makePayment(self.key(lease))
+
+    def pay_months(self, lease, months):
+        return self._contract.functions.payMonths(self.key(lease), months)
+
+    def terminate(self, lease):
+        return self._contract.functions.terminateAgreement(self.key(lease))
+
+    def check_completion(self, lease):
+        return self._contract.functions.checkCompletion(self.key(lease))
+
+    def period(self, lease):
+        return [self._contract.functions.getLease(self.key(lease))]
+
+    @staticmethod
+    def parse_period(results):
+        _, _, _, lease_duration, start_date, *_ = results[0]
+        return start_date, lease_duration
+
+
+class LeaseBindings:
+    """Picks the binding for new leases from the mode, and for existing leases from their address."""
+
+    def __init__(self, per_lease, registry=None, mode="per-lease"):
+        if mode not in CONTRACT_MODES:
+            raise ValueError(f"Unknown CONTRACT_MODE: {mode}")
+        if mode == "registry" and registry is None:
+            raise ValueError("CONTRACT_MODE=registry needs RENTAL_REGISTRY_ADDRESS")
+        self.per_lease = per_lease
+        self.registry = registry
+        self.mode = mode
+
+    def for_new_lease(self):
+        return self.registry if self.mode == "registry" else self.per_lease
+
+    def for_lease(self, contract_address):
+        if self.registry and contract_address and contract_address.lower() == self.registry.address.lower():
+            return self.registry
+        return self.per_lease
+
+
+def bindings_from_env(web3, contract_abi, variant):
+    """Builds the lease bindings from CONTRACT_MODE and RENTAL_REGISTRY_ADDRESS."""
+    registry = None
+    registry_address = os.getenv("RENTAL_REGISTRY_ADDRESS")
+    if registry_address:
+        with open("RentalRegistryABI.json") as abi_file:
+            registry = RegistryContract(web3, json.load(abi_file), registry_address)
+    return LeaseBindings(PerLeaseContracts(web3, contract_abi, variant), registry,
+                         mode=os.getenv("CONTRACT_MODE", "per-lease"))
+
+
+def main():
+    from dotenv import load_dotenv
+    from fees import FeeStrategy
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--private-key", required=True, help="key of the account paying for the deployment")
+    args = parser.parse_args()
+
+    load_dotenv()
+    web3 = Web3(Web3.HTTPProvider(os.getenv("GANACHE_URL", "http://127.0.0.1:7545")))
+    if not web3.is_connected():
+        raise Exception("Failed to connect to Ethereum network.")
+
+    account = web3.eth.account.from_key(args.private_key)
+    interface = load_contract_interface("registry")
+    factory = web3.eth.contract(abi=interface['abi'], bytecode=interface['bin'])
+    tx = FeeStrategy(web3).build_transaction(factory.constructor(), {
+        'from': account.address,
+        'nonce': web3.eth.get_transaction_count(account.address)
+    })
+    tx_hash = web3.eth.send_raw_transaction(account.sign_transaction(tx).raw_transaction)
+    receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+    print(f"RENTAL_REGISTRY_ADDRESS={receipt.contractAddress}")
+
+
+if __name__ == "__main__":
+    main()
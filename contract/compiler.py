@@ -0,0 +1,48 @@
+from functools import lru_cache
+
+from packaging.version import Version
+from solcx import compile_source, get_installed_solc_versions, install_solc
+
+# Deployable RentalAgreement variants, both expose the RentalAgreementABI.json interface
+CONTRACT_VARIANTS = {
+    "standard": {
+        "source": "RentalAgreement.sol",
+        "name": "RentalAgreement",
+        "solc_version": "0.8.0",
+        "optimize": False
+    },
+    "optimized": {
+        "source": "RentalAgreementOptimized.sol",
+        "name": "RentalAgreementOptimized",
+        "solc_version": "0.8.19",  # Custom errors need >= 0.8.4
+        "optimize": True
+    }
+}
+
+# One contract holding every lease, used when CONTRACT_MODE=registry
+REGISTRY_CONTRACT = {
+    "source": "RentalRegistry.sol",
+    "name": "RentalRegistry",
+    "solc_version": "0.8.19",
+    "optimize": True
+}
+
+
+@lru_cache(maxsize=None)
+def load_contract_interface(variant):
+    """Compiles a contract variant (or "registry") once per process and returns {'abi': ..., 'bin': ...}."""
+    config = REGISTRY_CONTRACT if variant == "registry" else CONTRACT_VARIANTS[variant]
+    with open(config["source"], 'r') as file:
+        contract_source_code = file.read()
+
+    if Version(config["solc_version"]) not in get_installed_solc_versions():
+        install_solc(config["solc_version"])
+
+    compiled_sol = compile_source(
+        contract_source_code,
+        output_values=['abi', 'bin'],
+        solc_version=config["solc_version"],
+        optimize=config["optimize"],
+        optimize_runs=200
+    )
+    return compiled_sol[f"<stdin>:{config['name']}"]
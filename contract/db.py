@@ -0,0 +1,11 @@
+def column_names(cursor, table):
+    cursor.execute(f'PRAGMA table_info({table})')
+    return [row[1] for row in cursor.fetchall()]
+
+
+def ensure_column(cursor, table, column, definition):
+    """Adds a column to an existing table if it is missing. Returns True when the column was added."""
+    if column in column_names(cursor, table):
+        return False
+    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return True
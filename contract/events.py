@@ -0,0 +1,176 @@
+import itertools
+import json
+import queue
+import secrets
+import threading
+import time
+from collections import deque
+
+# Contract columns sent with every contract event, enough for clients to patch their lists
+CONTRACT_EVENT_COLUMNS = (
+    "id", "apartment_id", "landlord_wallet", "tenant_wallet", "status", "next_payment_date", "overdue_since",
+    "contract_address"
+)
+
+
+class EventBrokerFull(Exception):
+    pass
+
+
+def format_sse(event_id, event_type, data):
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+class Subscription:
+    def __init__(self, wallet, max_queue):
+        self.wallet = wallet
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.overflowed = False  # Set when events were dropped, the client has to resync
+
+
+class EventBroker:
+    """In-process fan-out of contract events to Server-Sent Event streams, keyed by wallet.
+
+    Each open stream holds one small bounded queue and blocks on it between events. Under
+    the development server that is one thread per stream; under serve.py, where threading
+    and queue are patched by gevent, it is a greenlet, so one process holds thousands of
+    idle streams. max_subscribers caps them and further streams are refused. Recent events are kept in a ring buffer so a
+    reconnecting client can pass Last-Event-ID and receive what it missed.
+
+    Streams are opened with a short-lived, single-use ticket instead of the access token,
+    so the token never appears in a URL or an access log.
+    """
+
+    def __init__(self, max_queue=100, history=1000, heartbeat=15, max_subscribers=500, ticket_ttl=30):
+        self.max_queue = max_queue
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self.ticket_ttl = ticket_ttl
+        self._lock = threading.Lock()
+        self._tickets = {}  # ticket -> (claims, expires_at)
+        self._subscribers = {}  # wallet -> set of Subscription
+        self._subscriber_count = 0
+        self._history = deque(maxlen=history)  # (event_id, wallets, event_type, data)
+        self._ids = itertools.count(1)
+        self._last_id = 0
+        self._stats = {"published": 0, "delivered": 0, "dropped": 0, "resyncs": 0}
+
+    def publish(self, wallets, event_type, data):
+        wallets = {wallet.lower() for wallet in wallets if wallet}
+        with self._lock:
+            event_id = next(self._ids)
+            self._last_id = event_id
+            self._history.append((event_id, wallets, event_type, data))
+            self._stats["published"] += 1
+            for wallet in wallets:
+                for subscription in self._subscribers.get(wallet, ()):
+                    try:
+                        subscription.queue.put_nowait((event_id, event_type, data))
+                        self._stats["delivered"] += 1
+                    except queue.Full:
+                        subscription.overflowed = True
+                        self._stats["dropped"] += 1
+        return event_id
+
+    def publish_contracts(self, cursor, event_type, contract_ids, **extra):
+        """Publishes the current state of each contract to its landlord and tenant."""
+        contract_ids = list(contract_ids)
+        # Chunked to stay under SQLite's bound parameter limit
+        for start in range(0, len(contract_ids), 500):
+            chunk = contract_ids[start:start + 500]
+            cursor.execute(f'''
+                SELECT {", ".join(CONTRACT_EVENT_COLUMNS)} FROM contracts
+                WHERE id IN ({", ".join("?" * len(chunk))})
+            ''', chunk)
+            for row in cursor.fetchall():
+                contract = dict(zip(CONTRACT_EVENT_COLUMNS, row), **extra)
+                self.publish((contract["landlord_wallet"], contract["tenant_wallet"]), event_type, contract)
+
+    def issue_ticket(self, claims):
+        """A random ticket that opens one stream as the user with these claims within ticket_ttl seconds."""
+        ticket = secrets.token_urlsafe(24)
+        now = time.monotonic()
+        with self._lock:
+            for expired in [key for key, (_, expires_at) in self._tickets.items() if expires_at <= now]:
+                del self._tickets[expired]
+            self._tickets[ticket] = (claims, now + self.ticket_ttl)
+        return ticket
+
+    def redeem_ticket(self, ticket):
+        """The claims a ticket was issued for, or None if it is unknown, used or expired."""
+        with self._lock:
+            claims, expires_at = self._tickets.pop(ticket, (None, 0))
+        return claims if expires_at > time.monotonic() else None
+
+    def subscribe(self, wallet):
+        wallet = wallet.lower()
+        with self._lock:
+            if self._subscriber_count >= self.max_subscribers:
+                raise EventBrokerFull("Too many open event streams, try again later.")
+            subscription = Subscription(wallet, self.max_queue)
+            self._subscribers.setdefault(wallet, set()).add(subscription)
+            self._subscriber_count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subs = self._subscribers.get(subscription.wallet)
+            if subs and subscription in subs:
+                subs.discard(subscription)
+                self._subscriber_count -= 1
+                if not subs:
+                    del self._subscribers[subscription.wallet]
+
+    def stream(self, subscription, last_event_id=None, expires_at=None):
+        """Generator of SSE frames: missed events, then live events and heartbeats until expires_at."""
+        try:
+            yield "retry: 3000\n\n"
+            sent_up_to = 0
+            for event in self._replay(subscription, last_event_id):
+                sent_up_to = event[0]
+                yield format_sse(*event)
+
+            while expires_at is None or time.time() < expires_at:
+                try:
+                    event = subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if subscription.overflowed:
+                    # The client fell behind, tell it to refetch rather than send a partial history
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    subscription.overflowed = False
+                    yield self._resync_frame()
+                    continue
+                if event[0] > sent_up_to:  # Events published while replaying are already sent
+                    yield format_sse(*event)
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats,
+                        subscribers=self._subscriber_count,
+                        wallets=len(self._subscribers),
+                        history=len(self._history),
+                        last_event_id=self._last_id)
+
+    def _replay(self, subscription, last_event_id):
+        if last_event_id is None:
+            return []
+        with self._lock:
+            oldest = self._history[0][0] if self._history else self._last_id + 1
+            # Unknown ids come from before a restart or from beyond the ring buffer
+            if not (oldest - 1 <= last_event_id <= self._last_id):
+                self._stats["resyncs"] += 1
+                return [(self._last_id, "resync", {})]
+            return [(event_id, event_type, data)
+                    for event_id, wallets, event_type, data in self._history
+                    if event_id > last_event_id and subscription.wallet in wallets]
+
+    def _resync_frame(self):
+        with self._lock:
+            self._stats["resyncs"] += 1
+            return format_sse(self._last_id, "resync", {})
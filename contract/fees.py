@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Only replaced once the real estimate is known, stops web3 from estimating on its own
+_PLACEHOLDER_GAS = 21000
+
+
+class FeeStrategy:
+    """Fills gas limits from per-call estimates floored by cached ones, and EIP-1559 fees from a cached fee history."""
+
+    def __init__(self, web3, gas_margin=1.2, estimate_ttl=600, fee_ttl=12,
+                 fee_history_blocks=10, priority_percentile=50, min_priority_fee=None):
+        self.web3 = web3
+        self.gas_margin = gas_margin
+        self.estimate_ttl = estimate_ttl
+        self.fee_ttl = fee_ttl
+        self.fee_history_blocks = fee_history_blocks
+        self.priority_percentile = priority_percentile
+        self.min_priority_fee = min_priority_fee if min_priority_fee is not None else web3.to_wei(1, 'gwei')
+        self._lock = threading.Lock()
+        self._estimates = {}  # (selector, sends value) -> (highest recent gas limit, expires_at)
+        self._fees = None
+        self._fees_expire_at = 0.0
+        self._stats = {}
+
+    def build_transaction(self, fn, tx_params, preflight=None):
+        """Builds a transaction for a ContractFunction or ContractConstructor with gas and fees filled in.
+
+        preflight(tx) runs before the gas estimate, so a call that would revert fails before any estimating.
+        """
+        params = dict(tx_params)
+        params.update(self.fee_params())
+        params['gas'] = _PLACEHOLDER_GAS
+        tx = fn.build_transaction(params)
+        if preflight:
+            preflight(tx)
+        tx['gas'] = self.gas_limit(tx)
+        return tx
+
+    def gas_limit(self, tx):
+        """Estimates the transaction with the margin, never going below the highest recent limit of its function.
+
+        One function costs more on some paths than others (a first payment writes totalPaid from zero,
+        a landlord's termination sends a refund), so an estimate from one call cannot stand in for another.
+        """
+        call = {key: tx[key] for key in ('from', 'to', 'data', 'value') if tx.get(key) is not None}
+        gas = int(self.web3.eth.estimate_gas(call) * self.gas_margin)
+        key = self._cache_key(tx)
+        now = time.monotonic()
+        with self._lock:
+            floor = self._estimates.get(key)
+            if floor and floor[1] > now and floor[0] >= gas:
+                return floor[0]
+            self._estimates[key] = (gas, now + self.estimate_ttl)
+        return gas
+
+    def fee_params(self):
+        """Returns maxFeePerGas/maxPriorityFeePerGas, or gasPrice on chains without a base fee."""
+        now = time.monotonic()
+        with self._lock:
+            if self._fees and self._fees_expire_at > now:
+                return dict(self._fees)
+
+        fees = None
+        try:
+            history = self.web3.eth.fee_history(self.fee_history_blocks, 'latest', [self.priority_percentile])
+            # The last entry is the base fee of the next block
+            base_fee = history['baseFeePerGas'][-1] if history.get('baseFeePerGas') else 0
+            if base_fee:
+                rewards = sorted(reward[0] for reward in history.get('reward') or [] if reward)
+                priority_fee = rewards[len(rewards) // 2] if rewards else 0
+                priority_fee = max(priority_fee, self.min_priority_fee)
+                # Twice the base fee survives six consecutive full blocks
+                fees = {'maxFeePerGas': 2 * base_fee + priority_fee, 'maxPriorityFeePerGas': priority_fee}
+        except Exception as e:
+            logger.info("fee_history unavailable, using legacy gasPrice: %s", e)
+        if fees is None:
+            fees = {'gasPrice': self.web3.eth.gas_price}
+
+        with self._lock:
+            self._fees = fees
+            self._fees_expire_at = now + self.fee_ttl
+        return dict(fees)
+
+    def record(self, tx_type, tx, receipt):
+        """Tracks gas used against the gas limit we set, per transaction type."""
+        gas_used = receipt['gasUsed']
+        fee_paid = gas_used * receipt.get('effectiveGasPrice', tx.get('gasPrice', 0))
+        with self._lock:
+            stats = self._stats.setdefault(tx_type, {
+                "count": 0, "gas_estimated": 0, "gas_used": 0, "fees_paid_wei": 0, "out_of_gas": 0
+            })
+            stats["count"] += 1
+            stats["gas_estimated"] += tx['gas']
+            stats["gas_used"] += gas_used
+            stats["fees_paid_wei"] += fee_paid
+
+            # A transaction that burned its whole limit most likely ran out of gas, give its function more headroom
+            if gas_used >= tx['gas']:
+                stats["out_of_gas"] += 1
+                self._estimates[self._cache_key(tx)] = (int(tx['gas'] * self.gas_margin),
+                                                        time.monotonic() + self.estimate_ttl)
+
+    def report(self):
+        with self._lock:
+            report = {}
+            for tx_type, stats in self._stats.items():
+                report[tx_type] = dict(stats)
+                report[tx_type]["avg_gas_estimated"] = stats["gas_estimated"] // stats["count"]
+                report[tx_type]["avg_gas_used"] = stats["gas_used"] // stats["count"]
+                report[tx_type]["used_to_estimated"] = round(stats["gas_used"] / stats["gas_estimated"], 4)
+                report[tx_type]["fees_paid_wei"] = str(stats["fees_paid_wei"])
+            return report
+
+    @staticmethod
+    def _cache_key(tx):
+        # Deployments have no target, every other call is keyed by its 4-byte selector.
+        # Calls sending ether take other paths than those that do not (rent, refunds).
+        sends_value = bool(tx.get('value'))
+        if not tx.get('to'):
+            return 'constructor', sends_value
+        data = tx.get('data') or '0x'
+        if isinstance(data, (bytes, bytearray)):
+            data = '0x' + bytes(data).hex()
+        return data[:10], sends_value
@@ -0,0 +1,129 @@
+"""Sparse fieldsets for list endpoints.
+
+A FieldSet maps each response field to the SQL expression that reads it, so
+?fields=id,title,price_in_jod selects only those columns from SQLite. Responses
+without fields= keep every default field and the old placeholder strings, unless
+they are compact.
+"""
+import json
+
+
+class Field:
+    def __init__(self, name, sql, convert=None, placeholder=None):
+        self.name = name
+        self.sql = sql  # SQL expression, selected as the field name
+        self.convert = convert  # Applied to the column value, e.g. to turn storage keys into URLs
+        self.placeholder = placeholder  # Shown for NULL in full responses only, as before fields= existed
+
+
+class FieldSet:
+    """The fields one endpoint can return. The key field is always included, as the first column."""
+
+    def __init__(self, fields, key="id", optional=()):
+        self.fields = {field.name: field for field in fields}
+        self.key = key
+        self.defaults = [name for name in self.fields if name not in optional]
+
+    def select(self, fields_param, placeholders=True):
+        """Fields named in a fields= parameter, in the order given, or the defaults when it is empty.
+        Raises ValueError naming the unknown fields."""
+        if not fields_param:
+            return Selection([self.fields[name] for name in self.defaults], placeholders)
+        names = [name.strip() for name in fields_param.split(",") if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(self.fields)}")
+        names = [self.key] + [name for name in names if name != self.key]  # The key always comes first
+        return Selection([self.fields[name] for name in dict.fromkeys(names)], placeholders=False)
+
+
+class Selection:
+    def __init__(self, fields, placeholders):
+        self.fields = fields
+        self.columns = [field.name for field in fields]
+        self._converters = [(index, field.convert) for index, field in enumerate(fields) if field.convert]
+        self._placeholders = [] if not placeholders else [
+            (index, field.placeholder) for index, field in enumerate(fields) if field.placeholder is not None]
+
+    def sql(self):
+        return ", ".join(f"{field.sql} AS {field.name}" for field in self.fields)
+
+    def values(self, row):
+        """Response values of a row selected with sql(), in column order."""
+        if not self._converters and not self._placeholders:
+            return row
+        values = list(row)
+        for index, convert in self._converters:
+            values[index] = convert(values[index])
+        for index, placeholder in self._placeholders:
+            if not values[index]:
+                values[index] = placeholder
+        return values
+
+    def item(self, row):
+        return dict(zip(self.columns, self.values(row)))
+
+
+def apartment_fields(photo_url):
+    """Listing fields. photo_url(storage_key, stored_url) makes the public URL of a photo.
+    The photo subqueries refer to the apartments table by name, so it must not be aliased."""
+    def photo_urls(photos):
+        return [photo_url(*photo) for photo in json.loads(photos)]
+
+    def first_photo_url(photo):
+        return photo_url(*json.loads(photo)) if photo else None
+
+    return FieldSet([
+        Field("id", "apartments.id"),
+        Field("landlord_wallet", "landlord_wallet"),
+        Field("title", "title"),
+        Field("location", "location"),
+        Field("description", "description"),
+        Field("price_in_jod", "price_in_jod"),
+        Field("rent_amount_eth", "rent_amount_eth"),
+        Field("rent_amount_wei", "rent_amount_wei"),
+        Field("lease_duration", "lease_duration"),
+        Field("availability", "availability"),
+        Field("contract_address", "contract_address", placeholder="Not Available"),
+        Field("latitude", "latitude"),
+        Field("longitude", "longitude"),
+        # Photos as one JSON array per row, read in the same query
+        Field("photo_urls", "(SELECT json_group_array(json_array(storage_key, photo_url)) FROM ("
+                            "SELECT storage_key, photo_url FROM apartment_photos "
+                            "WHERE apartment_id = apartments.id ORDER BY id))", convert=photo_urls),
+        Field("thumbnail_url", "(SELECT json_array(storage_key, photo_url) FROM apartment_photos "
+                               "WHERE apartment_id = apartments.id ORDER BY id LIMIT 1)", convert=first_photo_url),
+    ], optional=("thumbnail_url",))
+
+
+# Contract lists read from contracts or contracts_archive as c, landlord lists joined with apartments as a
+TENANT_CONTRACT_FIELDS = FieldSet([
+    Field("id", "c.id"),
+    Field("landlord_wallet", "c.landlord_wallet"),
+    Field("apartment_id", "c.apartment_id"),
+    Field("start_date", "c.start_date", placeholder="Not Specified"),
+    Field("end_date", "c.end_date", placeholder="Not Specified"),
+    Field("next_payment_due", "c.next_payment_date", placeholder="Not Specified"),
+    Field("status", "c.status"),
+    Field("rent_amount", "c.rent_amount"),
+    Field("contract_address", "c.contract_address"),
+    Field("rent_amount_wei", "c.rent_amount_wei"),
+    Field("overdue_since", "c.overdue_since"),
+])
+
+LANDLORD_CONTRACT_FIELDS = FieldSet([
+    Field("id", "c.id"),
+    Field("tenant_wallet", "c.tenant_wallet"),
+    Field("start_date", "c.start_date"),
+    Field("end_date", "c.end_date"),
+    Field("contract_hash", "c.contract_hash"),
+    Field("apartment_id", "c.apartment_id"),
+    Field("apartment_title", "a.title"),
+    Field("contract_address", "a.contract_address"),
+    Field("status", "c.status"),
+    Field("rent_amount", "c.rent_amount"),
+    Field("lease_duration", "c.lease_duration"),
+    Field("rent_amount_wei", "c.rent_amount_wei"),
+    Field("next_payment_date", "c.next_payment_date"),
+    Field("overdue_since", "c.overdue_since"),
+])
@@ -0,0 +1,193 @@
+"""Apartment coordinates and radius search.
+
+Listings carry latitude/longitude, entered by the landlord or looked up from the
+location text in an offline gazetteer of Amman neighbourhoods. apartment_locations
+is an R*Tree of those points: a radius query reads the bounding box from it, then
+keeps the candidates whose haversine distance is within the radius.
+"""
+import math
+import re
+
+import numpy as np
+
+from db import ensure_column
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+# Approximate neighbourhood centres, (latitude, longitude)
+AMMAN_GAZETTEER = {
+    "abdali": (31.9622, 35.9100),
+    "abdoun": (31.9497, 35.8836),
+    "al balad": (31.9516, 35.9350),
+    "al jandaweel": (31.9850, 35.8330),
+    "al rabieh": (31.9795, 35.8850),
+    "al rawabi": (31.9830, 35.8700),
+    "dabouq": (31.9889, 35.8125),
+    "deir ghbar": (31.9569, 35.8480),
+    "jabal al hussein": (31.9700, 35.9180),
+    "jabal al weibdeh": (31.9590, 35.9240),
+    "jabal amman": (31.9515, 35.9239),
+    "jubeiha": (32.0225, 35.8697),
+    "khalda": (32.0000, 35.8390),
+    "marj al hamam": (31.8950, 35.8330),
+    "marka": (31.9780, 35.9950),
+    "shafa badran": (32.0480, 35.9040),
+    "shmeisani": (31.9717, 35.9006),
+    "sweifieh": (31.9561, 35.8617),
+    "tabarbour": (32.0060, 35.9380),
+    "tla al ali": (32.0014, 35.8586),
+    "um al summaq": (31.9880, 35.8550),
+    "um uthaina": (31.9640, 35.8710),
+    "wadi al seer": (31.9540, 35.8170),
+}
+
+# Other spellings seen in listings
+GAZETTEER_ALIASES = {
+    "downtown": "al balad",
+    "balad": "al balad",
+    "rabieh": "al rabieh",
+    "rawabi": "al rawabi",
+    "jandaweel": "al jandaweel",
+    "weibdeh": "jabal al weibdeh",
+    "luweibdeh": "jabal al weibdeh",
+    "swefieh": "sweifieh",
+    "sweifiyeh": "sweifieh",
+    "shmaisani": "shmeisani",
+    "dabuq": "dabouq",
+    "tlaa al ali": "tla al ali",
+    "um summaq": "um al summaq",
+    "um uthayna": "um uthaina",
+    "wadi el seer": "wadi al seer",
+}
+
+
+def _normalize(text):
+    """Lower case words, with hyphens, apostrophes and the "el"/"al" article spelling folded."""
+    words = re.sub(r"[^a-z ]+", " ", text.lower().replace("'", "")).split()
+    return " ".join("al" if word == "el" else word for word in words)
+
+
+_NAMES = {name: name for name in AMMAN_GAZETTEER}
+_NAMES.update(GAZETTEER_ALIASES)
+# Longest first, so "jabal amman" wins over a shorter name inside it
+_NAME_PATTERN = re.compile(r"\b(" + "|".join(sorted(map(re.escape, _NAMES), key=len, reverse=True)) + r")\b")
+
+
+def geocode(location):
+    """(latitude, longitude) of the first known neighbourhood named in the location text, or None."""
+    match = _NAME_PATTERN.search(_normalize(location or ""))
+    return AMMAN_GAZETTEER[_NAMES[match.group(1)]] if match else None
+
+
+def listing_coordinates(location, latitude=None, longitude=None):
+    """Coordinates for a listing: the ones given, else the gazetteer's, else (None, None).
+    Raises ValueError for coordinates that are missing a half or out of range."""
+    if latitude in (None, "") and longitude in (None, ""):
+        return geocode(location) or (None, None)
+    if latitude in (None, "") or longitude in (None, ""):
+        raise ValueError("latitude and longitude must be given together")
+    latitude, longitude = float(latitude), float(longitude)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("latitude must be within [-90, 90] and longitude within [-180, 180]")
+    return latitude, longitude
+
+
+def init_geo_index(cursor):
+    """Adds the coordinate columns and the apartment_locations R*Tree, geocodes listings
+    without coordinates and rebuilds the index."""
+    ensure_column(cursor, 'apartments', 'latitude', 'REAL')
+    ensure_column(cursor, 'apartments', 'longitude', 'REAL')
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS apartment_locations USING rtree(
+            id, -- apartments.id
+            min_lat, max_lat, -- Both the latitude
+            min_lon, max_lon -- Both the longitude
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_apartment_locations_insert AFTER INSERT ON apartments
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO apartment_locations
+            VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_apartment_locations_update AFTER UPDATE OF latitude, longitude ON apartments
+        BEGIN
+            DELETE FROM apartment_locations WHERE id = OLD.id;
+            INSERT INTO apartment_locations
+            SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_apartment_locations_delete AFTER DELETE ON apartments
+        BEGIN
+            DELETE FROM apartment_locations WHERE id = OLD.id;
+        END
+    ''')
+
+    cursor.execute('SELECT id, location FROM apartments WHERE latitude IS NULL')
+    located = [(point[0], point[1], apartment_id)
+               for apartment_id, point in ((row[0], geocode(row[1])) for row in cursor.fetchall()) if point]
+    cursor.executemany('UPDATE apartments SET latitude = ?, longitude = ? WHERE id = ?', located)
+
+    cursor.execute('DELETE FROM apartment_locations')
+    cursor.execute('''
+        INSERT INTO apartment_locations
+        SELECT id, latitude, latitude, longitude, longitude FROM apartments
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    ''')
+
+
+def bounding_box(latitude, longitude, km):
+    """(min_lat, max_lat, min_lon, max_lon) containing every point within km of the centre."""
+    dlat = km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    # Longitude degrees shrink towards the poles; take the widest row of the box
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat < 1e-9 or km / (KM_PER_DEGREE_LAT * cos_lat) >= 180:
+        return min_lat, max_lat, -180.0, 180.0
+    dlon = km / (KM_PER_DEGREE_LAT * cos_lat)
+    return min_lat, max_lat, longitude - dlon, longitude + dlon
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """Great-circle distances from one point to arrays of points."""
+    lat1, lon1 = math.radians(latitude), math.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def apartments_near(cursor, latitude, longitude, km, limit=100):
+    """[(apartment id, distance in km)] within km of the point, nearest first."""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, km)
+    boxes = [(min_lon, max_lon)]
+    # A box crossing the antimeridian is split in two
+    if min_lon < -180:
+        boxes = [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    elif max_lon > 180:
+        boxes = [(min_lon, 180.0), (-180.0, max_lon - 360)]
+
+    rows = []
+    for low, high in boxes:
+        cursor.execute('''
+            SELECT id, (min_lat + max_lat) / 2, (min_lon + max_lon) / 2 FROM apartment_locations
+            WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?
+        ''', (min_lat, max_lat, low, high))
+        rows.extend(cursor.fetchall())
+    if not rows:
+        return []
+
+    # The R*Tree keeps 32-bit floats rounded outwards, the midpoints are within a metre of the listing
+    candidates = np.array(rows, dtype=np.float64)
+    distances = haversine_km(latitude, longitude, candidates[:, 1], candidates[:, 2])
+    inside = np.flatnonzero(distances <= km)
+    if len(inside) > limit:
+        inside = inside[np.argpartition(distances[inside], limit - 1)[:limit]]
+    nearest = inside[np.argsort(distances[inside], kind="stable")]
+    return [(int(candidates[i, 0]), float(distances[i])) for i in nearest]
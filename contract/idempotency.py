@@ -0,0 +1,144 @@
+import functools
+import hashlib
+import json
+import sqlite3
+import time
+
+from flask import Response, g, jsonify, make_response, request
+
+HEADER = "Idempotency-Key"
+EXCLUDED_FIELDS = ("private_key",)  # Never stored, not even hashed
+
+
+def init_idempotency_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT NOT NULL,
+            wallet TEXT NOT NULL,
+            endpoint TEXT NOT NULL,
+            request_hash TEXT NOT NULL, -- SHA-256 of the JSON body without the private key
+            status TEXT NOT NULL CHECK(status IN ('in_progress', 'completed')),
+            response_code INTEGER,
+            response_body TEXT,
+            tx_hash TEXT, -- Last transaction broadcast for this request
+            created_at INTEGER NOT NULL,
+            expires_at INTEGER NOT NULL,
+            PRIMARY KEY (wallet, endpoint, key)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys (expires_at)')
+
+
+def request_hash(data):
+    body = {k: v for k, v in (data or {}).items() if k not in EXCLUDED_FIELDS}
+    return hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class IdempotencyStore:
+    """Remembers the outcome of requests sent with an Idempotency-Key so retries never reach the chain twice."""
+
+    def __init__(self, database_file, ttl=24 * 3600, lock_timeout=300):
+        self.database_file = database_file
+        self.ttl = ttl
+        # An in-progress key with no transaction yet is considered abandoned after this long
+        self.lock_timeout = lock_timeout
+
+    def idempotent(self, endpoint):
+        """Route decorator, applied after require_auth. Requests without the header run as before."""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                key = request.headers.get(HEADER)
+                if not key:
+                    return view(*args, **kwargs)
+                if len(key) > 255:
+                    return jsonify({"error": f"{HEADER} is too long"}), 400
+
+                scope = (key, g.user["wallet_address"].lower(), endpoint)
+                outcome, stored = self._begin(scope, request_hash(request.get_json(silent=True)))
+                if outcome == "replay":
+                    code, body = stored
+                    return Response(body, status=code, mimetype="application/json",
+                                    headers={"Idempotent-Replayed": "true"})
+                if outcome == "mismatch":
+                    return jsonify({"error": f"{HEADER} was already used for a different request"}), 422
+                if outcome == "in_progress":
+                    return jsonify({"error": "A request with this Idempotency-Key is still being processed",
+                                    "transaction_hash": stored}), 409
+
+                g.idempotency_scope = scope
+                response = make_response(view(*args, **kwargs))
+                self._finish(scope, response)
+                return response
+            return wrapper
+        return decorator
+
+    def record_transaction(self, tx_hash):
+        """Called by a view right after broadcasting, so a retry never broadcasts again."""
+        scope = g.get("idempotency_scope")
+        if not scope:
+            return
+        conn = sqlite3.connect(self.database_file)
+        conn.execute('UPDATE idempotency_keys SET tx_hash = ? WHERE key = ? AND wallet = ? AND endpoint = ?',
+                     (tx_hash, *scope))
+        conn.commit()
+        conn.close()
+
+    def purge_expired(self):
+        conn = sqlite3.connect(self.database_file)
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM idempotency_keys WHERE expires_at <= ?', (int(time.time()),))
+        purged = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return purged
+
+    def _begin(self, scope, body_hash):
+        now = int(time.time())
+        conn = sqlite3.connect(self.database_file, isolation_level=None)
+        try:
+            cursor = conn.cursor()
+            # Two concurrent retries must not both see the key as new
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                SELECT request_hash, status, response_code, response_body, tx_hash, created_at, expires_at
+                FROM idempotency_keys WHERE key = ? AND wallet = ? AND endpoint = ?
+            ''', scope)
+            row = cursor.fetchone()
+            if row and row[6] > now:
+                stored_hash, status, code, body, tx_hash, created_at, _ = row
+                if stored_hash != body_hash:
+                    cursor.execute('ROLLBACK')
+                    return "mismatch", None
+                if status == "completed":
+                    cursor.execute('ROLLBACK')
+                    return "replay", (code, body)
+                if tx_hash or created_at > now - self.lock_timeout:
+                    cursor.execute('ROLLBACK')
+                    return "in_progress", tx_hash
+
+            cursor.execute('''
+                INSERT OR REPLACE INTO idempotency_keys
+                    (key, wallet, endpoint, request_hash, status, created_at, expires_at)
+                VALUES (?, ?, ?, ?, 'in_progress', ?, ?)
+            ''', (*scope, body_hash, now, now + self.ttl))
+            cursor.execute('COMMIT')
+            return "new", None
+        finally:
+            conn.close()
+
+    def _finish(self, scope, response):
+        conn = sqlite3.connect(self.database_file)
+        cursor = conn.cursor()
+        cursor.execute('SELECT tx_hash FROM idempotency_keys WHERE key = ? AND wallet = ? AND endpoint = ?', scope)
+        row = cursor.fetchone()
+        if response.status_code >= 500 and not (row and row[0]):
+            # Nothing reached the chain, let the client retry with the same key
+            cursor.execute('DELETE FROM idempotency_keys WHERE key = ? AND wallet = ? AND endpoint = ?', scope)
+        else:
+            cursor.execute('''
+                UPDATE idempotency_keys SET status = 'completed', response_code = ?, response_body = ?
+                WHERE key = ? AND wallet = ? AND endpoint = ?
+            ''', (response.status_code, response.get_data(as_text=True), *scope))
+        conn.commit()
+        conn.close()
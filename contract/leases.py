@@ -0,0 +1,87 @@
+"""Lease periods as intervals in an R*Tree, for overlap checks and date-range availability.
+
+lease_intervals holds one box per open lease: the apartment id on one axis and the
+lease's days on the other, so "is this apartment free between these dates" is a
+single index probe. Triggers on contracts keep it current; closed leases drop out, and so
+do Pending leases the sweeper cancels once their hold lapses.
+"""
+from archive import CLOSED_STATUSES
+
+# Whole days since the julian epoch. Leases are half-open [start_date, end_date): a lease may
+# start on the day the previous one ends, so the box stores end_date - 1 as its last day.
+_DAY = 'CAST(julianday({}) AS INTEGER)'
+
+
+def _interval_sql(row, source=""):
+    """SELECT of the lease_intervals box for a contract row, empty when the lease does not hold the apartment.
+    row is NEW inside triggers; a rebuild passes the table alias and its FROM clause."""
+    return f'''
+        SELECT {row}.id, {row}.apartment_id, {row}.apartment_id,
+               {_DAY.format(row + ".start_date")}, {_DAY.format(row + ".end_date")} - 1
+        {source}
+        WHERE {row}.status NOT IN {CLOSED_STATUSES} AND julianday({row}.end_date) > julianday({row}.start_date)
+    '''
+
+
+def init_lease_index(cursor):
+    """Creates the lease_intervals R*Tree and its triggers, then rebuilds it from contracts."""
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS lease_intervals USING rtree_i32(
+            id, -- contracts.id
+            apartment_min, apartment_max, -- Both the apartment id
+            first_day, last_day -- Inclusive julian day numbers
+        )
+    ''')
+    # Recreated each time, their bodies inline CLOSED_STATUSES
+    for name in ('trg_lease_intervals_insert', 'trg_lease_intervals_update'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_lease_intervals_insert AFTER INSERT ON contracts
+        BEGIN
+            INSERT OR REPLACE INTO lease_intervals {_interval_sql("NEW")};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_lease_intervals_update
+        AFTER UPDATE OF apartment_id, start_date, end_date, status ON contracts
+        BEGIN
+            DELETE FROM lease_intervals WHERE id = OLD.id;
+            INSERT OR REPLACE INTO lease_intervals {_interval_sql("NEW")};
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_lease_intervals_delete AFTER DELETE ON contracts
+        BEGIN
+            DELETE FROM lease_intervals WHERE id = OLD.id;
+        END
+    ''')
+
+    # Lookups of an apartment's open lease, when a request names the apartment and not the contract
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contracts_apartment_status ON contracts (apartment_id, status)')
+
+    cursor.execute('DELETE FROM lease_intervals')
+    cursor.execute(f'INSERT INTO lease_intervals {_interval_sql("c", "FROM contracts c")}')
+
+
+def overlapping_leases(cursor, apartment_id, start_date, end_date):
+    """Ids of the open leases of the apartment that overlap [start_date, end_date)."""
+    cursor.execute(f'''
+        SELECT id FROM lease_intervals
+        WHERE apartment_min <= ?1 AND apartment_max >= ?1
+          AND first_day <= {_DAY.format("?3")} - 1 AND last_day >= {_DAY.format("?2")}
+    ''', (apartment_id, start_date, end_date))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def available_apartment_ids(cursor, start_date, end_date, after_id=0, limit=100):
+    """Ids of apartments with no open lease overlapping [start_date, end_date), in id order after after_id."""
+    cursor.execute(f'''
+        SELECT a.id FROM apartments a
+        WHERE a.id > ?3 AND NOT EXISTS (
+            SELECT 1 FROM lease_intervals li
+            WHERE li.apartment_min <= a.id AND li.apartment_max >= a.id
+              AND li.first_day <= {_DAY.format("?2")} - 1 AND li.last_day >= {_DAY.format("?1")}
+        )
+        ORDER BY a.id LIMIT ?4
+    ''', (start_date, end_date, after_id, limit))
+    return [row[0] for row in cursor.fetchall()]
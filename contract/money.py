@@ -0,0 +1,95 @@
+from decimal import Decimal, ROUND_HALF_UP, localcontext
+
+from db import ensure_column
+
+WEI_PER_ETH = 10**18
+
+
+def _to_decimal(amount):
+    # str() gives the shortest repr of a float, so 0.3 becomes Decimal("0.3") and not 0.2999...
+    if isinstance(amount, bool):
+        raise TypeError("Amount must be a number, not a bool.")
+    value = amount if isinstance(amount, Decimal) else Decimal(str(amount))
+    if not value.is_finite() or value < 0:
+        raise ValueError(f"Invalid amount: {amount!r}")
+    return value
+
+
+def eth_to_wei(amount_eth):
+    """Converts an ETH amount (int, float, str or Decimal) to an exact integer number of wei."""
+    with localcontext() as ctx:
+        ctx.prec = 80
+        return int((_to_decimal(amount_eth) * WEI_PER_ETH).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def jod_to_wei(price_in_jod, jod_to_eth_rate):
+    """Converts a JOD price to wei at the given JOD->ETH rate."""
+    with localcontext() as ctx:
+        ctx.prec = 80
+        eth = _to_decimal(price_in_jod) * _to_decimal(jod_to_eth_rate)
+        return int((eth * WEI_PER_ETH).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def legacy_eth_to_wei(amount_eth):
+    """The float conversion leases were deployed with before amounts were stored in wei,
+    int(float(rent) * 10**18). Matches the rentAmount those contracts hold on-chain."""
+    return int(float(amount_eth) * WEI_PER_ETH)
+
+
+def wei_to_eth(wei):
+    """Returns the exact ETH value of a wei amount as a Decimal."""
+    with localcontext() as ctx:
+        ctx.prec = 80
+        return Decimal(int(wei)) / WEI_PER_ETH
+
+
+def wei_to_db(wei):
+    """Wei amounts are stored as decimal TEXT, SQLite integers overflow above 2**63."""
+    wei = int(wei)
+    if wei < 0:
+        raise ValueError("Wei amount cannot be negative.")
+    return str(wei)
+
+
+def wei_from_db(value):
+    """Reads a wei amount stored by wei_to_db (TEXT, or BLOB holding the same digits)."""
+    if value is None:
+        raise ValueError("Wei amount is missing.")
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = bytes(value).decode('ascii')
+    if isinstance(value, str):
+        if not value.isdigit():
+            raise ValueError(f"Invalid wei amount: {value!r}")
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+        return value
+    raise TypeError(f"Wei amounts must be stored as integer text, got {type(value).__name__}.")
+
+
+def register_sql_functions(conn):
+    """Makes the exact conversions available to SQL so bulk updates stay set-based."""
+    conn.create_function("eth_to_wei", 1,
+                         lambda eth: None if eth is None else wei_to_db(eth_to_wei(eth)),
+                         deterministic=True)
+    conn.create_function("legacy_eth_to_wei", 1,
+                         lambda eth: None if eth is None else wei_to_db(legacy_eth_to_wei(eth)),
+                         deterministic=True)
+    conn.create_function("jod_to_wei", 2,
+                         lambda jod, rate: None if jod is None else wei_to_db(jod_to_wei(jod, rate)),
+                         deterministic=True)
+
+
+def migrate_money_columns(conn):
+    """Adds the *_wei columns and fills them from the legacy REAL ETH columns."""
+    register_sql_functions(conn)
+    cursor = conn.cursor()
+    ensure_column(cursor, 'apartments', 'rent_amount_wei', 'TEXT')
+    ensure_column(cursor, 'contracts', 'rent_amount_wei', 'TEXT')
+    cursor.execute('UPDATE apartments SET rent_amount_wei = eth_to_wei(rent_amount_eth) WHERE rent_amount_wei IS NULL')
+    # Deployed leases keep the amount their contract was created with, or every payment reverts "Incorrect rent."
+    cursor.execute('''
+        UPDATE contracts
+        SET rent_amount_wei = CASE WHEN contract_address IS NOT NULL THEN legacy_eth_to_wei(rent_amount)
+                                   ELSE eth_to_wei(rent_amount) END
+        WHERE rent_amount_wei IS NULL AND rent_amount IS NOT NULL
+    ''')
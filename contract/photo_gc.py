@@ -0,0 +1,107 @@
+"""Finds stored photos that no apartment references any more, and removes them.
+
+Uses the storage configured by PHOTO_STORAGE (see storage.py). Dry run first,
+then delete or quarantine the orphans:
+    python photo_gc.py --dry-run
+    python photo_gc.py --quarantine
+"""
+import argparse
+import sqlite3
+import time
+
+from db import ensure_column
+
+
+def init_photo_tables(cursor):
+    # Storage key of the photo, so references can be matched without parsing URLs
+    if ensure_column(cursor, 'apartment_photos', 'storage_key', 'TEXT'):
+        cursor.execute('''
+            UPDATE apartment_photos SET storage_key = substr(photo_url, instr(photo_url, '/uploads/') + 9)
+            WHERE storage_key IS NULL AND instr(photo_url, '/uploads/') > 0
+        ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_apartment_photos_storage_key ON apartment_photos (storage_key)')
+    # Listings read each apartment's photos by apartment id
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_apartment_photos_apartment ON apartment_photos (apartment_id, id)')
+
+
+class PhotoGarbageCollector:
+    """Streams the storage listing and checks keys against apartment_photos in batches."""
+
+    def __init__(self, database_file, storage, quarantine=False, min_age_seconds=3600, batch_size=500):
+        self.database_file = database_file
+        self.storage = storage
+        self.quarantine = quarantine  # Move orphans aside instead of deleting them
+        # Photos are stored before their row is committed, young objects may not be referenced yet
+        self.min_age_seconds = min_age_seconds
+        self.batch_size = batch_size
+
+    def run(self, dry_run=True):
+        stats = {"dry_run": dry_run, "scanned": 0, "referenced": 0, "skipped_young": 0, "orphans": 0,
+                 "deleted": 0, "quarantined": 0, "bytes_reclaimed": 0, "errors": 0}
+        cutoff = time.time() - self.min_age_seconds
+        conn = sqlite3.connect(self.database_file)
+        try:
+            batch = []
+            for key, size, mtime in self.storage.list_objects():
+                stats["scanned"] += 1
+                if mtime > cutoff:
+                    stats["skipped_young"] += 1
+                    continue
+                batch.append((key, size))
+                if len(batch) >= self.batch_size:
+                    self._collect(conn, batch, dry_run, stats)
+                    batch = []
+            if batch:
+                self._collect(conn, batch, dry_run, stats)
+        finally:
+            conn.close()
+        return stats
+
+    def _collect(self, conn, batch, dry_run, stats):
+        keys = [key for key, _ in batch]
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT DISTINCT storage_key FROM apartment_photos WHERE storage_key IN ({", ".join("?" * len(keys))})
+        ''', keys)
+        referenced = {row[0] for row in cursor.fetchall()}
+        stats["referenced"] += len(referenced)
+
+        for key, size in batch:
+            if key in referenced:
+                continue
+            stats["orphans"] += 1
+            if dry_run:
+                stats["bytes_reclaimed"] += size
+                continue
+            try:
+                if self.quarantine:
+                    self.storage.quarantine(key)
+                    stats["quarantined"] += 1
+                else:
+                    self.storage.delete(key)
+                    stats["deleted"] += 1
+                stats["bytes_reclaimed"] += size
+            except Exception:
+                stats["errors"] += 1
+
+
+def main():
+    from dotenv import load_dotenv
+    from storage import storage_from_env
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="rental_agreement.db")
+    parser.add_argument("--quarantine", action="store_true", help="move orphans aside instead of deleting them")
+    parser.add_argument("--min-age", type=int, default=3600, help="ignore objects younger than this many seconds")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be removed")
+    args = parser.parse_args()
+
+    load_dotenv()
+    collector = PhotoGarbageCollector(args.database, storage_from_env(), quarantine=args.quarantine,
+                                      min_age_seconds=args.min_age, batch_size=args.batch_size)
+    print(collector.run(dry_run=args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
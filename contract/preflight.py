@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from eth_abi import decode
+from web3 import Web3
+from web3.exceptions import ContractLogicError
+
+logger = logging.getLogger(__name__)
+
+ERROR_STRING_SELECTOR = "0x08c379a0"  # Error(string), raised by require/revert with a message
+PANIC_SELECTOR = "0x4e487b71"  # Panic(uint256), raised by asserts, overflows and division by zero
+
+
+class TransactionReverted(Exception):
+    def __init__(self, reason, error_name=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.error_name = error_name  # Custom error name when the contract uses them
+
+
+def error_selectors(*abis):
+    """Maps the 4-byte selector of every custom error in the ABIs to (name, input types)."""
+    selectors = {}
+    for abi in abis:
+        for entry in abi:
+            if entry.get("type") != "error":
+                continue
+            types = [item["type"] for item in entry.get("inputs", [])]
+            signature = f"{entry['name']}({','.join(types)})"
+            selectors[Web3.keccak(text=signature)[:4].hex().removeprefix("0x")] = (entry["name"], types)
+    return selectors
+
+
+def decode_revert(data, selectors):
+    """Returns (reason, error name) from revert data, or (None, None) if there is nothing to decode."""
+    if isinstance(data, (bytes, bytearray)):
+        data = "0x" + bytes(data).hex()
+    if not isinstance(data, str) or len(data) < 10:
+        return None, None
+    selector, payload = data[:10].lower(), bytes.fromhex(data[10:])
+    if selector == ERROR_STRING_SELECTOR:
+        return decode(["string"], payload)[0], None
+    if selector == PANIC_SELECTOR:
+        return f"Panic(0x{decode(['uint256'], payload)[0]:02x})", "Panic"
+    if selector[2:] in selectors:
+        name, types = selectors[selector[2:]]
+        args = decode(types, payload) if types else ()
+        return f"{name}({', '.join(str(arg) for arg in args)})" if args else name, name
+    return None, None
+
+
+class Preflight:
+    """Simulates transactions with eth_call against the pending block before they are signed and sent.
+
+    A transaction that would revert fails with TransactionReverted and its decoded reason
+    instead of costing gas and a block wait. Results are cached briefly per
+    (from, to, data, value), so client retries do not repeat the simulation.
+    """
+
+    def __init__(self, web3, *abis, cache_ttl=3, cache_size=1000):
+        self.web3 = web3
+        self.selectors = error_selectors(*abis)
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # call key -> (reason or None, error name, expires_at)
+        self._stats = {"simulations": 0, "cache_hits": 0, "passed": 0, "reverts_avoided": 0,
+                       "simulation_errors": 0, "reverts_by_type": {}, "reverts_by_reason": {}}
+
+    def check(self, tx, tx_type=None):
+        """Raises TransactionReverted if the transaction would revert. Passes if the node cannot simulate it."""
+        call = {key: tx[key] for key in ('from', 'to', 'data', 'value') if tx.get(key) is not None}
+        key = (call.get('from'), call.get('to'), call.get('data'), call.get('value'))
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[2] > now:
+                self._stats["cache_hits"] += 1
+                self._cache.move_to_end(key)
+                reason, error_name = cached[0], cached[1]
+            else:
+                cached = None
+
+        if cached is None:
+            reason, error_name = self._simulate(call)
+            if reason is False:
+                return  # Simulation unavailable, the transaction goes out as before
+            with self._lock:
+                self._cache[key] = (reason, error_name, now + self.cache_ttl)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        if reason is None:
+            with self._lock:
+                self._stats["passed"] += 1
+            return
+        with self._lock:
+            self._stats["reverts_avoided"] += 1
+            by_type = self._stats["reverts_by_type"]
+            by_type[tx_type or "unknown"] = by_type.get(tx_type or "unknown", 0) + 1
+            by_reason = self._stats["reverts_by_reason"]
+            by_reason[reason] = by_reason.get(reason, 0) + 1
+        raise TransactionReverted(reason, error_name)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, cached=len(self._cache))
+            stats["reverts_by_type"] = dict(self._stats["reverts_by_type"])
+            stats["reverts_by_reason"] = dict(self._stats["reverts_by_reason"])
+            return stats
+
+    def _simulate(self, call):
+        """Returns (None, None) if the call succeeds, (reason, error name) if it reverts, (False, None) on RPC errors."""
+        with self._lock:
+            self._stats["simulations"] += 1
+        try:
+            self.web3.eth.call(call, 'pending')
+            return None, None
+        except ContractLogicError as e:
+            reason, error_name = decode_revert(getattr(e, 'data', None), self.selectors)
+            if reason is None:
+                reason = str(getattr(e, 'message', None) or e).removeprefix("execution reverted: ")
+            return reason or "execution reverted", error_name
+        except Exception as e:
+            with self._lock:
+                self._stats["simulation_errors"] += 1
+            logger.warning("Pre-flight simulation unavailable: %s", e)
+            return False, None
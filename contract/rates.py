@@ -0,0 +1,119 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from money import register_sql_functions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOD_TO_ETH_RATE = 0.001  # Used only to seed an empty rate history
+
+
+def init_rate_tables(cursor):
+    # Every rate ever applied, newest row is the current rate
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jod_eth_rates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            rate REAL NOT NULL CHECK(rate > 0), -- ETH per 1 JOD
+            source TEXT NOT NULL, -- 'default', 'admin:<wallet>' or 'file:<path>'
+            created_at TEXT NOT NULL
+        )
+    ''')
+
+
+class RateProvider:
+    """Holds the current JOD->ETH rate in memory and reprices listings when it changes."""
+
+    def __init__(self, database_file, rate_file=None, default_rate=DEFAULT_JOD_TO_ETH_RATE, check_interval=30):
+        self.database_file = database_file
+        self.rate_file = rate_file  # Optional file containing a single number, e.g. "0.0014"
+        self.default_rate = default_rate
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._rate = None
+        self._rate_file_mtime = None
+        self._next_file_check = 0.0
+
+    def load(self):
+        """Loads the latest rate from history, seeding it on first run."""
+        conn = sqlite3.connect(self.database_file)
+        cursor = conn.cursor()
+        cursor.execute('SELECT rate FROM jod_eth_rates ORDER BY id DESC LIMIT 1')
+        row = cursor.fetchone()
+        conn.close()
+
+        if row:
+            self._rate = row[0]
+        else:
+            self.set_rate(self.default_rate, 'default')
+        self._check_rate_file(force=True)
+
+    def get_rate(self):
+        """Returns the cached rate; the rate file is re-checked at most every check_interval seconds."""
+        self._check_rate_file()
+        return self._rate
+
+    def set_rate(self, rate, source):
+        """Records a new rate and reprices all apartments in one statement. Returns the repriced row count."""
+        rate = float(rate)
+        if rate <= 0:
+            raise ValueError("Rate must be a positive number.")
+
+        with self._lock:
+            conn = sqlite3.connect(self.database_file)
+            register_sql_functions(conn)
+            try:
+                cursor = conn.cursor()
+                cursor.execute('INSERT INTO jod_eth_rates (rate, source, created_at) VALUES (?, ?, ?)',
+                               (rate, source, datetime.utcnow().isoformat(timespec='seconds')))
+                cursor.execute('''
+                    UPDATE apartments
+                    SET rent_amount_eth = price_in_jod * ?, rent_amount_wei = jod_to_wei(price_in_jod, ?)
+                ''', (rate, rate))
+                repriced = cursor.rowcount
+                conn.commit()
+            finally:
+                conn.close()
+            self._rate = rate
+
+        logger.info("JOD->ETH rate set to %s from %s, %d apartments repriced", rate, source, repriced)
+        return repriced
+
+    def history(self, limit=50):
+        conn = sqlite3.connect(self.database_file)
+        cursor = conn.cursor()
+        cursor.execute('SELECT rate, source, created_at FROM jod_eth_rates ORDER BY id DESC LIMIT ?', (limit,))
+        rows = cursor.fetchall()
+        conn.close()
+        return [{"jod_to_eth": row[0], "source": row[1], "created_at": row[2]} for row in rows]
+
+    def _check_rate_file(self, force=False):
+        if not self.rate_file:
+            return
+
+        now = time.monotonic()
+        if not force and now < self._next_file_check:
+            return
+
+        with self._lock:
+            self._next_file_check = now + self.check_interval
+            try:
+                mtime = os.stat(self.rate_file).st_mtime
+            except FileNotFoundError:
+                return
+            if mtime == self._rate_file_mtime:
+                return
+            self._rate_file_mtime = mtime
+
+            try:
+                with open(self.rate_file) as rate_file:
+                    rate = float(rate_file.read().strip())
+            except (OSError, ValueError) as e:
+                logger.error("Ignoring unreadable rate file %s: %s", self.rate_file, e)
+                return
+
+            if rate != self._rate:
+                self.set_rate(rate, f"file:{self.rate_file}")
@@ -0,0 +1,223 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from web3._utils.method_formatters import receipt_formatter
+from web3.datastructures import AttributeDict
+
+logger = logging.getLogger(__name__)
+
+
+class ReceiptTimeout(Exception):
+    pass
+
+
+class TransactionDropped(Exception):
+    pass
+
+
+class _Pending:
+    def __init__(self, now):
+        self.futures = []
+        self.submitted_at = now
+        self.fetched = False  # Looked up at least once since it was submitted
+        self.dropped_checked_at = now
+
+
+def _in_request_order(responses, count):
+    """A batch's responses in request order, or None when they cannot be paired with the requests.
+
+    Servers may answer a batch in any order. The provider numbers a batch's requests with
+    increasing ids, so sorting by id restores the order once every request has exactly one answer.
+    """
+    if not isinstance(responses, list) or len(responses) != count:
+        return None
+    ids = [response.get("id") if isinstance(response, dict) else None for response in responses]
+    if not all(isinstance(response_id, int) for response_id in ids) or len(set(ids)) != count:
+        return None
+    return sorted(responses, key=lambda response: response["id"])
+
+
+class ReceiptWaiter:
+    """Waits for transaction receipts for every request thread from one background thread.
+
+    The thread follows the chain head and, once per new block, fetches the receipts of all
+    pending transactions in a single JSON-RPC batch. RPC traffic grows with blocks, not
+    with the number of threads waiting. Transactions the node no longer knows about after
+    dropped_after seconds fail with TransactionDropped instead of waiting for the timeout;
+    each unmined transaction is looked up at most once per dropped_after seconds.
+    """
+
+    def __init__(self, web3, poll_interval=1.0, timeout=120, dropped_after=60, batch_size=500):
+        self.web3 = web3
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.dropped_after = dropped_after
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pending = {}  # tx hash -> _Pending
+        self._last_block = None
+        self._stats = {"submitted": 0, "mined": 0, "timeouts": 0, "dropped": 0, "blocks_seen": 0,
+                       "rpc_block_number": 0, "rpc_receipt_batches": 0, "rpc_receipts_requested": 0,
+                       "rpc_transaction_lookups": 0, "rpc_errors": 0}
+
+    def submit(self, tx_hash):
+        """Returns a Future resolved with the receipt, or with TransactionDropped."""
+        tx_hash = self._normalize(tx_hash)
+        future = Future()
+        with self._lock:
+            entry = self._pending.get(tx_hash)
+            if entry is None:
+                entry = self._pending[tx_hash] = _Pending(time.monotonic())
+            entry.futures.append(future)
+            self._stats["submitted"] += 1
+            if not (self._thread and self._thread.is_alive()):
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="receipt-waiter", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return future
+
+    def wait(self, tx_hash, timeout=None):
+        """Drop-in replacement for web3.eth.wait_for_transaction_receipt."""
+        return self.result(tx_hash, self.submit(tx_hash), timeout)
+
+    def wait_all(self, tx_hashes, timeout=None):
+        """Waits for several transactions at once. Failures are returned in place of their receipt."""
+        futures = [(tx_hash, self.submit(tx_hash)) for tx_hash in tx_hashes]
+        deadline = time.monotonic() + (timeout or self.timeout)
+        results = []
+        for tx_hash, future in futures:
+            try:
+                results.append(self.result(tx_hash, future, max(deadline - time.monotonic(), 0)))
+            except (ReceiptTimeout, TransactionDropped) as e:
+                results.append(e)
+        return results
+
+    def result(self, tx_hash, future, timeout=None):
+        try:
+            return future.result(timeout if timeout is not None else self.timeout)
+        except FutureTimeoutError:
+            self._forget(self._normalize(tx_hash), future)
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise ReceiptTimeout(f"Transaction {self._normalize(tx_hash)} was not mined in time")
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending), last_block=self._last_block)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            with self._lock:
+                idle = not self._pending
+            if idle:
+                # Nothing to follow, no RPC calls until the next submit
+                self._wakeup.wait()
+                continue
+            try:
+                self._poll()
+            except Exception:
+                with self._lock:
+                    self._stats["rpc_errors"] += 1
+                logger.exception("Receipt poll failed")
+            self._stop.wait(self.poll_interval)
+
+    def _poll(self):
+        block = self.web3.eth.block_number
+        with self._lock:
+            self._stats["rpc_block_number"] += 1
+            new_block = block != self._last_block
+            if new_block:
+                self._stats["blocks_seen"] += 1
+                self._last_block = block
+            # Everything on a new block; otherwise only hashes submitted since the last look
+            hashes = [tx_hash for tx_hash, entry in self._pending.items() if new_block or not entry.fetched]
+
+        for start in range(0, len(hashes), self.batch_size):
+            chunk = hashes[start:start + self.batch_size]
+            responses = self.web3.provider.make_batch_request(
+                [("eth_getTransactionReceipt", [tx_hash]) for tx_hash in chunk]
+            )
+            with self._lock:
+                self._stats["rpc_receipt_batches"] += 1
+                self._stats["rpc_receipts_requested"] += len(chunk)
+            # A receipt names its transaction, so answers are matched by hash whatever their order
+            requested = set(chunk)
+            for response in responses:
+                raw = response.get("result") if isinstance(response, dict) else None
+                tx_hash = self._normalize(raw["transactionHash"]) if raw and raw.get("transactionHash") else None
+                if tx_hash in requested:
+                    self._resolve(tx_hash, receipt=AttributeDict.recursive(receipt_formatter(raw)))
+                elif not raw and isinstance(response, dict) and response.get("error"):
+                    with self._lock:
+                        self._stats["rpc_errors"] += 1
+
+        now = time.monotonic()
+        looked_up = set(hashes)
+        with self._lock:
+            stale = []
+            for tx_hash, entry in self._pending.items():
+                if tx_hash in looked_up:
+                    entry.fetched = True
+                if entry.fetched and now - entry.dropped_checked_at >= self.dropped_after:
+                    entry.dropped_checked_at = now
+                    stale.append(tx_hash)
+        if stale:
+            self._check_dropped(stale)
+
+    def _check_dropped(self, hashes):
+        # A transaction the node no longer has in its pool or chain will never be mined
+        for start in range(0, len(hashes), self.batch_size):
+            chunk = hashes[start:start + self.batch_size]
+            responses = self.web3.provider.make_batch_request(
+                [("eth_getTransactionByHash", [tx_hash]) for tx_hash in chunk]
+            )
+            with self._lock:
+                self._stats["rpc_transaction_lookups"] += len(chunk)
+            # An unknown transaction comes back as a bare null, only its id says which one it is
+            ordered = _in_request_order(responses, len(chunk))
+            if ordered is None or any(
+                    response.get("result") and self._normalize(response["result"].get("hash") or "") != tx_hash
+                    for tx_hash, response in zip(chunk, ordered)):
+                with self._lock:
+                    self._stats["rpc_errors"] += 1
+                continue  # Nothing is declared dropped from a batch that cannot be paired, checked again later
+            for tx_hash, response in zip(chunk, ordered):
+                if "result" in response and response["result"] is None:
+                    self._resolve(tx_hash, error=TransactionDropped(f"Transaction {tx_hash} was dropped by the node"))
+
+    def _resolve(self, tx_hash, receipt=None, error=None):
+        with self._lock:
+            entry = self._pending.pop(tx_hash, None)
+            if entry is None:
+                return
+            self._stats["dropped" if error else "mined"] += 1
+        for future in entry.futures:
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(receipt)
+
+    def _forget(self, tx_hash, future):
+        with self._lock:
+            entry = self._pending.get(tx_hash)
+            if entry and future in entry.futures:
+                entry.futures.remove(future)
+                if not entry.futures:
+                    del self._pending[tx_hash]
+
+    @staticmethod
+    def _normalize(tx_hash):
+        if isinstance(tx_hash, (bytes, bytearray)):
+            return '0x' + bytes(tx_hash).hex()
+        return tx_hash.lower() if tx_hash.startswith('0x') else '0x' + tx_hash.lower()
@@ -0,0 +1,383 @@
+"""Unsigned transaction templates and the relay that broadcasts them once the client has signed them.
+
+Without a private_key in the request body, /contracts/sign, /contracts/pay and
+/contracts/terminate answer with a template instead of signing on the server. The
+client signs it locally and posts the raw transaction to /tx/relay, which checks it
+against the template, broadcasts it and applies the action's effect once it is mined.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+import rlp
+from eth_account import Account
+from web3 import Web3
+
+from scheduler import record_rent_paid
+
+logger = logging.getLogger(__name__)
+
+# Fields of the unsigned transaction handed to the client, numbers as 0x-hex like a wallet expects
+TEMPLATE_FIELDS = ("from", "to", "data", "value", "nonce", "gas", "chainId", "maxFeePerGas",
+                   "maxPriorityFeePerGas", "gasPrice")
+
+# At most one of these may wait to be signed or mined per lease, or the rent could be paid twice
+PAYMENT_ACTIONS = ('pay', 'pay_months')
+
+
+class RelayError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def init_relay_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tx_templates (
+            id TEXT PRIMARY KEY,
+            wallet TEXT NOT NULL,
+            action TEXT NOT NULL, -- Effect handler applied once the transaction is mined
+            contract_id INTEGER NOT NULL,
+            to_address TEXT, -- NULL for deployments
+            data TEXT NOT NULL,
+            value TEXT NOT NULL, -- Wei as text, may exceed SQLite integers
+            chain_id INTEGER NOT NULL,
+            params TEXT, -- JSON passed to the effect handler
+            status TEXT NOT NULL CHECK(status IN ('issued', 'sent', 'confirmed', 'failed')),
+            tx_hash TEXT,
+            result TEXT, -- JSON of what the effect changed, or the failure
+            created_at INTEGER NOT NULL,
+            expires_at INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tx_templates_expires ON tx_templates (expires_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tx_templates_contract ON tx_templates (contract_id, status)')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tx_templates_sent ON tx_templates (id) WHERE status = 'sent'")
+
+
+def predict_contract_address(sender, nonce):
+    """Address a deployment from sender with this nonce will get: keccak(rlp([sender, nonce]))[12:]."""
+    encoded = rlp.encode([bytes.fromhex(sender[2:]), nonce])
+    return Web3.to_checksum_address(Web3.keccak(encoded)[12:])
+
+
+def decode_raw_transaction(raw_transaction):
+    """Returns sender, to, data, value, nonce, gas and chain id of a signed legacy, EIP-2930 or EIP-1559 transaction."""
+    raw = bytes(raw_transaction)
+    if raw and raw[0] in (1, 2):
+        fields = rlp.decode(raw[1:])
+        if raw[0] == 2:
+            chain_id, nonce, _, _, gas, to, value, data = fields[:8]
+        else:
+            chain_id, nonce, _, gas, to, value, data = fields[:7]
+        chain_id = int.from_bytes(chain_id, 'big')
+    elif raw and raw[0] >= 0xc0:
+        nonce, _, gas, to, value, data, v = rlp.decode(raw)[:7]
+        v = int.from_bytes(v, 'big')
+        chain_id = (v - 35) // 2 if v >= 35 else None  # Pre-EIP-155 signatures carry no chain id
+    else:
+        raise RelayError("Unsupported transaction type")
+    return {
+        "from": Account.recover_transaction(raw),
+        "to": Web3.to_checksum_address(to) if to else None,
+        "data": Web3.to_hex(data),
+        "value": int.from_bytes(value, 'big'),
+        "nonce": int.from_bytes(nonce, 'big'),
+        "gas": int.from_bytes(gas, 'big'),
+        "chainId": chain_id
+    }
+
+
+# Effect handlers, one per action: database changes once the transaction is mined.
+# Each returns (event type, changes) and runs inside the caller's transaction.
+
+def _deployed(cursor, contract_id, receipt, params):
+    cursor.execute('UPDATE contracts SET contract_address = ? WHERE id = ?', (receipt['contractAddress'], contract_id))
+    return 'contract.status', {"contract_address": receipt['contractAddress']}
+
+
+def _landlord_signed(cursor, contract_id, receipt, params):
+    # The registry, or the lease's own contract, is the transaction's target
+    cursor.execute('''
+        UPDATE contracts SET contract_address = ?, status = 'Landlord Signed' WHERE id = ?
+    ''', (receipt['to'], contract_id))
+    return 'contract.status', {"contract_address": receipt['to'], "new_status": 'Landlord Signed'}
+
+
+def _tenant_signed(cursor, contract_id, receipt, params):
+    cursor.execute("UPDATE contracts SET status = 'Active' WHERE id = ?", (contract_id,))
+    cursor.execute('''
+        UPDATE apartments SET availability = 'Unavailable'
+        WHERE id = (SELECT apartment_id FROM contracts WHERE id = ?)
+    ''', (contract_id,))
+    return 'contract.status', {"new_status": 'Active'}
+
+
+def _rent_paid(cursor, contract_id, receipt, params):
+    months = params.get("months", 1)
+    amount_wei = int(params["amount_wei"])
+    next_payment_date = record_rent_paid(cursor, contract_id, periods=months,
+                                         tx_hash=Web3.to_hex(receipt['transactionHash']), amount_wei=amount_wei)
+    return 'payment.confirmed', {"months": months, "amount_wei": str(amount_wei),
+                                 "next_payment_date": next_payment_date}
+
+
+def _terminated(cursor, contract_id, receipt, params):
+    cursor.execute("UPDATE contracts SET status = 'Terminated' WHERE id = ?", (contract_id,))
+    return 'contract.terminated', {"new_status": 'Terminated'}
+
+
+EFFECTS = {
+    'deploy': _deployed,
+    'landlord_sign': _landlord_signed,
+    'registry_create': _landlord_signed,
+    'tenant_sign': _tenant_signed,
+    'pay': _rent_paid,
+    'pay_months': _rent_paid,
+    'terminate': _terminated,
+}
+
+
+def apply_effect(cursor, action, contract_id, receipt, params=None):
+    return EFFECTS[action](cursor, contract_id, receipt, params or {})
+
+
+class TransactionRelay:
+    """Issues unsigned transaction templates and relays the client-signed result."""
+
+    def __init__(self, database_file, web3, receipt_waiter, fee_strategy, ttl=600, sent_timeout=86400,
+                 on_confirmed=None):
+        self.database_file = database_file
+        self.web3 = web3
+        self.receipt_waiter = receipt_waiter
+        self.fee_strategy = fee_strategy
+        self.ttl = ttl  # The nonce and fees in a template go stale, so templates expire
+        self.sent_timeout = sent_timeout  # Relayed transactions without a receipt this long after expiry are failed
+        self.on_confirmed = on_confirmed  # on_confirmed(cursor, event type, contract id, tx hash) after commit
+        self._lock = threading.Lock()
+        self._watching = set()  # tx hashes this process waits for
+
+    def issue(self, wallet, action, contract_id, tx, params=None):
+        """Stores the built transaction and returns the template for the client to sign.
+
+        Raises RelayError if a payment for the lease is still waiting to be signed or mined.
+        """
+        template_id = uuid.uuid4().hex
+        now = int(time.time())
+        data = tx.get('data') or '0x'
+        if isinstance(data, (bytes, bytearray)):
+            data = Web3.to_hex(data)
+        # The check and the insert run in one write transaction, so two requests cannot both pass the check
+        conn = sqlite3.connect(self.database_file, isolation_level=None)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            if action in PAYMENT_ACTIONS:
+                cursor.execute('''
+                    SELECT 1 FROM tx_templates
+                    WHERE contract_id = ? AND action IN ('pay', 'pay_months')
+                      AND (status = 'sent' OR (status = 'issued' AND expires_at > ?))
+                    LIMIT 1
+                ''', (contract_id, now))
+                if cursor.fetchone():
+                    raise RelayError("A payment for this lease is already waiting to be signed or mined", 409)
+            cursor.execute('''
+                INSERT INTO tx_templates (id, wallet, action, contract_id, to_address, data, value, chain_id, params,
+                                          status, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'issued', ?, ?)
+            ''', (template_id, wallet.lower(), action, contract_id, tx.get('to'), data.lower(),
+                  str(tx.get('value', 0)), tx['chainId'], json.dumps(params or {}), now, now + self.ttl))
+            cursor.execute('COMMIT')
+        finally:
+            conn.close()  # Rolls back if the check failed
+
+        transaction = {key: tx[key] for key in TEMPLATE_FIELDS if tx.get(key) is not None}
+        for key, value in transaction.items():
+            if isinstance(value, int):
+                transaction[key] = hex(value)
+        transaction['data'] = data
+        template = {"template_id": template_id, "action": action, "transaction": transaction,
+                    "expires_at": now + self.ttl}
+        if not tx.get('to'):
+            template["contract_address"] = predict_contract_address(tx['from'], tx['nonce'])
+        return template
+
+    def relay(self, wallet, template_id, raw_transaction):
+        """Checks a signed transaction against its template and broadcasts it. Returns (template, future).
+
+        The future resolves with the effect's changes once the transaction is mined.
+        """
+        conn = sqlite3.connect(self.database_file)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT wallet, action, contract_id, to_address, data, value, chain_id, params, status, tx_hash,
+                       result, expires_at
+                FROM tx_templates WHERE id = ?
+            ''', (template_id,))
+            row = cursor.fetchone()
+            if not row or row[0] != wallet.lower():
+                raise RelayError("Unknown transaction template", 404)
+            (template_wallet, action, contract_id, to_address, data, value, chain_id, params, status, sent_hash,
+             result, expires_at) = row
+            template = {"template_id": template_id, "action": action, "contract_id": contract_id}
+
+            try:
+                raw = Web3.to_bytes(hexstr=raw_transaction)
+                tx = decode_raw_transaction(raw)
+            except RelayError:
+                raise
+            except Exception:
+                raise RelayError("raw_transaction is not a signed transaction")
+            tx_hash = Web3.to_hex(Web3.keccak(raw))
+
+            if status != 'issued':
+                # A retry of the same signed transaction reports where it is; anything else is a second use
+                if tx_hash != sent_hash:
+                    raise RelayError("This template was already used", 409)
+                return dict(template, status=status, transaction_hash=tx_hash,
+                            result=json.loads(result) if result else None), None
+            if expires_at <= time.time():
+                raise RelayError("This template has expired, request a new one", 410)
+
+            # The client may re-sign with other gas or fees, but not change who calls what
+            if tx["from"].lower() != template_wallet:
+                raise RelayError("Transaction is not signed by the signed-in wallet", 403)
+            if (tx["to"] or None) != (to_address or None) or tx["chainId"] != chain_id:
+                raise RelayError("Transaction target does not match the template")
+            if tx["data"].lower() != data or str(tx["value"]) != value:
+                raise RelayError("Transaction call or value does not match the template")
+
+            # Claim the template before broadcasting so a concurrent relay cannot send it twice
+            cursor.execute('''
+                UPDATE tx_templates SET status = 'sent', tx_hash = ? WHERE id = ? AND status = 'issued'
+            ''', (tx_hash, template_id))
+            if cursor.rowcount != 1:
+                raise RelayError("This template was already used", 409)
+            conn.commit()
+        finally:
+            conn.close()
+
+        try:
+            self.web3.eth.send_raw_transaction(raw)
+        except Exception as e:
+            self._set_status(template_id, 'issued', tx_hash=None)  # Nothing was sent, the template can be reused
+            raise RelayError(f"Node rejected the transaction: {e}")
+
+        confirmed = Future()
+        self._watch(template, json.loads(params or '{}'), tx, tx_hash, confirmed)
+        return dict(template, status='sent', transaction_hash=tx_hash), confirmed
+
+    def resume_sent(self):
+        """Waits again for relayed transactions that are not confirmed yet, e.g. after a restart. Returns how many."""
+        conn = sqlite3.connect(self.database_file)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, action, contract_id, params, tx_hash FROM tx_templates WHERE status = 'sent'")
+        rows = cursor.fetchall()
+        conn.close()
+        resumed = 0
+        for template_id, action, contract_id, params, tx_hash in rows:
+            template = {"template_id": template_id, "action": action, "contract_id": contract_id}
+            if self._watch(template, json.loads(params or '{}'), None, tx_hash, Future()):
+                resumed += 1
+        return resumed
+
+    def status(self, wallet, template_id):
+        conn = sqlite3.connect(self.database_file)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT action, contract_id, status, tx_hash, result, expires_at FROM tx_templates
+            WHERE id = ? AND wallet = ?
+        ''', (template_id, wallet.lower()))
+        row = cursor.fetchone()
+        conn.close()
+        if not row:
+            raise RelayError("Unknown transaction template", 404)
+        action, contract_id, status, tx_hash, result, expires_at = row
+        return {"template_id": template_id, "action": action, "contract_id": contract_id, "status": status,
+                "transaction_hash": tx_hash, "result": json.loads(result) if result else None,
+                "expires_at": expires_at}
+
+    def purge_expired(self):
+        """Removes templates that expired unused or finished more than a TTL ago.
+
+        Relayed transactions still without a receipt sent_timeout after their template expired
+        are marked failed first, so they are removed on a later run.
+        """
+        now = int(time.time())
+        conn = sqlite3.connect(self.database_file)
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE tx_templates SET status = 'failed', result = ? WHERE status = 'sent' AND expires_at <= ?
+        ''', (json.dumps({"error": "No receipt for the relayed transaction"}), now - self.sent_timeout))
+        if cursor.rowcount:
+            logger.warning("Gave up on %d relayed transactions without a receipt", cursor.rowcount)
+        cursor.execute('''
+            DELETE FROM tx_templates WHERE expires_at <= ? AND status IN ('issued', 'confirmed', 'failed')
+        ''', (now - self.ttl,))
+        purged = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return purged
+
+    def _watch(self, template, params, tx, tx_hash, confirmed):
+        """Has the receipt waiter confirm tx_hash, unless this process already waits for it."""
+        with self._lock:
+            if tx_hash in self._watching:
+                return False
+            self._watching.add(tx_hash)
+        sent = self.receipt_waiter.submit(tx_hash)
+        sent.add_done_callback(lambda future: self._confirm(template, params, tx, tx_hash, future, confirmed))
+        return True
+
+    def _confirm(self, template, params, tx, tx_hash, receipt_future, confirmed):
+        # Runs on the receipt waiter's thread once the transaction is mined or dropped
+        try:
+            receipt = receipt_future.result()
+            if tx:  # Not known for transactions resumed after a restart
+                self.fee_strategy.record(template["action"], tx, receipt)
+            if receipt['status'] != 1:
+                raise RelayError("Transaction failed on the blockchain.", 502)
+
+            conn = sqlite3.connect(self.database_file)
+            try:
+                cursor = conn.cursor()
+                # Only the first confirmation applies the effect, another process may have confirmed it already
+                cursor.execute("UPDATE tx_templates SET status = 'confirmed' WHERE id = ? AND status = 'sent'",
+                               (template["template_id"],))
+                if cursor.rowcount != 1:
+                    cursor.execute('SELECT result FROM tx_templates WHERE id = ?', (template["template_id"],))
+                    row = cursor.fetchone()
+                    confirmed.set_result(json.loads(row[0]) if row and row[0] else {})
+                    return
+                event_type, changes = apply_effect(cursor, template["action"], template["contract_id"], receipt,
+                                                   params)
+                cursor.execute('UPDATE tx_templates SET result = ? WHERE id = ?',
+                               (json.dumps(changes), template["template_id"]))
+                conn.commit()
+                if self.on_confirmed:
+                    self.on_confirmed(cursor, event_type, template["contract_id"],
+                                      Web3.to_hex(receipt['transactionHash']))
+            finally:
+                conn.close()
+            confirmed.set_result(changes)
+        except Exception as e:
+            logger.warning("Relayed %s for contract %s failed: %s", template["action"], template["contract_id"], e)
+            self._set_status(template["template_id"], 'failed', result=json.dumps({"error": str(e)}))
+            confirmed.set_exception(e)
+        finally:
+            with self._lock:
+                self._watching.discard(tx_hash)
+
+    def _set_status(self, template_id, status, **columns):
+        """Moves a sent template on; templates already confirmed or failed keep their status."""
+        assignments = "".join(f", {column} = ?" for column in columns)
+        conn = sqlite3.connect(self.database_file)
+        conn.execute(f"UPDATE tx_templates SET status = ?{assignments} WHERE id = ? AND status = 'sent'",
+                     (status, *columns.values(), template_id))
+        conn.commit()
+        conn.close()
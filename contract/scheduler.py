@@ -0,0 +1,282 @@
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from db import ensure_column
+from receipts import ReceiptWaiter
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_PERIOD_DAYS = 30  # Matches the 30 day month used by RentalAgreement.sol
+PAYMENT_PERIOD_SECONDS = PAYMENT_PERIOD_DAYS * 24 * 3600
+
+# RentalAgreement.ContractState values
+STATE_ACTIVE = 1
+STATE_COMPLETED = 2
+STATE_TERMINATED = 3
+
+# How long an unsigned lease holds its dates before the sweeper cancels it
+PENDING_HOLD_HOURS = 48
+
+
+def init_schedule_tables(cursor):
+    ensure_column(cursor, 'contracts', 'overdue_since', 'TEXT')  # Due date that was missed, NULL when up to date
+
+    # The sweeper reads active contracts by due date, and by completes_at below; nothing reads them by end date
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contracts_status_next_payment ON contracts (status, next_payment_date)')
+    cursor.execute('DROP INDEX IF EXISTS idx_contracts_status_end_date')
+
+    # The contract completes leaseDuration 30-day months after the tenant signed, not on end_date.
+    # That time is read from the chain once per active lease and the sweep scans it by index.
+    ensure_column(cursor, 'contracts', 'completes_at', 'INTEGER')  # Unix time the lease elapses on-chain
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contracts_status_completes_at ON contracts (status, completes_at)')
+
+    # A Pending lease holds its dates until hold_until, then the sweeper cancels it, so a lease
+    # request nobody signs cannot keep an apartment booked. Older leases get a full hold from now.
+    ensure_column(cursor, 'contracts', 'hold_until', 'TEXT')  # UTC YYYY-MM-DDTHH:MM:SSZ
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_contracts_pending_hold ON contracts (hold_until) "
+                   "WHERE status = 'Pending'")
+    cursor.execute(f'''
+        UPDATE contracts SET hold_until = strftime('%Y-%m-%dT%H:%M:%SZ', 'now', '+{PENDING_HOLD_HOURS} hours')
+        WHERE status = 'Pending' AND hold_until IS NULL
+    ''')
+
+    # One row per rent transaction, which may cover several months
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            contract_id INTEGER NOT NULL,
+            tx_hash TEXT,
+            months INTEGER NOT NULL,
+            amount_wei TEXT, -- Exact amount paid in wei as integer text
+            period_start TEXT NOT NULL, -- First due date covered
+            period_end TEXT NOT NULL, -- Next due date after this payment
+            paid_at TEXT NOT NULL -- No foreign key, payments are kept when the contract is archived
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_payments_contract ON payments (contract_id, period_start)')
+
+
+def advance_due_date(due_date, periods=1):
+    """Moves a YYYY-MM-DD due date forward by the given number of payment periods."""
+    due = datetime.strptime(due_date, '%Y-%m-%d')
+    return (due + timedelta(days=PAYMENT_PERIOD_DAYS * periods)).strftime('%Y-%m-%d')
+
+
+def record_rent_paid(cursor, contract_id, periods=1, today=None, tx_hash=None, amount_wei=None):
+    """Records a payment covering `periods` months, advances next_payment_date by that many periods
+    and clears the overdue flag once the tenant is caught up."""
+    today = today or datetime.utcnow().strftime('%Y-%m-%d')
+    cursor.execute('SELECT next_payment_date, start_date FROM contracts WHERE id = ?', (contract_id,))
+    next_payment_date, start_date = cursor.fetchone()
+    period_start = next_payment_date or start_date
+    new_due_date = advance_due_date(period_start, periods)
+    cursor.execute('''
+        UPDATE contracts
+        SET next_payment_date = ?, overdue_since = CASE WHEN ? >= ? THEN NULL ELSE overdue_since END
+        WHERE id = ?
+    ''', (new_due_date, new_due_date, today, contract_id))
+    cursor.execute('''
+        INSERT INTO payments (contract_id, tx_hash, months, amount_wei, period_start, period_end, paid_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (contract_id, tx_hash, periods, str(amount_wei) if amount_wei is not None else None,
+          period_start, new_due_date, today))
+    return new_due_date
+
+
+class LeaseSweeper:
+    """Periodically flags overdue rent, cancels lapsed Pending leases and completes expired leases on-chain."""
+
+    def __init__(self, database_file, web3, bindings, fee_strategy, operator_key=None, batch_size=200,
+                 interval=3600, overdue_grace_days=0, event_broker=None, receipt_waiter=None):
+        self.database_file = database_file
+        self.web3 = web3
+        self.bindings = bindings  # bindings.LeaseBindings, leases may be contracts of their own or registry entries
+        self.fee_strategy = fee_strategy
+        self.receipt_waiter = receipt_waiter or ReceiptWaiter(web3)  # Shared with the backend's request threads
+        self.operator = web3.eth.account.from_key(operator_key) if operator_key else None
+        self.batch_size = batch_size
+        self.interval = interval
+        self.overdue_grace_days = overdue_grace_days
+        self.event_broker = event_broker  # Optional, notifies landlord and tenant of changes
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="lease-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                stats = self.run_once()
+                logger.info("Lease sweep finished: %s", stats)
+            except Exception:
+                logger.exception("Lease sweep failed")
+            self._stop.wait(self.interval)
+
+    def run_once(self, today=None):
+        today = today or datetime.utcnow().strftime('%Y-%m-%d')
+        conn = sqlite3.connect(self.database_file)
+        try:
+            stats = {"overdue_marked": self._mark_overdue(conn, today)}
+            stats["holds_cancelled"] = self._cancel_lapsed_holds(conn)
+            stats["completion_times_read"] = self._read_completion_times(conn)
+            stats.update(self._complete_expired(conn))
+            return stats
+        finally:
+            conn.close()
+
+    def _mark_overdue(self, conn, today):
+        # One set-based statement over the (status, next_payment_date) index
+        cutoff = (datetime.strptime(today, '%Y-%m-%d') - timedelta(days=self.overdue_grace_days)).strftime('%Y-%m-%d')
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE contracts SET overdue_since = next_payment_date
+            WHERE status = 'Active' AND next_payment_date < ? AND overdue_since IS NULL
+            RETURNING id
+        ''', (cutoff,))
+        overdue = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+        self._publish(cursor, 'contract.overdue', overdue)
+        return len(overdue)
+
+    def _cancel_lapsed_holds(self, conn):
+        # Through the partial index on Pending leases; the lease_intervals trigger frees the dates
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE contracts SET status = 'Cancelled'
+            WHERE status = 'Pending' AND hold_until <= ?
+            RETURNING id
+        ''', (datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),))
+        cancelled = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+        self._publish(cursor, 'contract.cancelled', cancelled)
+        return len(cancelled)
+
+    def _read_completion_times(self, conn):
+        """Stores when each active lease elapses on-chain, for leases where that is not known yet."""
+        cursor = conn.cursor()
+        stored, last_id = 0, 0
+        while not self._stop.is_set():
+            cursor.execute('''
+                SELECT id, contract_address, landlord_wallet FROM contracts
+                WHERE status = 'Active' AND completes_at IS NULL AND contract_address IS NOT NULL AND id > ?
+                ORDER BY id
+                LIMIT ?
+            ''', (last_id, self.batch_size))
+            leases = cursor.fetchall()
+            if not leases:
+                break
+            last_id = leases[-1][0]
+            # A start date of 0 means the tenant has not signed on-chain yet, read again next sweep
+            completes_at = [(start_date + lease_duration * PAYMENT_PERIOD_SECONDS, lease_id)
+                            for lease_id, (start_date, lease_duration) in self._read_periods(leases).items()
+                            if start_date]
+            cursor.executemany('UPDATE contracts SET completes_at = ? WHERE id = ?', completes_at)
+            conn.commit()
+            stored += len(completes_at)
+        return stored
+
+    def _complete_expired(self, conn):
+        stats = {"expired_scanned": 0, "completion_txs": 0, "completed": 0, "terminated": 0}
+        cursor = conn.cursor()
+        now = self.web3.eth.get_block('latest')['timestamp']  # The contract's clock, not the server's
+        last_completes_at, last_id = -1, 0
+
+        # Keyset pagination over the (status, completes_at) index keeps every batch query cheap.
+        # Only leases that have elapsed on-chain are picked, checkCompletion does nothing on the others.
+        while not self._stop.is_set():
+            cursor.execute('''
+                SELECT id, completes_at, contract_address, landlord_wallet FROM contracts
+                WHERE status = 'Active' AND completes_at <= ? AND (completes_at, id) > (?, ?)
+                ORDER BY completes_at, id
+                LIMIT ?
+            ''', (now, last_completes_at, last_id, self.batch_size))
+            batch = cursor.fetchall()
+            if not batch:
+                break
+            last_completes_at, last_id = batch[-1][1], batch[-1][0]
+            stats["expired_scanned"] += len(batch)
+
+            leases = [(row[0], row[2], row[3]) for row in batch if row[2]]
+            states = self._read_states(leases)
+
+            # Someone may already have completed or terminated the lease on-chain
+            still_active = [lease for lease in leases if states.get(lease[0]) == STATE_ACTIVE]
+            if still_active and self.operator:
+                stats["completion_txs"] += self._send_check_completion(still_active)
+                states.update(self._read_states(still_active))
+
+            completed = [(lease_id,) for lease_id, state in states.items() if state == STATE_COMPLETED]
+            terminated = [(lease_id,) for lease_id, state in states.items() if state == STATE_TERMINATED]
+            cursor.executemany("UPDATE contracts SET status = 'Completed' WHERE id = ?", completed)
+            cursor.executemany("UPDATE contracts SET status = 'Terminated' WHERE id = ?", terminated)
+            conn.commit()
+            self._publish(cursor, 'contract.completed', [lease_id for lease_id, in completed])
+            self._publish(cursor, 'contract.terminated', [lease_id for lease_id, in terminated])
+            stats["completed"] += len(completed)
+            stats["terminated"] += len(terminated)
+
+        return stats
+
+    def _publish(self, cursor, event_type, contract_ids):
+        if self.event_broker and contract_ids:
+            self.event_broker.publish_contracts(cursor, event_type, contract_ids)
+
+    def _read_states(self, leases):
+        if not leases:
+            return {}
+        # One JSON-RPC round trip per batch instead of one per lease
+        with self.web3.batch_requests() as batch:
+            for lease in leases:
+                batch.add(self.bindings.for_lease(lease[1]).state(lease))
+            results = batch.execute()
+        return {lease[0]: state for lease, state in zip(leases, results)}
+
+    def _read_periods(self, leases):
+        """On-chain (startDate, leaseDuration) per lease id, in one JSON-RPC batch."""
+        if not leases:
+            return {}
+        with self.web3.batch_requests() as batch:
+            calls = []
+            for lease in leases:
+                binding = self.bindings.for_lease(lease[1])
+                period_calls = binding.period(lease)
+                for call in period_calls:
+                    batch.add(call)
+                calls.append((lease[0], binding, len(period_calls)))
+            results = batch.execute()
+        periods, offset = {}, 0
+        for lease_id, binding, count in calls:
+            periods[lease_id] = binding.parse_period(results[offset:offset + count])
+            offset += count
+        return periods
+
+    def _send_check_completion(self, leases):
+        # Broadcast the whole batch with consecutive nonces, then wait for the receipts once
+        nonce = self.web3.eth.get_transaction_count(self.operator.address, 'pending')
+        sent = []
+        for lease in leases:
+            tx = self.fee_strategy.build_transaction(self.bindings.for_lease(lease[1]).check_completion(lease), {
+                'from': self.operator.address,
+                'nonce': nonce
+            })
+            signed_tx = self.operator.sign_transaction(tx)
+            sent.append((tx, self.web3.eth.send_raw_transaction(signed_tx.raw_transaction)))
+            nonce += 1
+
+        receipts = self.receipt_waiter.wait_all([tx_hash for _, tx_hash in sent])
+        for (tx, tx_hash), receipt in zip(sent, receipts):
+            if isinstance(receipt, Exception):
+                logger.warning("checkCompletion %s not confirmed: %s", self.web3.to_hex(tx_hash), receipt)
+                continue
+            self.fee_strategy.record('check_completion', tx, receipt)
+        return len(sent)
@@ -0,0 +1,52 @@
+"""Serves the backend from gevent's WSGI server, the way to run it in production.
+
+    python serve.py
+
+The development server (python backend.py) spends a thread on every request and on
+every open /events/stream connection. Here the standard library is patched by gevent,
+so each connection is a greenlet on one event loop and an idle event stream costs a
+few kilobytes; one process holds thousands of them. Listens on HOST:PORT
+(default 127.0.0.1:5000).
+"""
+from gevent import monkey
+
+monkey.patch_all()  # Before anything imports socket, ssl, threading, queue or time
+
+import os
+import resource
+
+from dotenv import load_dotenv
+from gevent.pywsgi import WSGIServer
+
+# Defaults for the backend when run under gevent, set before it reads its environment
+SERVE_DEFAULTS = {
+    "BCRYPT_POOL": "process",  # A patched "thread" is a greenlet, bcrypt in one would stall the loop
+    "EVENT_MAX_SUBSCRIBERS": "10000",
+}
+
+
+def raise_open_file_limit():
+    """Every open stream is a socket, lift the soft descriptor limit to the hard one."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard != resource.RLIM_INFINITY:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def make_server(app, host="127.0.0.1", port=5000, backlog=4096):
+    # A deep accept queue, after a restart every client's EventSource reconnects at once
+    return WSGIServer((host, port), app, backlog=backlog)
+
+
+if __name__ == "__main__":
+    load_dotenv()  # So .env settings win over the defaults below
+    for name, value in SERVE_DEFAULTS.items():
+        os.environ.setdefault(name, value)
+    raise_open_file_limit()
+
+    import backend
+
+    backend.start_background_jobs()
+    server = make_server(backend.app, os.getenv("HOST", "127.0.0.1"), int(os.getenv("PORT", 5000)))
+    print(f"Serving on http://{server.server_host}:{server.server_port}")
+    server.serve_forever()
@@ -0,0 +1,168 @@
+import os
+import shutil
+import tempfile
+import uuid
+
+from werkzeug.utils import secure_filename
+
+
+class StorageError(Exception):
+    pass
+
+
+def new_photo_key(owner_id, filename):
+    """Unique object key under the owner's prefix, keeping the original extension."""
+    extension = os.path.splitext(secure_filename(filename or ""))[1].lower()
+    return f"u{owner_id}/{uuid.uuid4().hex}{extension}"
+
+
+class LocalStorage:
+    """Photos on the local filesystem, served by the backend's /uploads route or a CDN in front of it."""
+
+    supports_direct_upload = False
+
+    def __init__(self, root="uploads", quarantine_dir="uploads_quarantine", public_base_url=None):
+        self.root = root
+        self.quarantine_dir = quarantine_dir
+        self.public_base_url = public_base_url  # e.g. a CDN origin; None means the backend serves the files
+
+    def put(self, key, stream, content_type=None):
+        """Streams the upload to a temporary file, then moves it into place."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as tmp:
+            shutil.copyfileobj(stream, tmp, 1024 * 1024)
+        os.replace(tmp.name, path)
+
+    def exists(self, key):
+        return os.path.isfile(self._path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def quarantine(self, key):
+        target = os.path.join(self.quarantine_dir, key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(self._path(key), target)
+
+    def url(self, key):
+        return f"{self.public_base_url.rstrip('/')}/{key}" if self.public_base_url else None
+
+    def presigned_upload(self, key, content_type, expires=900):
+        raise StorageError("Direct uploads are not supported by local storage")
+
+    def list_objects(self):
+        """Yields (key, size, mtime) for every stored file, streaming directory by directory."""
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = os.scandir(directory)
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        key = os.path.relpath(entry.path, self.root).replace(os.sep, "/")
+                        yield key, stat.st_size, stat.st_mtime
+
+    def _path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise StorageError(f"Invalid storage key: {key}")
+        return path
+
+
+class S3Storage:
+    """Photos in an S3-compatible bucket (AWS S3, MinIO, ...). Clients upload and download directly."""
+
+    supports_direct_upload = True
+
+    def __init__(self, bucket, endpoint_url=None, region=None, access_key=None, secret_key=None,
+                 public_base_url=None, url_expires=3600, quarantine_prefix="quarantine/"):
+        try:
+            import boto3
+        except ImportError as e:
+            raise StorageError("S3 storage needs boto3: pip install boto3") from e
+
+        self.bucket = bucket
+        self.public_base_url = public_base_url  # CDN in front of the bucket; presigned GETs otherwise
+        self.url_expires = url_expires
+        self.quarantine_prefix = quarantine_prefix
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,  # Set for MinIO or another local stand-in
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key
+        )
+
+    def put(self, key, stream, content_type=None):
+        # upload_fileobj reads the stream in parts, the file is never held in memory
+        extra = {"ContentType": content_type} if content_type else None
+        self.client.upload_fileobj(stream, self.bucket, key, ExtraArgs=extra)
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def quarantine(self, key):
+        self.client.copy_object(Bucket=self.bucket, Key=self.quarantine_prefix + key,
+                                CopySource={"Bucket": self.bucket, "Key": key})
+        self.delete(key)
+
+    def url(self, key):
+        if self.public_base_url:
+            return f"{self.public_base_url.rstrip('/')}/{key}"
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.url_expires
+        )
+
+    def presigned_upload(self, key, content_type, expires=900):
+        """A URL the client can PUT the file to directly."""
+        url = self.client.generate_presigned_url(
+            "put_object", Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type}, ExpiresIn=expires
+        )
+        return {"url": url, "method": "PUT", "headers": {"Content-Type": content_type}, "key": key}
+
+    def list_objects(self):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket):
+            for obj in page.get("Contents", []):
+                if not obj["Key"].startswith(self.quarantine_prefix):
+                    yield obj["Key"], obj["Size"], obj["LastModified"].timestamp()
+
+
+def storage_from_env():
+    """Builds the photo storage from PHOTO_STORAGE (local or s3) and the matching settings."""
+    backend = os.getenv("PHOTO_STORAGE", "local")
+    if backend == "local":
+        return LocalStorage(
+            root=os.getenv("UPLOAD_DIR", "uploads"),
+            quarantine_dir=os.getenv("PHOTO_QUARANTINE_DIR", "uploads_quarantine"),
+            public_base_url=os.getenv("PHOTO_PUBLIC_BASE_URL")
+        )
+    if backend == "s3":
+        return S3Storage(
+            bucket=os.getenv("S3_BUCKET", "apartment-photos"),
+            endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+            region=os.getenv("S3_REGION"),
+            access_key=os.getenv("S3_ACCESS_KEY"),
+            secret_key=os.getenv("S3_SECRET_KEY"),
+            public_base_url=os.getenv("PHOTO_PUBLIC_BASE_URL"),
+            url_expires=int(os.getenv("PHOTO_URL_EXPIRES_SECONDS", 3600))
+        )
+    raise StorageError(f"Unknown PHOTO_STORAGE: {backend}")
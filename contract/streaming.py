@@ -0,0 +1,104 @@
+"""Streams list responses from a cursor instead of building them in memory.
+
+Rows are read with fetchmany, serialized one at a time and written out in
+buffered pieces, as a JSON array of objects or as NDJSON when the client asks for
+application/x-ndjson. ?format=compact sends the column names once and each row as
+an array of values instead. Responses are gzipped when the client accepts it.
+Rows are serialized with orjson.
+"""
+import logging
+import zlib
+
+import orjson
+from flask import Response, stream_with_context
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/ndjson")
+WRITE_SIZE = 64 * 1024  # Bytes buffered before a piece is written
+
+
+def dumps(obj):
+    """Compact JSON as bytes."""
+    return orjson.dumps(obj)
+
+
+def iter_rows(cursor, chunk_size=500):
+    """Yields the rows of an executed query, chunk_size at a time from SQLite."""
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def encode_items(items, ndjson=False, header=None):
+    """Serializes items into a JSON array, or one JSON document per line, in WRITE_SIZE pieces.
+    A header opens an enclosing object ahead of the array, which is closed after it."""
+    buffer = bytearray() if ndjson else bytearray((header or b"") + b"[")
+    separator = b"\n" if ndjson else b","
+    first = True
+    for item in items:
+        if not ndjson and not first:
+            buffer += separator
+        buffer += dumps(item)
+        if ndjson:
+            buffer += separator
+        first = False
+        if len(buffer) >= WRITE_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if not ndjson:
+        buffer += b"]}" if header else b"]"
+    if buffer:
+        yield bytes(buffer)
+
+
+def encode_compact(columns, rows, ndjson=False):
+    """{"columns": [...], "rows": [[...], ...]}, or the columns object followed by one row array per line."""
+    if ndjson:
+        yield dumps({"columns": columns}) + b"\n"
+        yield from encode_items(rows, ndjson=True)
+    else:
+        yield from encode_items(rows, header=b'{"columns":' + dumps(columns) + b',"rows":')
+
+
+def gzip_pieces(pieces, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for piece in pieces:
+        compressed = compressor.compress(piece)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def streaming_response(request, columns, rows, on_close=None, status=200):
+    """Response streaming rows of values for the columns, in the format and encoding the request accepts.
+
+    on_close runs once the response is finished or abandoned, e.g. to close the connection
+    the rows come from. An error while streaming ends the body early; it is logged, since
+    the status line has already been sent.
+    """
+    ndjson = request.accept_mimetypes.best_match(("application/json",) + NDJSON_MIMETYPES) in NDJSON_MIMETYPES
+    compress = request.accept_encodings.quality("gzip") > 0
+
+    def logged(pieces):
+        try:
+            yield from pieces
+        except Exception:
+            logger.exception("Streaming %s failed", request.path)
+
+    if request.args.get("format") == "compact":
+        pieces = encode_compact(columns, rows, ndjson)
+    else:
+        pieces = encode_items((dict(zip(columns, row)) for row in rows), ndjson)
+    if compress:
+        pieces = gzip_pieces(pieces)
+    response = Response(stream_with_context(logged(pieces)), status=status,
+                        mimetype=NDJSON_MIMETYPES[0] if ndjson else "application/json")
+    response.headers["Vary"] = "Accept, Accept-Encoding"
+    if compress:
+        response.headers["Content-Encoding"] = "gzip"
+    if on_close is not None:
+        response.call_on_close(on_close)
+    return response
@@ -0,0 +1,242 @@
+import json
+
+UPCOMING_PAYMENTS_LIMIT = 5
+
+SUMMARY_COLUMNS = (
+    "landlord_wallet", "apartments_total", "apartments_available", "occupied_apartments",
+    "contracts_pending", "contracts_landlord_signed", "contracts_active", "contracts_completed",
+    "contracts_terminated", "overdue_contracts", "expected_monthly_rent_eth", "expected_monthly_rent_jod",
+    "upcoming_payments", "updated_at"
+)
+
+# Recomputes one landlord's row from the (landlord_wallet, ...) indexes, for a rebuild. {wallet}
+# is a SQL expression, ?1 here. Closed leases may have been moved to contracts_archive, so
+# their counts include it.
+_REFRESH_SQL = '''
+    INSERT OR REPLACE INTO landlord_summary ({columns})
+    SELECT {wallet},
+        (SELECT count(*) FROM apartments WHERE landlord_wallet = {wallet}),
+        (SELECT count(*) FROM apartments WHERE landlord_wallet = {wallet} AND availability = 'Available'),
+        (SELECT count(DISTINCT a.id) FROM contracts ac JOIN apartments a ON a.id = ac.apartment_id
+         WHERE ac.landlord_wallet = {wallet} AND ac.status = 'Active'),
+        c.pending, c.landlord_signed, c.active,
+        c.completed + (SELECT count(*) FROM contracts_archive WHERE landlord_wallet = {wallet} AND status = 'Completed'),
+        c.terminated + (SELECT count(*) FROM contracts_archive WHERE landlord_wallet = {wallet} AND status = 'Terminated'),
+        c.overdue, c.rent_eth,
+        (SELECT total(a.price_in_jod) FROM contracts ac JOIN apartments a ON a.id = ac.apartment_id
+         WHERE ac.landlord_wallet = {wallet} AND ac.status = 'Active'),
+        {upcoming},
+        strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+    FROM (
+        SELECT count(CASE WHEN status = 'Pending' THEN 1 END) AS pending,
+               count(CASE WHEN status = 'Landlord Signed' THEN 1 END) AS landlord_signed,
+               count(CASE WHEN status = 'Active' THEN 1 END) AS active,
+               count(CASE WHEN status = 'Completed' THEN 1 END) AS completed,
+               count(CASE WHEN status = 'Terminated' THEN 1 END) AS terminated,
+               count(CASE WHEN status = 'Active' AND overdue_since IS NOT NULL THEN 1 END) AS overdue,
+               total(CASE WHEN status = 'Active' THEN rent_amount END) AS rent_eth
+        FROM contracts WHERE landlord_wallet = {wallet}
+    ) AS c;
+'''
+
+# Triggers apply +1/-1 deltas from the OLD and NEW rows instead of recounting, so a write
+# costs a few index lookups however many leases the landlord has. The summary row is created
+# on first use. {ref} is OLD (sign -1) or NEW (sign +1).
+_ENSURE_ROW_SQL = 'INSERT OR IGNORE INTO landlord_summary (landlord_wallet) VALUES ({ref}.landlord_wallet);'
+
+_CONTRACT_DELTA_SQL = '''
+    UPDATE landlord_summary SET
+        contracts_pending = contracts_pending + {sign} * ({ref}.status = 'Pending'),
+        contracts_landlord_signed = contracts_landlord_signed + {sign} * ({ref}.status = 'Landlord Signed'),
+        contracts_active = contracts_active + {sign} * ({ref}.status = 'Active'),
+        contracts_completed = contracts_completed + {sign} * ({ref}.status = 'Completed'),
+        contracts_terminated = contracts_terminated + {sign} * ({ref}.status = 'Terminated'),
+        overdue_contracts = overdue_contracts + {sign} * ({ref}.status = 'Active' AND {ref}.overdue_since IS NOT NULL),
+        expected_monthly_rent_eth = expected_monthly_rent_eth
+            + {sign} * (CASE WHEN {ref}.status = 'Active' THEN coalesce({ref}.rent_amount, 0) ELSE 0 END),
+        expected_monthly_rent_jod = expected_monthly_rent_jod + {sign} * (CASE WHEN {ref}.status = 'Active' THEN
+            coalesce((SELECT price_in_jod FROM apartments WHERE id = {ref}.apartment_id), 0) ELSE 0 END),
+        updated_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+    WHERE landlord_wallet = {ref}.landlord_wallet;
+'''
+
+# Active leases of one landlord on one apartment, after the write (idx_contracts_apartment_status)
+_ACTIVE_ON_APARTMENT = '''(SELECT count(*) FROM contracts WHERE apartment_id = {ref}.apartment_id
+                            AND status = 'Active' AND landlord_wallet = {ref}.landlord_wallet)'''
+
+# An apartment becomes occupied with its first active lease and free again with its last
+_OCCUPIED_NEW_SQL = '''
+    UPDATE landlord_summary SET occupied_apartments = occupied_apartments + 1
+    WHERE landlord_wallet = NEW.landlord_wallet AND NEW.status = 'Active' {not_already_active}
+      AND EXISTS (SELECT 1 FROM apartments WHERE id = NEW.apartment_id)
+      AND {active_after} = 1;
+'''
+_OCCUPIED_OLD_SQL = '''
+    UPDATE landlord_summary SET occupied_apartments = occupied_apartments - 1
+    WHERE landlord_wallet = OLD.landlord_wallet AND OLD.status = 'Active'
+      AND EXISTS (SELECT 1 FROM apartments WHERE id = OLD.apartment_id)
+      AND {active_after} = 0;
+'''
+# An update that keeps the lease active on the same apartment and landlord changes nothing
+_STILL_ACTIVE = '''AND NOT (OLD.status = 'Active' AND OLD.apartment_id = NEW.apartment_id
+                               AND OLD.landlord_wallet = NEW.landlord_wallet)'''
+
+# The soonest payments, read in next_payment_date order from idx_contracts_landlord_status_next_payment,
+# so refreshing them reads at most UPCOMING_PAYMENTS_LIMIT index entries
+_UPCOMING_SQL = '''(SELECT json_group_array(json_object(
+                    'contract_id', id, 'apartment_id', apartment_id, 'tenant_wallet', tenant_wallet,
+                    'next_payment_date', next_payment_date, 'overdue_since', overdue_since))
+         FROM (SELECT id, apartment_id, tenant_wallet, next_payment_date, overdue_since FROM contracts
+               WHERE landlord_wallet = {wallet} AND status = 'Active' AND next_payment_date IS NOT NULL
+               ORDER BY next_payment_date LIMIT {limit}))'''
+
+_UPCOMING_REFRESH_SQL = '''
+    UPDATE landlord_summary SET upcoming_payments = {upcoming}
+    WHERE landlord_wallet = {ref}.landlord_wallet AND {ref}.status = 'Active'{condition};
+'''
+
+_ARCHIVE_DELTA_SQL = '''
+    UPDATE landlord_summary SET
+        contracts_completed = contracts_completed + {sign} * ({ref}.status = 'Completed'),
+        contracts_terminated = contracts_terminated + {sign} * ({ref}.status = 'Terminated')
+    WHERE landlord_wallet = {ref}.landlord_wallet;
+'''
+
+_APARTMENT_DELTA_SQL = '''
+    UPDATE landlord_summary SET
+        apartments_total = apartments_total + {sign},
+        apartments_available = apartments_available + {sign} * ({ref}.availability = 'Available'),
+        updated_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+    WHERE landlord_wallet = {ref}.landlord_wallet;
+'''
+
+# Active leases on a repriced or removed apartment, per landlord holding them
+_APARTMENT_LEASES_SQL = '''
+    UPDATE landlord_summary SET
+        expected_monthly_rent_jod = expected_monthly_rent_jod + ({price_delta}) * (
+            SELECT count(*) FROM contracts WHERE apartment_id = OLD.id AND status = 'Active'
+              AND landlord_wallet = landlord_summary.landlord_wallet){occupied}
+    WHERE landlord_wallet IN (
+        SELECT landlord_wallet FROM contracts WHERE apartment_id = OLD.id AND status = 'Active');
+'''
+
+
+def _contract_delta(ref, sign):
+    return (_ENSURE_ROW_SQL + _CONTRACT_DELTA_SQL).format(ref=ref, sign=sign)
+
+
+def _upcoming_refresh(ref, condition=""):
+    upcoming = _UPCOMING_SQL.format(wallet=f"{ref}.landlord_wallet", limit=UPCOMING_PAYMENTS_LIMIT)
+    return _UPCOMING_REFRESH_SQL.format(ref=ref, upcoming=upcoming, condition=condition)
+
+
+def _occupied_new(after_update):
+    return _OCCUPIED_NEW_SQL.format(not_already_active=_STILL_ACTIVE if after_update else "",
+                                    active_after=_ACTIVE_ON_APARTMENT.format(ref="NEW"))
+
+
+def _occupied_old():
+    return _OCCUPIED_OLD_SQL.format(active_after=_ACTIVE_ON_APARTMENT.format(ref="OLD"))
+
+
+def _apartment_delta(ref, sign):
+    return (_ENSURE_ROW_SQL + _APARTMENT_DELTA_SQL).format(ref=ref, sign=sign)
+
+
+# (trigger name, event, table, WHEN condition or None, body)
+_TRIGGERS = (
+    ("trg_summary_contracts_insert", "INSERT", "contracts", None,
+     _contract_delta("NEW", 1) + _occupied_new(False) + _upcoming_refresh("NEW")),
+    ("trg_summary_contracts_update",
+     "UPDATE OF landlord_wallet, apartment_id, status, rent_amount, next_payment_date, overdue_since", "contracts",
+     None,
+     _contract_delta("OLD", -1) + _contract_delta("NEW", 1) + _occupied_old() + _occupied_new(True)
+     # The OLD refresh already covers the NEW row when the lease was active for the same landlord
+     + _upcoming_refresh("OLD")
+     + _upcoming_refresh("NEW", " AND NOT (OLD.status = 'Active' AND OLD.landlord_wallet = NEW.landlord_wallet)")),
+    ("trg_summary_contracts_delete", "DELETE", "contracts", None,
+     _contract_delta("OLD", -1) + _occupied_old() + _upcoming_refresh("OLD")),
+    ("trg_summary_archive_insert", "INSERT", "contracts_archive", None,
+     (_ENSURE_ROW_SQL + _ARCHIVE_DELTA_SQL).format(ref="NEW", sign=1)),
+    ("trg_summary_archive_delete", "DELETE", "contracts_archive", None,
+     _ARCHIVE_DELTA_SQL.format(ref="OLD", sign=-1)),
+    ("trg_summary_apartments_insert", "INSERT", "apartments", None, _apartment_delta("NEW", 1)),
+    ("trg_summary_apartments_update", "UPDATE OF landlord_wallet, availability", "apartments", None,
+     _apartment_delta("OLD", -1) + _apartment_delta("NEW", 1)),
+    ("trg_summary_apartments_price", "UPDATE OF price_in_jod", "apartments",
+     "NEW.price_in_jod IS NOT OLD.price_in_jod",
+     _APARTMENT_LEASES_SQL.format(price_delta="coalesce(NEW.price_in_jod, 0) - coalesce(OLD.price_in_jod, 0)",
+                                  occupied="")),
+    ("trg_summary_apartments_delete", "DELETE", "apartments", None,
+     _apartment_delta("OLD", -1) + _APARTMENT_LEASES_SQL.format(
+         price_delta="-coalesce(OLD.price_in_jod, 0)", occupied=",\n        occupied_apartments = occupied_apartments - 1")),
+)
+
+
+def _refresh_sql(wallet):
+    return _REFRESH_SQL.format(columns=", ".join(SUMMARY_COLUMNS), wallet=wallet,
+                               upcoming=_UPCOMING_SQL.format(wallet=wallet, limit=UPCOMING_PAYMENTS_LIMIT))
+
+
+def init_summary_tables(cursor):
+    """Creates the landlord_summary table and the triggers that keep it current, then rebuilds it."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS landlord_summary (
+            landlord_wallet TEXT PRIMARY KEY,
+            apartments_total INTEGER NOT NULL DEFAULT 0,
+            apartments_available INTEGER NOT NULL DEFAULT 0,
+            occupied_apartments INTEGER NOT NULL DEFAULT 0, -- Apartments with an active lease
+            contracts_pending INTEGER NOT NULL DEFAULT 0,
+            contracts_landlord_signed INTEGER NOT NULL DEFAULT 0,
+            contracts_active INTEGER NOT NULL DEFAULT 0,
+            contracts_completed INTEGER NOT NULL DEFAULT 0,
+            contracts_terminated INTEGER NOT NULL DEFAULT 0,
+            overdue_contracts INTEGER NOT NULL DEFAULT 0,
+            expected_monthly_rent_eth REAL NOT NULL DEFAULT 0, -- Sum over active leases, for display only
+            expected_monthly_rent_jod REAL NOT NULL DEFAULT 0,
+            upcoming_payments TEXT NOT NULL DEFAULT '[]', -- JSON array, soonest due first
+            updated_at TEXT
+        )
+    ''')
+    # Also serves (landlord_wallet, status) lookups; replaces the narrower index of earlier versions
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contracts_landlord_status_next_payment '
+                   'ON contracts (landlord_wallet, status, next_payment_date)')
+    cursor.execute('DROP INDEX IF EXISTS idx_contracts_landlord_status')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_apartments_landlord ON apartments (landlord_wallet)')
+
+    # Triggers run inside the writing statement's transaction, so the summary can never
+    # disagree with committed data. Recreated on start so definition changes take effect.
+    for name, event, table, when, body in _TRIGGERS:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        when = f'WHEN {when} ' if when else ''
+        cursor.execute(f'CREATE TRIGGER {name} AFTER {event} ON {table} FOR EACH ROW {when}BEGIN {body} END')
+
+    rebuild_landlord_summary(cursor)
+
+
+def rebuild_landlord_summary(cursor):
+    """Recomputes every landlord's row, e.g. after the triggers were added to an existing database."""
+    cursor.execute('DELETE FROM landlord_summary')
+    cursor.execute('''
+        SELECT landlord_wallet FROM apartments UNION SELECT landlord_wallet FROM contracts
+        UNION SELECT landlord_wallet FROM contracts_archive
+    ''')
+    wallets = [(row[0],) for row in cursor.fetchall()]
+    cursor.executemany(_refresh_sql("?1"), wallets)
+
+
+def read_landlord_summary(cursor, landlord_wallet):
+    """Returns the landlord's summary as a dict, with zero counts for a landlord with no data yet."""
+    cursor.execute(f'SELECT {", ".join(SUMMARY_COLUMNS)} FROM landlord_summary WHERE landlord_wallet = ?',
+                   (landlord_wallet,))
+    row = cursor.fetchone()
+    if row:
+        summary = dict(zip(SUMMARY_COLUMNS, row))
+        summary["upcoming_payments"] = json.loads(summary["upcoming_payments"])
+    else:
+        summary = {column: 0 for column in SUMMARY_COLUMNS}
+        summary.update(landlord_wallet=landlord_wallet, upcoming_payments=[], updated_at=None)
+
+    total = summary["apartments_total"]
+    summary["occupancy_rate"] = round(summary["occupied_apartments"] / total, 4) if total else None
+    return summary
@@ -0,0 +1,66 @@
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+from analytics import PERCENTILES, Analytics, grouped_percentiles, init_analytics_indexes
+
+
+@pytest.mark.parametrize("percentiles", [PERCENTILES, (0, 1, 33.3, 99.9, 100)])
+def test_grouped_percentiles_match_numpy(percentiles):
+    rng = np.random.default_rng(49)
+    # Single values, pairs, ties and larger groups
+    groups = [np.sort(rng.integers(0, 5, size).astype(np.float64) if size % 3 == 0 else rng.gamma(2, 300, size))
+              for size in [1, 2, 3, 4, 7, 10, 64, 101, 1000]]
+    result = grouped_percentiles(np.concatenate(groups), [len(group) for group in groups], percentiles)
+
+    assert result.shape == (len(groups), len(percentiles))
+    for row, group in zip(result, groups):
+        np.testing.assert_allclose(row, np.percentile(group, percentiles), rtol=1e-12)
+
+
+@pytest.fixture
+def database_file(tmp_path):
+    database_file = os.path.join(tmp_path, "analytics.db")
+    conn = sqlite3.connect(database_file)
+    conn.execute("CREATE TABLE apartments (id INTEGER PRIMARY KEY, location TEXT, price_in_jod REAL)")
+    init_analytics_indexes(conn.cursor())
+    rng = np.random.default_rng(7)
+    prices = {"Abdoun": rng.normal(900, 150, 40), "Khalda": rng.normal(450, 80, 25), "Marka": [200.0]}
+    conn.executemany("INSERT INTO apartments (location, price_in_jod) VALUES (?, ?)",
+                     [(location, round(float(price), 2)) for location, values in prices.items() for price in values]
+                     + [("Marka", None)])
+    conn.commit()
+    conn.close()
+    return database_file
+
+
+def test_rent_by_location_percentiles(database_file):
+    conn = sqlite3.connect(database_file)
+    expected = {}
+    for location, price in conn.execute("SELECT location, price_in_jod FROM apartments WHERE price_in_jod IS NOT NULL"):
+        expected.setdefault(location, []).append(price)
+    conn.close()
+
+    report = Analytics(database_file).report("rent-by-location")
+    assert [row["location"] for row in report["locations"]] == sorted(expected)
+    for row in report["locations"]:
+        prices = expected[row["location"]]
+        assert row["listings"] == len(prices)
+        assert [row[f"p{p}_price_jod"] for p in PERCENTILES] == pytest.approx(list(np.percentile(prices, PERCENTILES)))
+    assert report["overall"]["count"] == sum(map(len, expected.values()))
+
+    filtered = Analytics(database_file).report("rent-by-location", min_listings=2)
+    assert [row["location"] for row in filtered["locations"]] == ["Abdoun", "Khalda"]
+
+
+def test_reports_are_cached_per_parameters(database_file):
+    analytics = Analytics(database_file)
+    assert analytics.report("rent-by-location")["cached"] is False
+    assert analytics.report("rent-by-location")["cached"] is True
+    assert analytics.report("rent-by-location", min_listings=2)["cached"] is False
+    assert analytics.report("rent-by-location", refresh=True)["cached"] is False
+    assert analytics.stats() == {"hits": 1, "misses": 3, "cached_reports": 2}
+    with pytest.raises(KeyError):
+        analytics.report("unknown")
@@ -0,0 +1,101 @@
+import logging
+import os
+import random
+import sqlite3
+
+import pytest
+from web3 import Web3
+
+from anchoring import (TERMS_COLUMNS, LeaseAnchorer, contract_hash, init_anchor_tables, lease_terms, merkle_levels,
+                       merkle_proof, verify_lease, verify_proof)
+
+LANDLORD = "0x" + "ab" * 20
+TENANT = "0x" + "cd" * 20
+
+
+def leaves(count, seed=0):
+    rng = random.Random(seed)
+    return [Web3.keccak(rng.randbytes(32)) for _ in range(count)]
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 4, 5, 7, 8, 9, 16, 17, 100])
+def test_every_leaf_proves_against_the_root(count):
+    tree = leaves(count, seed=count)
+    levels = merkle_levels(tree)
+    root = levels[-1][0]
+    for index, leaf in enumerate(tree):
+        assert verify_proof(leaf, merkle_proof(levels, index), root)
+
+
+def test_wrong_leaf_proof_or_root_is_rejected():
+    tree = leaves(9)
+    levels = merkle_levels(tree)
+    root, proof = levels[-1][0], merkle_proof(levels, 4)
+    assert not verify_proof(tree[5], proof, root)
+    assert not verify_proof(tree[4], proof[:-1], root)
+    assert not verify_proof(tree[4], [Web3.keccak(b"other")] + proof[1:], root)
+    assert not verify_proof(tree[4], proof, merkle_levels(leaves(9, seed=1))[-1][0])
+
+
+def test_pairs_are_sorted_like_openzeppelin():
+    a, b = leaves(2)
+    expected = Web3.keccak(min(a, b) + max(a, b))
+    assert merkle_levels([a, b])[-1][0] == merkle_levels([b, a])[-1][0] == expected
+
+
+def test_terms_hash_ignores_wallet_case():
+    row = (1, LANDLORD, TENANT, 3, "2025-01-01", "2025-12-31", 10 ** 18, 12)
+    upper = (1, LANDLORD.upper().replace("0X", "0x"), TENANT, 3, "2025-01-01", "2025-12-31", 10 ** 18, 12)
+    assert contract_hash(lease_terms(row)) == contract_hash(lease_terms(upper))
+
+
+@pytest.mark.parametrize("wallet", ["0xL", "", None, "0x" + "ab" * 19])
+def test_malformed_wallet_is_rejected(wallet):
+    with pytest.raises(ValueError):
+        lease_terms((1, wallet, TENANT, 3, "2025-01-01", "2025-12-31", 10 ** 18, 12))
+
+
+def make_database(tmp_path, rows):
+    database_file = os.path.join(tmp_path, "anchor.db")
+    conn = sqlite3.connect(database_file)
+    conn.execute(f"CREATE TABLE contracts ({', '.join(TERMS_COLUMNS)}, contract_hash TEXT)")
+    conn.executemany(f"INSERT INTO contracts ({', '.join(TERMS_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    return database_file, conn
+
+
+def test_backfill_skips_malformed_wallets(tmp_path, caplog):
+    database_file, conn = make_database(tmp_path, [
+        (1, LANDLORD, TENANT, 3, "2025-01-01", "2025-12-31", 10 ** 18, 12),
+        (2, "0xL", TENANT, 3, "2025-01-01", "2025-12-31", 10 ** 18, 12),
+    ])
+    with caplog.at_level(logging.WARNING):
+        init_anchor_tables(conn.cursor())
+    hashes = dict(conn.execute('SELECT id, contract_hash FROM contracts'))
+    assert hashes[1] is not None and hashes[2] is None
+    assert "Contract 2 not hashed" in caplog.text
+
+
+def test_batched_leases_verify(tmp_path):
+    rows = [(i, LANDLORD, TENANT, i, "2025-01-01", "2025-12-31", str(10 ** 18 + i), 12) for i in range(1, 12)]
+    database_file, conn = make_database(tmp_path, rows)
+    init_anchor_tables(conn.cursor())
+    conn.commit()
+    conn.close()
+
+    # Without an operator key batches are built but nothing is sent
+    anchorer = LeaseAnchorer(database_file, None, None, receipt_waiter=object(), max_batch_size=4)
+    stats = anchorer.run_once()
+    assert stats["batches"] == 3 and stats["leaves"] == 11 and stats["anchor_txs"] == 0
+
+    conn = sqlite3.connect(database_file)
+    for contract_id in range(1, 12):
+        result = verify_lease(conn.cursor(), contract_id)
+        assert result["hash_matches_terms"] and result["proof_valid"]
+        assert not result["anchored"]  # Still Pending
+
+    # Changed terms no longer match the stored hash or the proof
+    conn.execute("UPDATE contracts SET rent_amount_wei = '1' WHERE id = 5")
+    result = verify_lease(conn.cursor(), 5)
+    assert not result["hash_matches_terms"] and not result["proof_valid"]
+    conn.close()
@@ -0,0 +1,19 @@
+from web3 import Web3
+
+from bindings import RegistryContract
+
+LANDLORD = "0x" + "ab" * 20
+
+
+def test_registry_key_matches_lease_key_encoding():
+    # abi.encode(address, uint256): the address left-padded to 32 bytes, then the id
+    encoded = bytes(12) + bytes.fromhex("ab" * 20) + (42).to_bytes(32, "big")
+    expected = int.from_bytes(Web3.keccak(encoded), "big")
+    assert RegistryContract.key((42, None, LANDLORD)) == expected
+    assert RegistryContract.key((42, None, LANDLORD.upper().replace("0X", "0x"))) == expected
+
+
+def test_same_id_of_two_landlords_gets_different_keys():
+    other = "0x" + "cd" * 20
+    assert RegistryContract.key((42, None, LANDLORD)) != RegistryContract.key((42, None, other))
+    assert RegistryContract.key((42, None, LANDLORD)) != RegistryContract.key((43, None, LANDLORD))
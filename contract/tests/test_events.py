@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+from events import EventBroker, EventBrokerFull
+
+
+def test_ticket_is_single_use():
+    broker = EventBroker()
+    ticket = broker.issue_ticket({"wallet_address": "0xA", "exp": 1})
+    assert broker.redeem_ticket(ticket) == {"wallet_address": "0xA", "exp": 1}
+    assert broker.redeem_ticket(ticket) is None
+    assert broker.redeem_ticket("made-up") is None
+
+
+def test_ticket_expires():
+    broker = EventBroker(ticket_ttl=0)
+    ticket = broker.issue_ticket({"wallet_address": "0xA"})
+    time.sleep(0.01)
+    assert broker.redeem_ticket(ticket) is None
+    assert broker._tickets == {}
+
+
+def test_subscribers_are_capped():
+    broker = EventBroker(max_subscribers=2)
+    first, second = broker.subscribe("0xA"), broker.subscribe("0xB")
+    with pytest.raises(EventBrokerFull):
+        broker.subscribe("0xC")
+    broker.unsubscribe(first)
+    broker.subscribe("0xC")
+    assert broker.stats()["subscribers"] == 2
+
+
+def test_events_reach_the_wallets_subscribers_and_replay_after_reconnect():
+    broker = EventBroker(heartbeat=0.01)
+    subscription = broker.subscribe("0xa")
+    first = broker.publish(["0xA", "0xB"], "contract.status", {"id": 1})
+    broker.publish(["0xB"], "contract.status", {"id": 2})
+    assert subscription.queue.get_nowait() == (first, "contract.status", {"id": 1})
+    assert subscription.queue.empty()
+
+    third = broker.publish(["0xA"], "payment.confirmed", {"id": 1})
+    stream = broker.stream(broker.subscribe("0xA"), last_event_id=first)
+    assert next(stream) == "retry: 3000\n\n"
+    assert next(stream).startswith(f"id: {third}\nevent: payment.confirmed\n")
+    stream.close()
+    assert broker.stats()["subscribers"] == 1
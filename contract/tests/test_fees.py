@@ -0,0 +1,63 @@
+from fees import FeeStrategy
+
+MAKE_PAYMENT = "0xd0e30db0"
+TERMINATE = "0x1ea2a4b4"
+
+
+class FakeEth:
+    """estimate_gas answers from a table keyed by (data, value), changed by the test."""
+
+    def __init__(self, gas):
+        self.gas = gas
+        self.estimates = 0
+        self.eth = self
+
+    def estimate_gas(self, call):
+        self.estimates += 1
+        return self.gas[(call['data'], call.get('value', 0))]
+
+    def to_wei(self, value, unit):
+        return value * 10 ** 9
+
+
+def tx(data, value=0, gas=None):
+    tx = {'from': "0x" + "ab" * 20, 'to': "0x" + "cd" * 20, 'data': data, 'value': value}
+    if gas is not None:
+        tx['gas'] = gas
+    return tx
+
+
+def test_expensive_path_is_not_limited_by_an_estimate_of_the_cheap_one():
+    # A later payment only adds to totalPaid; a first payment writes it from zero
+    web3 = FakeEth({(MAKE_PAYMENT, 10 ** 18): 40000})
+    fees = FeeStrategy(web3, gas_margin=1.2)
+    assert fees.gas_limit(tx(MAKE_PAYMENT, 10 ** 18)) == 48000
+
+    web3.gas[(MAKE_PAYMENT, 10 ** 18)] = 57000
+    assert fees.gas_limit(tx(MAKE_PAYMENT, 10 ** 18)) == 68400
+    assert web3.estimates == 2
+
+
+def test_cheap_path_keeps_the_recent_floor():
+    web3 = FakeEth({(MAKE_PAYMENT, 1): 57000})
+    fees = FeeStrategy(web3, gas_margin=1.2)
+    fees.gas_limit(tx(MAKE_PAYMENT, 1))
+    web3.gas[(MAKE_PAYMENT, 1)] = 40000
+    assert fees.gas_limit(tx(MAKE_PAYMENT, 1)) == 68400
+
+
+def test_calls_with_and_without_value_have_their_own_floor():
+    # The landlord's termination sends a refund, the tenant's sends nothing
+    web3 = FakeEth({(TERMINATE, 10 ** 18): 60000, (TERMINATE, 0): 30000})
+    fees = FeeStrategy(web3, gas_margin=1.0)
+    assert fees.gas_limit(tx(TERMINATE, 10 ** 18)) == 60000
+    assert fees.gas_limit(tx(TERMINATE)) == 30000
+
+
+def test_out_of_gas_raises_the_floor():
+    web3 = FakeEth({(MAKE_PAYMENT, 1): 40000})
+    fees = FeeStrategy(web3, gas_margin=1.2)
+    sent = tx(MAKE_PAYMENT, 1, gas=fees.gas_limit(tx(MAKE_PAYMENT, 1)))
+    fees.record('pay', dict(sent, gasPrice=1), {'gasUsed': sent['gas']})
+    assert fees.gas_limit(tx(MAKE_PAYMENT, 1)) == int(48000 * 1.2)
+    assert fees.report()['pay']['out_of_gas'] == 1
@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+from fields import TENANT_CONTRACT_FIELDS, apartment_fields
+
+
+def photo_url(storage_key, stored_url):
+    return f"https://cdn.example/{storage_key}" if storage_key else stored_url
+
+
+@pytest.fixture
+def cursor():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE apartments (id INTEGER PRIMARY KEY, landlord_wallet TEXT, title TEXT, location TEXT, "
+                   "description TEXT, price_in_jod REAL, rent_amount_eth REAL, rent_amount_wei TEXT, "
+                   "lease_duration INTEGER, availability TEXT, contract_address TEXT, latitude REAL, longitude REAL)")
+    cursor.execute("CREATE TABLE apartment_photos (id INTEGER PRIMARY KEY, apartment_id INTEGER, storage_key TEXT, "
+                   "photo_url TEXT)")
+    cursor.executemany("INSERT INTO apartments (id, title, price_in_jod) VALUES (?, ?, ?)",
+                       [(1, "Flat", 400), (2, "Studio", 250)])
+    cursor.executemany("INSERT INTO apartment_photos (apartment_id, storage_key, photo_url) VALUES (?, ?, ?)",
+                       [(1, "a/1.jpg", None), (1, None, "/uploads/old.jpg")])
+    yield cursor
+    cursor.connection.close()
+
+
+def select(cursor, selection):
+    cursor.execute(f"SELECT {selection.sql()} FROM apartments ORDER BY apartments.id")
+    return [selection.item(row) for row in cursor.fetchall()]
+
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(ValueError) as error:
+        TENANT_CONTRACT_FIELDS.select("id,status,password,secret")
+    assert str(error.value).startswith("Unknown fields: password, secret. Available: id, landlord_wallet,")
+
+    with pytest.raises(ValueError):
+        TENANT_CONTRACT_FIELDS.select("c.status")  # SQL expressions are not field names
+
+
+@pytest.mark.parametrize("fields_param, columns", [
+    ("status,start_date", ["id", "status", "start_date"]),
+    ("status, id ,start_date", ["id", "status", "start_date"]),
+    ("status,status,id,", ["id", "status"]),
+    ("id", ["id"]),
+])
+def test_key_field_comes_first(fields_param, columns):
+    selection = TENANT_CONTRACT_FIELDS.select(fields_param)
+    assert selection.columns == columns
+    assert selection.sql().startswith("c.id AS id")
+
+
+def test_defaults_leave_out_optional_fields(cursor):
+    fields = apartment_fields(photo_url)
+    selection = fields.select(None)
+    assert "thumbnail_url" not in selection.columns and selection.columns[0] == "id"
+
+    first, second = select(cursor, selection)
+    assert first["photo_urls"] == ["https://cdn.example/a/1.jpg", "/uploads/old.jpg"]
+    assert second["photo_urls"] == [] and second["contract_address"] == "Not Available"
+    # Compact responses keep NULL
+    assert select(cursor, fields.select("", placeholders=False))[1]["contract_address"] is None
+
+
+def test_sparse_selection_reads_only_the_named_fields(cursor):
+    rows = select(cursor, apartment_fields(photo_url).select("thumbnail_url,title,contract_address"))
+    assert rows == [
+        {"id": 1, "thumbnail_url": "https://cdn.example/a/1.jpg", "title": "Flat", "contract_address": None},
+        {"id": 2, "thumbnail_url": None, "title": "Studio", "contract_address": None},
+    ]
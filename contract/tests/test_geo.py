@@ -0,0 +1,68 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from geo import apartments_near, bounding_box, geocode, haversine_km, init_geo_index
+
+
+@pytest.fixture
+def cursor():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE apartments (id INTEGER PRIMARY KEY, location TEXT)")
+    init_geo_index(cursor)
+    yield cursor
+    conn.close()
+
+
+def add(cursor, *points):
+    cursor.executemany("INSERT INTO apartments (location, latitude, longitude) VALUES ('', ?, ?)", points)
+
+
+def test_search_crosses_the_antimeridian(cursor):
+    # Fiji straddles 180 degrees, 0.1 degrees of longitude is about 10 km there
+    add(cursor, (-17.0, 179.95), (-17.0, -179.95), (-17.0, 179.0), (-17.0, -179.0))
+
+    west = apartments_near(cursor, -17.0, 179.99, 20)
+    assert [apartment_id for apartment_id, _ in west] == [1, 2]
+    east = apartments_near(cursor, -17.0, -179.99, 20)
+    assert [apartment_id for apartment_id, _ in east] == [2, 1]
+    assert west[1][1] == pytest.approx(haversine_km(-17.0, 179.99, -17.0, -179.95), abs=0.01)
+
+    # The box only just reaches past 180, the far side still gets searched
+    assert [apartment_id for apartment_id, _ in apartments_near(cursor, -17.0, 179.5, 60)] == [1, 3, 2]
+
+
+def test_box_wider_than_the_globe_covers_every_longitude():
+    assert bounding_box(89.99, 0.0, 50)[2:] == (-180.0, 180.0)
+    min_lat, max_lat, min_lon, max_lon = bounding_box(-17.0, 179.99, 20)
+    assert max_lon > 180 and min_lon < 180
+
+
+def test_matches_a_brute_force_scan(cursor):
+    rng = np.random.default_rng(7)
+    # Clustered around the antimeridian and a pole, where the box is most distorted
+    latitudes = np.concatenate([rng.uniform(-30, 30, 300), rng.uniform(80, 90, 300)])
+    longitudes = np.concatenate([rng.uniform(175, 185, 300), rng.uniform(-180, 180, 300)])
+    longitudes = (longitudes + 180) % 360 - 180
+    add(cursor, *zip(latitudes.tolist(), longitudes.tolist()))
+
+    for latitude, longitude, km in [(0.0, 180.0, 300), (10.0, -178.5, 150), (85.0, 90.0, 500), (89.9, 0.0, 50)]:
+        distances = haversine_km(latitude, longitude, latitudes, longitudes)
+        expected = sorted(int(i) + 1 for i in np.flatnonzero(distances <= km - 1e-3))
+        found = apartments_near(cursor, latitude, longitude, km, limit=len(latitudes))
+        assert set(expected) <= {apartment_id for apartment_id, _ in found}
+        assert all(distance <= km for _, distance in found)
+        assert [distance for _, distance in found] == sorted(distance for _, distance in found)
+
+
+def test_limit_keeps_the_nearest(cursor):
+    add(cursor, *[(31.95, 35.90 + i * 0.001) for i in range(10)])
+    assert [apartment_id for apartment_id, _ in apartments_near(cursor, 31.95, 35.90, 5, limit=3)] == [1, 2, 3]
+
+
+def test_geocode_folds_spellings():
+    assert geocode("Flat in Jabal El-Weibdeh, near the park") == geocode("weibdeh")
+    assert geocode("Jabal Amman 3rd circle") == (31.9515, 35.9239)
+    assert geocode("Irbid") is None
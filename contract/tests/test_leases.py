@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+from leases import available_apartment_ids, init_lease_index, overlapping_leases
+
+
+@pytest.fixture
+def cursor():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE apartments (id INTEGER PRIMARY KEY)")
+    cursor.execute('''
+        CREATE TABLE contracts (
+            id INTEGER PRIMARY KEY, apartment_id INTEGER, start_date TEXT, end_date TEXT, status TEXT
+        )
+    ''')
+    cursor.executemany("INSERT INTO apartments (id) VALUES (?)", [(1,), (2,), (3,)])
+    init_lease_index(cursor)
+    cursor.executemany("INSERT INTO contracts (id, apartment_id, start_date, end_date, status) VALUES (?, ?, ?, ?, ?)", [
+        (10, 1, '2025-01-01', '2025-07-01', 'Active'),
+        (11, 2, '2025-03-01', '2025-04-01', 'Pending'),
+        (12, 3, '2025-01-01', '2025-12-31', 'Terminated'),
+    ])
+    yield cursor
+    conn.close()
+
+
+@pytest.mark.parametrize("start_date, end_date, expected", [
+    ('2024-06-01', '2025-01-01', []),  # Ends the day the lease starts
+    ('2025-07-01', '2025-12-01', []),  # Starts the day the lease ends
+    ('2024-06-01', '2025-01-02', [10]),
+    ('2025-06-30', '2025-12-01', [10]),
+    ('2025-02-01', '2025-03-01', [10]),  # Inside
+    ('2024-01-01', '2026-01-01', [10]),  # Around
+])
+def test_overlap_is_half_open(cursor, start_date, end_date, expected):
+    assert overlapping_leases(cursor, 1, start_date, end_date) == expected
+
+
+def test_closed_leases_do_not_hold_dates(cursor):
+    assert overlapping_leases(cursor, 3, '2025-02-01', '2025-03-01') == []
+
+
+def test_cancelled_pending_lease_frees_its_dates(cursor):
+    assert overlapping_leases(cursor, 2, '2025-03-15', '2025-05-01') == [11]
+    cursor.execute("UPDATE contracts SET status = 'Cancelled' WHERE id = 11")
+    assert overlapping_leases(cursor, 2, '2025-03-15', '2025-05-01') == []
+
+
+def test_moved_dates_are_reindexed(cursor):
+    cursor.execute("UPDATE contracts SET start_date = '2025-08-01', end_date = '2025-09-01' WHERE id = 10")
+    assert overlapping_leases(cursor, 1, '2025-02-01', '2025-03-01') == []
+    assert overlapping_leases(cursor, 1, '2025-08-31', '2025-10-01') == [10]
+
+
+def test_available_apartments(cursor):
+    assert available_apartment_ids(cursor, '2025-03-01', '2025-04-01') == [3]
+    assert available_apartment_ids(cursor, '2025-07-01', '2025-08-01') == [1, 2, 3]
+    assert available_apartment_ids(cursor, '2025-07-01', '2025-08-01', after_id=1, limit=1) == [2]
@@ -0,0 +1,94 @@
+import random
+import sqlite3
+from decimal import Decimal
+
+import pytest
+
+from money import (WEI_PER_ETH, eth_to_wei, jod_to_wei, legacy_eth_to_wei, migrate_money_columns, wei_from_db,
+                   wei_to_db, wei_to_eth)
+
+# Seeded random samples stand in for a property-based generator, so failures are reproducible
+SAMPLES = 2000
+
+
+def random_wei(rng):
+    return rng.choice((rng.randrange(0, 10**6), rng.randrange(0, WEI_PER_ETH), rng.randrange(0, 10**30)))
+
+
+def random_price(rng):
+    # Two-decimal JOD prices, as landlords enter them
+    return round(rng.uniform(0, 5000), 2)
+
+
+def test_wei_eth_round_trip():
+    rng = random.Random(1)
+    for _ in range(SAMPLES):
+        wei = random_wei(rng)
+        assert eth_to_wei(wei_to_eth(wei)) == wei
+
+
+def test_wei_db_round_trip():
+    rng = random.Random(2)
+    for _ in range(SAMPLES):
+        wei = random_wei(rng)
+        stored = wei_to_db(wei)
+        assert wei_from_db(stored) == wei
+        assert wei_from_db(stored.encode()) == wei
+
+
+def test_eth_to_wei_uses_the_shortest_float_repr():
+    rng = random.Random(3)
+    for _ in range(SAMPLES):
+        eth = rng.randrange(0, 10**9) / 10**6
+        assert eth_to_wei(eth) == int(Decimal(repr(eth)) * WEI_PER_ETH)
+    assert eth_to_wei(0.3) == 3 * 10**17
+    assert eth_to_wei("1.1999900000000001") == 1199990000000000100
+
+
+def test_jod_to_wei_is_exact_decimal_product():
+    rng = random.Random(4)
+    for _ in range(SAMPLES):
+        price, rate = random_price(rng), rng.choice((0.001, 0.00037, 0.0004))
+        exact = Decimal(str(price)) * Decimal(str(rate)) * WEI_PER_ETH
+        assert jod_to_wei(price, rate) == int(exact.to_integral_value(rounding="ROUND_HALF_UP"))
+        assert jod_to_wei(price, rate) == eth_to_wei(Decimal(str(price)) * Decimal(str(rate)))
+
+
+def test_legacy_conversion_matches_deployed_contracts():
+    rng = random.Random(5)
+    for _ in range(SAMPLES):
+        eth = random_price(rng) * 0.001
+        assert legacy_eth_to_wei(eth) == int(float(eth) * 10**18)
+    assert legacy_eth_to_wei(1.1999900000000001) == 1199990000000000000
+
+
+@pytest.mark.parametrize("value", [-1, float("nan"), float("inf"), True, "abc"])
+def test_invalid_amounts_are_rejected(value):
+    with pytest.raises((ValueError, TypeError, ArithmeticError)):
+        eth_to_wei(value)
+
+
+@pytest.mark.parametrize("value", [None, "-5", "1.5", "0x10", 1.5, -3])
+def test_invalid_stored_wei_is_rejected(value):
+    with pytest.raises((ValueError, TypeError)):
+        wei_from_db(value)
+
+
+def test_migration_keeps_the_on_chain_amount_of_deployed_leases():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE apartments (id INTEGER PRIMARY KEY, rent_amount_eth REAL)")
+    conn.execute("CREATE TABLE contracts (id INTEGER PRIMARY KEY, rent_amount REAL, contract_address TEXT)")
+    conn.execute("INSERT INTO apartments VALUES (1, 1.1999900000000001)")
+    conn.executemany("INSERT INTO contracts VALUES (?, ?, ?)", [
+        (1, 1.1999900000000001, "0x4ec96C896d92d399855f560f211607506De0538e"),  # Deployed with the float formula
+        (2, 1.1999900000000001, None),  # Pending, deployed later from rent_amount_wei
+    ])
+    migrate_money_columns(conn)
+    rows = dict(conn.execute("SELECT id, rent_amount_wei FROM contracts"))
+    assert rows == {1: "1199990000000000000", 2: "1199990000000000100"}
+    assert conn.execute("SELECT rent_amount_wei FROM apartments").fetchone() == ("1199990000000000100",)
+
+    # Already migrated rows are left alone
+    conn.execute("UPDATE contracts SET rent_amount = 2.0")
+    migrate_money_columns(conn)
+    assert dict(conn.execute("SELECT id, rent_amount_wei FROM contracts")) == rows
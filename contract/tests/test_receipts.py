@@ -0,0 +1,121 @@
+import random
+import threading
+
+import pytest
+
+from receipts import ReceiptWaiter, TransactionDropped
+
+
+def tx_hash(n):
+    return "0x" + f"{n:064x}"
+
+
+class FakeNode:
+    """Answers batches in a shuffled order, like a JSON-RPC 2.0 server may."""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.block_number = 1
+        self.mined = {}  # tx hash -> status
+        self.known = set()  # in the pool or mined
+        self.batches = []
+        self.next_id = 0
+        self.answer = None  # Replaces the answer list when set, for broken batches
+        self.eth = self
+        self.provider = self
+
+    def mine(self, hashes, status=1):
+        with self.lock:
+            for h in hashes:
+                self.mined[h] = status
+                self.known.add(h)
+            self.block_number += 1
+
+    def make_batch_request(self, requests):
+        with self.lock:
+            self.batches.append(requests[0][0])
+            responses = []
+            for method, (h,) in requests:
+                self.next_id += 1
+                if method == "eth_getTransactionReceipt":
+                    result = None
+                    if h in self.mined:
+                        result = {"transactionHash": h, "status": hex(self.mined[h]), "blockNumber": "0x1",
+                                  "gasUsed": "0x5208"}
+                else:
+                    result = {"hash": h} if h in self.known else None
+                responses.append({"jsonrpc": "2.0", "id": self.next_id, "result": result})
+            self.rng.shuffle(responses)
+            if self.answer is not None:
+                return self.answer(responses)
+            return responses
+
+
+@pytest.fixture
+def node():
+    return FakeNode()
+
+
+def make_waiter(node, **kwargs):
+    return ReceiptWaiter(node, poll_interval=0.005, **kwargs)
+
+
+def test_shuffled_receipts_resolve_their_own_transactions(node):
+    waiter = make_waiter(node)
+    hashes = [tx_hash(n) for n in range(1, 41)]
+    node.known.update(hashes)
+    futures = {h: waiter.submit(h) for h in hashes}
+    node.mine(hashes[::2], status=1)
+    node.mine(hashes[1::2], status=0)
+    try:
+        for n, h in enumerate(hashes):
+            receipt = futures[h].result(timeout=5)
+            assert "0x" + bytes(receipt["transactionHash"]).hex() == h
+            assert receipt["status"] == (1 if n % 2 == 0 else 0)
+    finally:
+        waiter.stop()
+
+
+def test_receipt_requests_grow_with_blocks_not_waiters(node):
+    waiter = make_waiter(node, batch_size=500)
+    hashes = [tx_hash(n) for n in range(1, 201)]
+    node.known.update(hashes)
+    futures = [waiter.submit(h) for h in hashes for _ in range(3)]  # Several threads wait for each
+    node.mine(hashes)
+    try:
+        for future in futures:
+            future.result(timeout=5)
+        stats = waiter.stats()
+        assert stats["rpc_receipt_batches"] <= 2 * stats["blocks_seen"] + 1
+        assert stats["mined"] == 200
+    finally:
+        waiter.stop()
+
+
+def test_unknown_transaction_is_dropped_and_known_ones_wait(node):
+    waiter = make_waiter(node, dropped_after=0)
+    pending, unknown = tx_hash(1), tx_hash(2)
+    node.known.add(pending)
+    kept, dropped = waiter.submit(pending), waiter.submit(unknown)
+    try:
+        with pytest.raises(TransactionDropped):
+            dropped.result(timeout=5)
+        assert not kept.done()
+        node.mine([pending])
+        assert kept.result(timeout=5)["status"] == 1
+    finally:
+        waiter.stop()
+
+
+def test_nothing_is_dropped_from_a_batch_that_cannot_be_paired(node):
+    waiter = make_waiter(node, dropped_after=0)
+    node.known.add(tx_hash(1))
+    node.answer = lambda responses: responses[:-1]  # One answer missing
+    futures = [waiter.submit(tx_hash(1)), waiter.submit(tx_hash(2))]
+    try:
+        threading.Event().wait(0.1)
+        assert not any(future.done() for future in futures)
+        assert waiter.stats()["rpc_errors"] > 0
+    finally:
+        waiter.stop()
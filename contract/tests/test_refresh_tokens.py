@@ -0,0 +1,67 @@
+import os
+import sqlite3
+
+import pytest
+
+from auth import RefreshTokenError, RefreshTokenStore, init_refresh_token_tables
+
+
+@pytest.fixture
+def store(tmp_path):
+    database_file = os.path.join(tmp_path, "tokens.db")
+    conn = sqlite3.connect(database_file)
+    init_refresh_token_tables(conn.cursor())
+    conn.commit()
+    conn.close()
+    return RefreshTokenStore(database_file, lifetime=3600)
+
+
+def test_rotation_returns_a_new_token_for_the_same_user(store):
+    token = store.issue(7)
+    user_id, rotated = store.rotate(token)
+    assert user_id == 7
+    assert rotated != token
+    assert store.rotate(rotated)[0] == 7
+
+
+def test_reusing_a_rotated_token_revokes_the_family(store):
+    token = store.issue(7)
+    _, rotated = store.rotate(token)
+    with pytest.raises(RefreshTokenError, match="reuse"):
+        store.rotate(token)
+    # The legitimate successor is revoked as well
+    with pytest.raises(RefreshTokenError):
+        store.rotate(rotated)
+
+
+def test_other_sessions_survive_reuse_detection(store):
+    first, second = store.issue(7), store.issue(7)
+    _, rotated = store.rotate(first)
+    with pytest.raises(RefreshTokenError):
+        store.rotate(first)
+    assert store.rotate(second)[0] == 7
+
+
+def test_unknown_and_expired_tokens_are_rejected(store):
+    with pytest.raises(RefreshTokenError, match="Invalid"):
+        store.rotate("not-a-token")
+    expired = RefreshTokenStore(store.database_file, lifetime=-1).issue(7)
+    with pytest.raises(RefreshTokenError, match="expired"):
+        store.rotate(expired)
+    assert store.purge_expired() == 1
+
+
+def test_revoke_ends_the_session(store):
+    token = store.issue(7)
+    _, rotated = store.rotate(token)
+    assert store.revoke(rotated)
+    with pytest.raises(RefreshTokenError):
+        store.rotate(rotated)
+    assert not store.revoke("not-a-token")
+
+
+def test_tokens_are_stored_hashed(store):
+    token = store.issue(7)
+    conn = sqlite3.connect(store.database_file)
+    stored = [row[0] for row in conn.execute('SELECT token_hash FROM refresh_tokens')]
+    assert token not in stored
@@ -0,0 +1,215 @@
+import os
+import sqlite3
+import time
+from concurrent.futures import Future
+
+import pytest
+from eth_account import Account
+from web3 import Web3
+
+from receipts import TransactionDropped
+from relay import RelayError, TransactionRelay, init_relay_tables
+
+CONTRACT = "0x" + "11" * 20
+CHAIN_ID = 1337
+
+
+class FakeEth:
+    def __init__(self):
+        self.sent = []
+        self.eth = self
+
+    def send_raw_transaction(self, raw):
+        self.sent.append(raw)
+
+
+class FakeReceipts:
+    """Receipt futures resolved by the test."""
+
+    def __init__(self):
+        self.futures = {}
+
+    def submit(self, tx_hash):
+        future = Future()
+        self.futures.setdefault(tx_hash, []).append(future)
+        return future
+
+    def mine(self, tx_hash, status=1):
+        for future in self.futures.pop(tx_hash):
+            future.set_result({"status": status, "gasUsed": 21000, "transactionHash": Web3.to_bytes(hexstr=tx_hash),
+                               "to": CONTRACT})
+
+    def drop(self, tx_hash):
+        for future in self.futures.pop(tx_hash):
+            future.set_exception(TransactionDropped(f"Transaction {tx_hash} was dropped by the node"))
+
+
+class FakeFees:
+    def record(self, tx_type, tx, receipt):
+        pass
+
+
+@pytest.fixture
+def database_file(tmp_path):
+    database_file = os.path.join(tmp_path, "relay.db")
+    conn = sqlite3.connect(database_file)
+    conn.execute("CREATE TABLE contracts (id INTEGER PRIMARY KEY, status TEXT)")
+    conn.execute("INSERT INTO contracts (id, status) VALUES (1, 'Active')")
+    init_relay_tables(conn.cursor())
+    conn.commit()
+    conn.close()
+    return database_file
+
+
+def make_relay(database_file, receipts, confirmed_events=None, **kwargs):
+    on_confirmed = None
+    if confirmed_events is not None:
+        on_confirmed = lambda cursor, event_type, contract_id, tx_hash: confirmed_events.append((event_type, tx_hash))
+    return TransactionRelay(database_file, FakeEth(), receipts, FakeFees(), on_confirmed=on_confirmed, **kwargs)
+
+
+def issue_signed(relay, account, action='terminate', nonce=0):
+    tx = {'from': account.address, 'to': CONTRACT, 'data': '0x', 'value': 0, 'nonce': nonce, 'gas': 50000,
+          'gasPrice': 10 ** 9, 'chainId': CHAIN_ID}
+    template = relay.issue(account.address, action, 1, tx, {"months": 1, "amount_wei": "0"})
+    signed = Account.sign_transaction({key: tx[key] for key in tx if key != 'from'}, account.key)
+    return template["template_id"], Web3.to_hex(signed.raw_transaction)
+
+
+def template_row(database_file, template_id):
+    conn = sqlite3.connect(database_file)
+    row = conn.execute('SELECT status, result FROM tx_templates WHERE id = ?', (template_id,)).fetchone()
+    conn.close()
+    return row
+
+
+def contract_status(database_file):
+    conn = sqlite3.connect(database_file)
+    status = conn.execute('SELECT status FROM contracts WHERE id = 1').fetchone()[0]
+    conn.close()
+    return status
+
+
+def test_relayed_transaction_is_confirmed_once_mined(database_file):
+    receipts, events = FakeReceipts(), []
+    relay = make_relay(database_file, receipts, events)
+    account = Account.create()
+    template_id, raw = issue_signed(relay, account)
+
+    template, confirmed = relay.relay(account.address, template_id, raw)
+    assert template_row(database_file, template_id)[0] == 'sent'
+    receipts.mine(template["transaction_hash"])
+
+    assert confirmed.result(timeout=1) == {"new_status": 'Terminated'}
+    assert template_row(database_file, template_id)[0] == 'confirmed'
+    assert contract_status(database_file) == 'Terminated'
+    assert events == [('contract.terminated', template["transaction_hash"])]
+
+    # The same signed transaction reports its status, anything else is a second use
+    retry, pending = relay.relay(account.address, template_id, raw)
+    assert pending is None and retry["status"] == 'confirmed'
+    _, other = issue_signed(relay, account, nonce=1)
+    with pytest.raises(RelayError) as error:
+        relay.relay(account.address, template_id, other)
+    assert error.value.status == 409
+
+
+def test_dropped_transaction_fails(database_file):
+    receipts = FakeReceipts()
+    relay = make_relay(database_file, receipts)
+    account = Account.create()
+    template_id, raw = issue_signed(relay, account)
+    template, confirmed = relay.relay(account.address, template_id, raw)
+
+    receipts.drop(template["transaction_hash"])
+    with pytest.raises(TransactionDropped):
+        confirmed.result(timeout=1)
+    assert template_row(database_file, template_id)[0] == 'failed'
+    assert contract_status(database_file) == 'Active'
+
+
+def test_sent_transactions_are_resumed_after_a_restart(database_file):
+    account = Account.create()
+    template_id, raw = issue_signed(make_relay(database_file, FakeReceipts()), account)
+    template, _ = make_relay(database_file, FakeReceipts()).relay(account.address, template_id, raw)
+
+    # A new process knows nothing of the first one's waiters
+    receipts, events = FakeReceipts(), []
+    restarted = make_relay(database_file, receipts, events)
+    assert restarted.resume_sent() == 1
+    assert restarted.resume_sent() == 0  # Already waiting for it
+    receipts.mine(template["transaction_hash"])
+
+    assert template_row(database_file, template_id)[0] == 'confirmed'
+    assert contract_status(database_file) == 'Terminated'
+    assert len(events) == 1
+    assert restarted.resume_sent() == 0
+
+
+def test_effect_is_applied_once_when_two_processes_confirm(database_file):
+    account = Account.create()
+    first_receipts, first_events = FakeReceipts(), []
+    first = make_relay(database_file, first_receipts, first_events)
+    template_id, raw = issue_signed(first, account)
+    template, confirmed = first.relay(account.address, template_id, raw)
+
+    second_receipts, second_events = FakeReceipts(), []
+    make_relay(database_file, second_receipts, second_events).resume_sent()
+    second_receipts.mine(template["transaction_hash"])
+    first_receipts.mine(template["transaction_hash"])
+
+    assert confirmed.result(timeout=1) == {"new_status": 'Terminated'}
+    assert len(first_events) + len(second_events) == 1
+
+
+def test_second_payment_template_is_refused_while_one_is_pending(database_file):
+    relay = make_relay(database_file, FakeReceipts(), ttl=600)
+    account = Account.create()
+    template_id, raw = issue_signed(relay, account, action='pay')
+
+    with pytest.raises(RelayError) as error:
+        issue_signed(relay, account, action='pay_months')
+    assert error.value.status == 409
+
+    relay.relay(account.address, template_id, raw)
+    with pytest.raises(RelayError):
+        issue_signed(relay, account, action='pay')
+
+    # Other actions are not limited
+    issue_signed(relay, account, action='terminate')
+
+
+def test_expired_payment_template_does_not_block_a_new_one(database_file):
+    relay = make_relay(database_file, FakeReceipts())
+    account = Account.create()
+    template_id, _ = issue_signed(relay, account, action='pay')
+    conn = sqlite3.connect(database_file)
+    conn.execute('UPDATE tx_templates SET expires_at = ? WHERE id = ?', (int(time.time()) - 1, template_id))
+    conn.commit()
+    conn.close()
+
+    issue_signed(relay, account, action='pay')
+
+
+def test_purge_gives_up_on_sent_transactions_without_receipt(database_file):
+    relay = make_relay(database_file, FakeReceipts(), ttl=600, sent_timeout=60)
+    account = Account.create()
+    template_id, raw = issue_signed(relay, account)
+    relay.relay(account.address, template_id, raw)
+
+    def expired_since(seconds):
+        conn = sqlite3.connect(database_file)
+        conn.execute('UPDATE tx_templates SET expires_at = ? WHERE id = ?', (int(time.time()) - seconds, template_id))
+        conn.commit()
+        conn.close()
+
+    assert relay.purge_expired() == 0
+    assert template_row(database_file, template_id)[0] == 'sent'
+
+    expired_since(120)
+    assert relay.purge_expired() == 0  # Marked failed, removed once it is a TTL old
+    assert template_row(database_file, template_id)[0] == 'failed'
+
+    expired_since(700)
+    assert relay.purge_expired() == 1
+    assert template_row(database_file, template_id) is None
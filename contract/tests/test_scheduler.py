@@ -0,0 +1,179 @@
+import os
+import sqlite3
+
+from scheduler import PAYMENT_PERIOD_SECONDS, STATE_ACTIVE, STATE_COMPLETED, LeaseSweeper, init_schedule_tables
+
+NOW = 1_750_000_000
+
+
+class FakeBatch:
+    def __init__(self, chain):
+        self.chain = chain
+        self.calls = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, call):
+        self.calls.append(call)
+
+    def execute(self):
+        return [self.chain.read(call) for call in self.calls]
+
+
+class FakeChain:
+    """Leases by address as {"start": ..., "duration": ..., "state": ...}, completed like the contract does."""
+
+    def __init__(self, leases):
+        self.leases = leases
+        self.sent = []
+        self.eth = self
+        self.account = self
+
+    # web3.eth
+    def get_block(self, block):
+        return {"timestamp": NOW}
+
+    def get_transaction_count(self, address, block):
+        return len(self.sent)
+
+    def send_raw_transaction(self, raw):
+        address = raw
+        self.sent.append(address)
+        lease = self.leases[address]
+        if (NOW - lease["start"]) // PAYMENT_PERIOD_SECONDS >= lease["duration"]:
+            lease["state"] = STATE_COMPLETED
+        return address
+
+    def batch_requests(self):
+        return FakeBatch(self)
+
+    # web3.eth.account
+    def from_key(self, key):
+        return FakeOperator()
+
+    # bindings.for_lease(...) calls, resolved by read()
+    def for_lease(self, address):
+        return self
+
+    def state(self, lease):
+        return ("state", lease[1])
+
+    def period(self, lease):
+        return [("start", lease[1]), ("duration", lease[1])]
+
+    @staticmethod
+    def parse_period(results):
+        return results[0], results[1]
+
+    def check_completion(self, lease):
+        return lease[1]
+
+    def read(self, call):
+        return self.leases[call[1]][call[0]]
+
+
+class FakeOperator:
+    address = "0xoperator"
+
+    def sign_transaction(self, tx):
+        return type("Signed", (), {"raw_transaction": tx["to"]})
+
+
+class FakeFees:
+    def build_transaction(self, call, params):
+        return dict(params, to=call, gas=50000)
+
+    def record(self, tx_type, tx, receipt):
+        pass
+
+
+class FakeReceipts:
+    def wait_all(self, tx_hashes):
+        return [{"status": 1, "gasUsed": 30000} for _ in tx_hashes]
+
+
+def make_sweeper(tmp_path, chain, rows):
+    database_file = os.path.join(tmp_path, "sweep.db")
+    conn = sqlite3.connect(database_file)
+    conn.execute('''
+        CREATE TABLE contracts (
+            id INTEGER PRIMARY KEY, status TEXT, end_date TEXT, next_payment_date TEXT, start_date TEXT,
+            contract_address TEXT, landlord_wallet TEXT
+        )
+    ''')
+    init_schedule_tables(conn.cursor())
+    conn.executemany('INSERT INTO contracts (id, status, end_date, next_payment_date, contract_address) '
+                     'VALUES (?, ?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+    sweeper = LeaseSweeper(database_file, chain, chain, FakeFees(), operator_key="0xkey",
+                           receipt_waiter=FakeReceipts(), batch_size=2)
+    return sweeper, database_file
+
+
+def test_only_leases_elapsed_on_chain_are_completed(tmp_path):
+    chain = FakeChain({
+        # DB end date long past, but 12 on-chain months from a recent signature
+        "0xa": {"start": NOW - 60 * 86400, "duration": 12, "state": STATE_ACTIVE},
+        # Elapsed on-chain although the DB end date is in the future
+        "0xb": {"start": NOW - 7 * PAYMENT_PERIOD_SECONDS, "duration": 6, "state": STATE_ACTIVE},
+        "0xc": {"start": NOW - 13 * PAYMENT_PERIOD_SECONDS, "duration": 12, "state": STATE_ACTIVE},
+        # Not signed on-chain yet
+        "0xd": {"start": 0, "duration": 3, "state": STATE_ACTIVE},
+    })
+    sweeper, database_file = make_sweeper(tmp_path, chain, [
+        (1, 'Active', '2025-02-28', '2099-01-01', "0xa"),
+        (2, 'Active', '2099-12-31', '2099-01-01', "0xb"),
+        (3, 'Active', '2025-02-28', '2099-01-01', "0xc"),
+        (4, 'Active', '2025-02-28', '2099-01-01', "0xd"),
+    ])
+
+    stats = sweeper.run_once(today='2025-06-01')
+    assert sorted(chain.sent) == ["0xb", "0xc"]
+    assert stats["completion_times_read"] == 3
+    assert stats["completed"] == 2
+    conn = sqlite3.connect(database_file)
+    assert dict(conn.execute('SELECT id, status FROM contracts')) == {
+        1: 'Active', 2: 'Completed', 3: 'Completed', 4: 'Active'}
+    assert conn.execute('SELECT completes_at FROM contracts WHERE id = 1').fetchone() == (
+        NOW - 60 * 86400 + 12 * PAYMENT_PERIOD_SECONDS,)
+
+    # Nothing is sent again for the lease that is still running
+    chain.sent.clear()
+    assert sweeper.run_once(today='2025-06-01')["completion_txs"] == 0
+    assert chain.sent == []
+
+
+def test_overdue_rent_is_flagged(tmp_path):
+    sweeper, database_file = make_sweeper(tmp_path, FakeChain({}), [
+        (1, 'Active', '2099-01-01', '2025-05-01', None),
+        (2, 'Active', '2099-01-01', '2025-07-01', None),
+        (3, 'Pending', '2099-01-01', '2025-05-01', None),
+    ])
+    assert sweeper.run_once(today='2025-06-01')["overdue_marked"] == 1
+    conn = sqlite3.connect(database_file)
+    assert conn.execute('SELECT id, overdue_since FROM contracts WHERE overdue_since IS NOT NULL').fetchall() == [
+        (1, '2025-05-01')]
+
+
+def test_lapsed_pending_holds_are_cancelled(tmp_path):
+    sweeper, database_file = make_sweeper(tmp_path, FakeChain({}), [
+        (1, 'Pending', '2099-12-31', '2099-01-01', None),
+        (2, 'Pending', '2099-12-31', '2099-01-01', None),
+        (3, 'Landlord Signed', '2099-12-31', '2099-01-01', None),
+    ])
+    conn = sqlite3.connect(database_file)
+    init_schedule_tables(conn.cursor())  # Leases from before holds existed get a full hold
+    assert conn.execute('SELECT count(*) FROM contracts WHERE hold_until IS NOT NULL').fetchone()[0] == 2
+    conn.execute("UPDATE contracts SET hold_until = '2000-01-01T00:00:00Z' WHERE id IN (1, 3)")
+    conn.commit()
+
+    assert sweeper.run_once(today='2025-06-01')["holds_cancelled"] == 1
+    assert dict(conn.execute('SELECT id, status FROM contracts')) == {
+        1: 'Cancelled', 2: 'Pending', 3: 'Landlord Signed'
+    }
+    conn.close()
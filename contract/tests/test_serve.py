@@ -0,0 +1,102 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+CONTRACT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STREAMS = 3000
+
+# An event stream app served the way serve.py serves the backend, in a process of its own
+# since gevent has to patch the standard library before anything else imports it
+SERVER = """
+import serve
+
+from flask import Flask, Response, jsonify
+
+from events import EventBroker
+
+broker = EventBroker(heartbeat=1, max_subscribers=10000)
+app = Flask(__name__)
+
+
+@app.route("/stream/<wallet>")
+def stream(wallet):
+    return Response(broker.stream(broker.subscribe(wallet)), mimetype="text/event-stream")
+
+
+@app.route("/publish/<wallet>", methods=["POST"])
+def publish(wallet):
+    return jsonify({"id": broker.publish([wallet], "contract.status", {"wallet": wallet})})
+
+
+@app.route("/stats")
+def stats():
+    return jsonify(broker.stats())
+
+
+serve.raise_open_file_limit()
+server = serve.make_server(app, "127.0.0.1", 0)
+server.log = None
+server.start()
+print(server.server_port, flush=True)
+server.serve_forever()
+"""
+
+
+@pytest.fixture
+def server():
+    process = subprocess.Popen([sys.executable, "-c", SERVER], cwd=CONTRACT_DIR, stdout=subprocess.PIPE, text=True)
+    try:
+        yield int(process.stdout.readline())
+    finally:
+        process.kill()
+        process.wait()
+
+
+def request(port, method, path):
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+        sock.sendall(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+        response = b""
+        while chunk := sock.recv(65536):
+            response += chunk
+    return json.loads(response.split(b"\r\n\r\n", 1)[1])
+
+
+def open_stream(port, wallet):
+    sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+    sock.sendall(f"GET /stream/{wallet} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    return sock
+
+
+def read_until(sock, marker):
+    received = b""
+    while marker not in received:
+        chunk = sock.recv(4096)
+        assert chunk, "stream closed"
+        received += chunk
+    return received
+
+
+def test_one_process_holds_thousands_of_idle_streams(server):
+    streams = [open_stream(server, f"0x{i:040x}") for i in range(STREAMS)]
+    try:
+        for sock in streams:
+            assert read_until(sock, b"retry: 3000").startswith(b"HTTP/1.1 200")
+        assert request(server, "GET", "/stats")["subscribers"] == STREAMS
+
+        # Still serving, and events reach a stream among the idle ones
+        event_id = request(server, "POST", f"/publish/0x{STREAMS - 1:040x}")["id"]
+        assert f"id: {event_id}\n".encode() in read_until(streams[-1], b"event: contract.status")
+    finally:
+        for sock in streams:
+            sock.close()
+
+    # Closed streams are released on their next heartbeat
+    deadline = time.monotonic() + 10
+    while request(server, "GET", "/stats")["subscribers"] and time.monotonic() < deadline:
+        time.sleep(0.2)
+    assert request(server, "GET", "/stats")["subscribers"] == 0
@@ -0,0 +1,90 @@
+import gzip
+import json
+import sqlite3
+
+import pytest
+from flask import Flask, request
+
+from streaming import WRITE_SIZE, iter_rows, streaming_response
+
+COLUMNS = ["id", "title", "price"]
+
+
+@pytest.fixture
+def client():
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.execute("CREATE TABLE apartments (id INTEGER PRIMARY KEY, title TEXT, price REAL)")
+    conn.executemany("INSERT INTO apartments VALUES (?, ?, ?)",
+                     [(i, f"Flat {i} عمّان", 100.5 + i) for i in range(1, 2001)])
+    closed = []
+    app = Flask(__name__)
+
+    @app.route("/apartments")
+    def apartments():
+        limit = int(request.args.get("limit", 2001))
+        cursor = conn.execute("SELECT id, title, price FROM apartments ORDER BY id LIMIT ?", (limit,))
+        return streaming_response(request, COLUMNS, iter_rows(cursor, chunk_size=100),
+                                  on_close=lambda: closed.append(True))
+
+    client = app.test_client()
+    client.closed = closed
+    yield client
+    conn.close()
+
+
+def expected(limit=2000):
+    return [{"id": i, "title": f"Flat {i} عمّان", "price": 100.5 + i}
+            for i in range(1, limit + 1)]
+
+
+def test_json_array_by_default(client):
+    response = client.get("/apartments")
+    assert response.mimetype == "application/json"
+    assert "Content-Encoding" not in response.headers
+    assert len(response.data) > WRITE_SIZE  # Written in several pieces
+    assert json.loads(response.data) == expected()
+    response.close()
+    assert client.closed == [True]
+
+
+@pytest.mark.parametrize("accept", ["application/x-ndjson", "application/ndjson",
+                                    "application/x-ndjson, application/json;q=0.5"])
+def test_ndjson_when_accepted(client, accept):
+    response = client.get("/apartments", headers={"Accept": accept})
+    assert response.mimetype == "application/x-ndjson"
+    assert response.headers["Vary"] == "Accept, Accept-Encoding"
+    lines = response.data.decode().splitlines()
+    assert [json.loads(line) for line in lines] == expected()
+
+
+def test_json_preferred_over_ndjson(client):
+    response = client.get("/apartments", headers={"Accept": "application/json, application/x-ndjson;q=0.5"})
+    assert response.mimetype == "application/json"
+
+
+def test_gzip_when_accepted(client):
+    response = client.get("/apartments", headers={"Accept-Encoding": "gzip, deflate"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.data)) == expected()
+
+    refused = client.get("/apartments", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "Content-Encoding" not in refused.headers
+
+
+def test_compact_format(client):
+    body = json.loads(client.get("/apartments?format=compact&limit=3").data)
+    assert body == {"columns": COLUMNS, "rows": [[row["id"], row["title"], row["price"]] for row in expected(3)]}
+
+
+def test_compact_ndjson_and_gzip(client):
+    response = client.get("/apartments?format=compact",
+                          headers={"Accept": "application/x-ndjson", "Accept-Encoding": "gzip"})
+    lines = gzip.decompress(response.data).decode().splitlines()
+    assert json.loads(lines[0]) == {"columns": COLUMNS}
+    assert [json.loads(line) for line in lines[1:]] == [list(row.values()) for row in expected()]
+
+
+@pytest.mark.parametrize("query, body", [("limit=0", []),
+                                         ("limit=0&format=compact", {"columns": COLUMNS, "rows": []})])
+def test_empty_result(client, query, body):
+    assert json.loads(client.get(f"/apartments?{query}").data) == body
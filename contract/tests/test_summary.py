@@ -0,0 +1,120 @@
+import random
+import sqlite3
+
+import pytest
+
+from summary import SUMMARY_COLUMNS, init_summary_tables, read_landlord_summary, rebuild_landlord_summary
+
+LANDLORDS = ("0xA", "0xB", "0xC")
+STATUSES = ("Pending", "Landlord Signed", "Active", "Completed", "Terminated")
+
+
+def make_conn():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript('''
+        CREATE TABLE apartments (
+            id INTEGER PRIMARY KEY, landlord_wallet TEXT, availability TEXT, price_in_jod REAL
+        );
+        CREATE TABLE contracts (
+            id INTEGER PRIMARY KEY, landlord_wallet TEXT, tenant_wallet TEXT, apartment_id INTEGER,
+            rent_amount REAL, status TEXT, next_payment_date TEXT, overdue_since TEXT
+        );
+        CREATE TABLE contracts_archive AS SELECT * FROM contracts WHERE 0;
+        CREATE INDEX idx_contracts_apartment_status ON contracts (apartment_id, status);
+    ''')
+    init_summary_tables(conn.cursor())
+    return conn
+
+
+@pytest.fixture
+def conn():
+    return make_conn()
+
+
+def summaries(conn):
+    rows = conn.execute(f'SELECT {", ".join(SUMMARY_COLUMNS[:-1])} FROM landlord_summary ORDER BY landlord_wallet')
+    return [tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in rows]
+
+
+def random_write(conn, rng):
+    apartment_ids = [row[0] for row in conn.execute('SELECT id FROM apartments')]
+    contract_ids = [row[0] for row in conn.execute('SELECT id FROM contracts')]
+    action = rng.randrange(10)
+    if action == 0 or not apartment_ids:
+        conn.execute('INSERT INTO apartments (landlord_wallet, availability, price_in_jod) VALUES (?, ?, ?)',
+                     (rng.choice(LANDLORDS), rng.choice(("Available", "Unavailable")), rng.randint(200, 900)))
+    elif action == 1:
+        conn.execute('UPDATE apartments SET price_in_jod = ?, availability = ? WHERE id = ?',
+                     (rng.randint(200, 900), rng.choice(("Available", "Unavailable")), rng.choice(apartment_ids)))
+    elif action == 2 and rng.random() < 0.2:
+        conn.execute('DELETE FROM apartments WHERE id = ?', (rng.choice(apartment_ids),))
+    elif action in (3, 4) or not contract_ids:
+        conn.execute('''
+            INSERT INTO contracts (landlord_wallet, tenant_wallet, apartment_id, rent_amount, status, next_payment_date)
+            VALUES (?, '0xT', ?, ?, ?, ?)
+        ''', (rng.choice(LANDLORDS), rng.choice(apartment_ids), rng.randint(1, 9) / 10, rng.choice(STATUSES),
+              f"2025-0{rng.randint(1, 9)}-{rng.randint(10, 28)}"))
+    elif action in (5, 6):
+        conn.execute('UPDATE contracts SET status = ? WHERE id = ?', (rng.choice(STATUSES), rng.choice(contract_ids)))
+    elif action == 7:
+        conn.execute("UPDATE contracts SET overdue_since = next_payment_date, next_payment_date = ? WHERE id = ?",
+                     (f"2025-1{rng.randint(0, 2)}-{rng.randint(10, 28)}", rng.choice(contract_ids)))
+    elif action == 8:
+        # Archiving: copy a closed lease, then delete it
+        contract_id = rng.choice(contract_ids)
+        conn.execute("INSERT INTO contracts_archive SELECT * FROM contracts "
+                     "WHERE id = ? AND status IN ('Completed', 'Terminated')", (contract_id,))
+        conn.execute("DELETE FROM contracts WHERE id = ? AND status IN ('Completed', 'Terminated')", (contract_id,))
+    else:
+        conn.execute('UPDATE contracts SET landlord_wallet = ?, apartment_id = ? WHERE id = ?',
+                     (rng.choice(LANDLORDS), rng.choice(apartment_ids), rng.choice(contract_ids)))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_summary_matches_a_rebuild(conn, seed):
+    rng = random.Random(seed)
+    for step in range(400):
+        random_write(conn, rng)
+        if step % 50 == 49:
+            maintained = summaries(conn)
+            rebuild_landlord_summary(conn.cursor())
+            assert maintained == summaries(conn)
+
+
+def test_read_summary(conn):
+    conn.execute("INSERT INTO apartments VALUES (1, '0xA', 'Unavailable', 500)")
+    conn.execute("INSERT INTO apartments VALUES (2, '0xA', 'Available', 300)")
+    conn.execute("INSERT INTO contracts VALUES (1, '0xA', '0xT', 1, 0.5, 'Active', '2025-03-01', NULL)")
+    conn.execute("INSERT INTO contracts VALUES (2, '0xA', '0xT', 1, 0.5, 'Active', '2025-02-01', '2025-01-01')")
+    summary = read_landlord_summary(conn.cursor(), '0xA')
+    assert summary["apartments_total"] == 2
+    assert summary["occupied_apartments"] == 1
+    assert summary["occupancy_rate"] == 0.5
+    assert summary["contracts_active"] == 2
+    assert summary["overdue_contracts"] == 1
+    assert summary["expected_monthly_rent_jod"] == 1000
+    assert [p["contract_id"] for p in summary["upcoming_payments"]] == [2, 1]
+    assert read_landlord_summary(conn.cursor(), '0xZ')["apartments_total"] == 0
+
+
+def leases_written(size):
+    """SQLite VM instructions run to add size leases for one landlord and flag them all overdue."""
+    conn = make_conn()
+    conn.executemany("INSERT INTO apartments VALUES (?, '0xA', 'Available', 500)", [(i,) for i in range(1, size + 1)])
+    steps = []
+    conn.set_progress_handler(lambda: steps.append(1), 100)  # Called every 100 instructions, None continues
+    conn.executemany("INSERT INTO contracts VALUES (?, '0xA', '0xT', ?, 0.5, 'Active', '2025-01-01', NULL)",
+                     [(i, i) for i in range(1, size + 1)])
+    conn.execute("UPDATE contracts SET overdue_since = next_payment_date")
+    conn.set_progress_handler(None, 0)
+    summary = read_landlord_summary(conn.cursor(), '0xA')
+    assert summary["contracts_active"] == summary["overdue_contracts"] == size
+    assert summary["occupied_apartments"] == size
+    conn.close()
+    return len(steps)
+
+
+def test_set_based_writes_stay_linear():
+    # One landlord with many leases: every trigger must cost the same whatever the landlord's size.
+    # Counted in VM instructions rather than time, four times the leases is about four times the work
+    assert leases_written(4000) / leases_written(1000) < 5
@@ -0,0 +1,102 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+USER_COLUMNS = ("id", "name", "email", "wallet_address", "phone", "password", "role")
+
+
+def init_user_indexes(cursor):
+    # Wallets are stored as typed at registration, lookups compare them case-insensitively
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_wallet_lower ON users (lower(wallet_address))')
+
+
+def same_wallet(a, b):
+    return bool(a) and bool(b) and a.lower() == b.lower()
+
+
+def public_user(user):
+    """User record without the password hash, safe to return from the API."""
+    return {key: value for key, value in user.items() if key != "password"}
+
+
+class UserCache:
+    """Bounded LRU of user records, reachable by id, email or wallet address."""
+
+    def __init__(self, database_file, max_size=5000, ttl=300):
+        self.database_file = database_file
+        self.max_size = max_size
+        self.ttl = ttl  # Bounds staleness when several processes serve the API
+        self._lock = threading.Lock()
+        self._users = OrderedDict()  # id -> (record, expires_at), least recently used first
+        self._by_email = {}
+        self._by_wallet = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get_by_id(self, user_id):
+        return self._get(user_id, "id", user_id)
+
+    def get_by_email(self, email):
+        with self._lock:
+            user_id = self._by_email.get(email)
+        return self._get(user_id, "email", email)
+
+    def get_by_wallet(self, wallet_address):
+        if not wallet_address:
+            return None
+        with self._lock:
+            user_id = self._by_wallet.get(wallet_address.lower())
+        return self._get(user_id, "lower(wallet_address)", wallet_address.lower())
+
+    def invalidate(self, user_id=None, email=None, wallet_address=None):
+        with self._lock:
+            if user_id is None and email is not None:
+                user_id = self._by_email.get(email)
+            if user_id is None and wallet_address is not None:
+                user_id = self._by_wallet.get(wallet_address.lower())
+            if user_id is not None and user_id in self._users:
+                self._remove(user_id)
+                self._stats["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(self._stats, size=len(self._users), max_size=self.max_size,
+                        hit_rate=round(self._stats["hits"] / lookups, 4) if lookups else None)
+
+    def _get(self, user_id, column, value):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id) if user_id is not None else None
+            if entry and entry[1] > now:
+                self._users.move_to_end(user_id)
+                self._stats["hits"] += 1
+                return entry[0]
+            if entry:
+                self._remove(user_id)
+            self._stats["misses"] += 1
+
+        conn = sqlite3.connect(self.database_file)
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {", ".join(USER_COLUMNS)} FROM users WHERE {column} = ?', (value,))
+        row = cursor.fetchone()
+        conn.close()
+        if not row:
+            return None
+
+        user = dict(zip(USER_COLUMNS, row))
+        with self._lock:
+            if user["id"] in self._users:
+                self._remove(user["id"])
+            self._users[user["id"]] = (user, now + self.ttl)
+            self._by_email[user["email"]] = user["id"]
+            self._by_wallet[user["wallet_address"].lower()] = user["id"]
+            while len(self._users) > self.max_size:
+                self._remove(next(iter(self._users)))
+                self._stats["evictions"] += 1
+        return user
+
+    def _remove(self, user_id):
+        user, _ = self._users.pop(user_id)
+        self._by_email.pop(user["email"], None)
+        self._by_wallet.pop(user["wallet_address"].lower(), None)